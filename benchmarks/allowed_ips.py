@@ -0,0 +1,63 @@
+"""
+Measure collapsing the allowed IPs of a split tunnel profile before they
+are added to the NetworkManager profile, and how many entries remain.
+
+The prefixes are generated like the lists pushed by institutes: runs of
+adjacent networks, networks contained in larger ones and duplicates.
+
+Run with: python3 -m benchmarks.allowed_ips
+"""
+
+import random
+import time
+from ipaddress import IPv4Network, IPv6Network
+from statistics import median
+
+from eduvpn.connection import collapse_networks
+
+PREFIXES = [50, 200, 800]
+COLLAPSES = 200
+
+
+def split_tunnel_networks(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    networks = []
+    while len(networks) < count:
+        kind = rng.random()
+        base = rng.randrange(1, 224) << 24 | rng.randrange(0, 256) << 16
+        if kind < 0.5:
+            # A run of adjacent /24 networks
+            start = rng.randrange(0, 240)
+            networks.extend(IPv4Network((base | (start + i) << 8, 24)) for i in range(rng.randrange(2, 16)))
+        elif kind < 0.7:
+            # A /16 with some of its own /24 networks
+            networks.append(IPv4Network((base, 16)))
+            networks.extend(IPv4Network((base | rng.randrange(0, 256) << 8, 24)) for _ in range(4))
+        elif kind < 0.85 and networks:
+            networks.append(rng.choice(networks))
+        else:
+            networks.append(IPv6Network((0x2001_0DB8 << 96 | rng.randrange(0, 1 << 16) << 80, 48)))
+    return networks[:count]
+
+
+def measure(func, *args, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(COLLAPSES):
+            func(*args)
+        timings.append(time.perf_counter() - start)
+    return median(timings) / COLLAPSES
+
+
+def main():
+    print(f"{'prefixes':<12}{'collapsed':>11}{'ratio':>8}{'collapse (us)':>16}")
+    for count in PREFIXES:
+        networks = split_tunnel_networks(count)
+        collapsed = collapse_networks(networks)
+        elapsed = measure(collapse_networks, networks) * 1e6
+        print(f"{count:<12}{len(collapsed):>11}{len(collapsed) / count:>8.0%}{elapsed:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
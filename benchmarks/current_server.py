@@ -0,0 +1,83 @@
+"""
+Count the eduvpn-common calls to get the current server during a connect/disconnect cycle,
+with and without the current server cache that is kept per state transition.
+
+The transitions are run through the eduvpn-common event handler with the same
+current server reads as the model: the transition handlers, activating the connection
+and the UI that shows the current server.
+
+Run with: python3 -m benchmarks.current_server
+"""
+
+import json
+
+from eduvpn_common.event import EventHandler
+from eduvpn_common.state import State, StateType
+
+from eduvpn.server import ServerDatabase
+
+CURRENT_SERVER = {
+    "server_type": 1,
+    "institute_access_server": {
+        "identifier": "https://institute.example.org/",
+        "display_name": {"en": "Institute"},
+        "support_contacts": [],
+        "profiles": {"map": {"default": {"display_name": {"en": "Default"}}}, "current": "default"},
+    },
+}
+
+# The transitions of a connect/disconnect cycle with the number of times the current server is read
+CYCLE = [
+    (State.MAIN, State.GETTING_CONFIG, 0),
+    # parse_config, activate_connection and the UI
+    (State.GETTING_CONFIG, State.GOT_CONFIG, 3),
+    # parse_connecting and the UI
+    (State.GOT_CONFIG, State.CONNECTING, 2),
+    # parse_connected, the UI and renewing the session
+    (State.CONNECTING, State.CONNECTED, 3),
+    # disconnecting and the UI
+    (State.CONNECTED, State.DISCONNECTING, 2),
+    # disconnected_server and the UI
+    (State.DISCONNECTING, State.DISCONNECTED, 2),
+    (State.DISCONNECTED, State.MAIN, 0),
+]
+
+
+class FakeWrapper:
+    def __init__(self):
+        self.event_handler = EventHandler()
+        self.get_current_server_calls = 0
+
+    def get_current_server(self) -> str:
+        self.get_current_server_calls += 1
+        return json.dumps(CURRENT_SERVER)
+
+
+def run_cycle(track: bool) -> int:
+    wrapper = FakeWrapper()
+    server_db = ServerDatabase(wrapper)
+    if track:
+        server_db.track_transitions(wrapper.event_handler)
+    reads = {}
+    for old, new, count in CYCLE:
+        reads[new] = count
+
+        def on_enter(other_state, data, state=new):
+            for _ in range(reads[state]):
+                assert server_db.current is not None
+
+        wrapper.event_handler.add_event(new, StateType.ENTER, on_enter)
+    for old, new, _ in CYCLE:
+        wrapper.event_handler.run(old, new, "")
+    return wrapper.get_current_server_calls
+
+
+def main():
+    reads = sum(count for _, _, count in CYCLE)
+    print(f"transitions: {len(CYCLE)}, current server reads: {reads}")
+    print(f"eduvpn-common calls without cache: {run_cycle(False)}")
+    print(f"eduvpn-common calls with cache:    {run_cycle(True)}")
+
+
+if __name__ == "__main__":
+    main()
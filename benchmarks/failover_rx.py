@@ -0,0 +1,120 @@
+"""
+Compare the latency of the failover rx bytes callback.
+
+The old callback resolved the interface on every call, by reading the
+uuid file and scanning the active connections, and then read the sysfs
+file with readline and seek. The new callback reads a pinned file
+descriptor with os.pread. The counter source is a fake statistics
+directory, the active connections are fake NetworkManager objects.
+
+Run with: python3 -m benchmarks.failover_rx
+"""
+
+import os
+import time
+from pathlib import Path
+from statistics import median
+from tempfile import TemporaryDirectory
+
+from eduvpn.netstats import COUNTERS, open_rx_reader
+
+CONNECTIONS = 20
+CALLS = 5000
+IFACE = "tun0"
+UUID = "00000000-0000-0000-0000-000000000000"
+
+
+class FakeDevice:
+    def __init__(self, iface: str):
+        self.iface = iface
+
+    def get_iface(self) -> str:
+        return self.iface
+
+
+class FakeActiveConnection:
+    def __init__(self, uuid: str, iface: str):
+        self.uuid = uuid
+        self.devices = [FakeDevice(iface)]
+
+    def get_uuid(self) -> str:
+        return self.uuid
+
+    def get_devices(self):
+        return self.devices
+
+
+class OldManager:
+    def __init__(self, root: Path):
+        self.root = root
+        self.connections = [FakeActiveConnection(f"other-{i}", f"eth{i}") for i in range(CONNECTIONS)]
+        self.connections.append(FakeActiveConnection(UUID, IFACE))
+
+    @property
+    def uuid(self):
+        p = self.root / "uuid"
+        if p.exists():
+            return open(p, "r").read().strip()
+        return None
+
+    @property
+    def iface(self):
+        for connection in self.connections:
+            if connection.get_uuid() == self.uuid:
+                return connection.get_devices()[0].get_iface()
+        return None
+
+    def get_stats_bytes(self, filehandler):
+        if not self.iface:
+            return None
+        stat = int(filehandler.readline())
+        filehandler.seek(0)
+        return stat
+
+
+def measure(func, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(CALLS):
+            func()
+        timings.append(time.perf_counter() - start)
+    return median(timings) / CALLS
+
+
+def main():
+    with TemporaryDirectory() as tempdir:
+        root = Path(tempdir)
+        (root / "uuid").write_text(UUID)
+        statistics = root / IFACE / "statistics"
+        os.makedirs(statistics)
+        for counter in COUNTERS:
+            (statistics / counter).write_text("123456789\n")
+
+        manager = OldManager(root)
+        rx_file = open(statistics / "rx_bytes", "r")
+
+        def old_callback():
+            rx_bytes = manager.get_stats_bytes(rx_file)
+            return -1 if rx_bytes is None else rx_bytes
+
+        reader = open_rx_reader(IFACE, root)
+        read = reader.rx_bytes
+
+        def new_callback():
+            rx_bytes = read()
+            return -1 if rx_bytes is None else rx_bytes
+
+        assert old_callback() == new_callback() == 123456789
+        old = measure(old_callback) * 1e6
+        new = measure(new_callback) * 1e6
+        print(f"{'callback':<12}{'latency (us)':>14}")
+        print(f"{'old':<12}{old:>14.2f}")
+        print(f"{'pinned fd':<12}{new:>14.2f}")
+        print(f"speedup: {old / new:.1f}x")
+        rx_file.close()
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Measure rendering and sorting the server list with the cached locale resolution,
+compared to resolving the locale for every translation.
+
+Run with: python3 -m benchmarks.i18n
+"""
+
+import locale
+import time
+from statistics import median
+
+from benchmarks.synthetic import organizations, servers
+from eduvpn.discovery import DiscoOrganization, DiscoServer
+from eduvpn.i18n import country, extract_translation, language
+
+ORGANIZATIONS = 5000
+SERVERS = 500
+
+
+def uncached_extract_translation(d):
+    "The translation without any caching, as it was before"
+    if isinstance(d, dict):
+        for m in [country(), language(), "en-US", "en"]:
+            try:
+                return d[m]
+            except KeyError:
+                continue
+        return list(d.values())[0]
+    return d
+
+
+def render_and_sort(entries, extract):
+    rows = [extract(e.display_name) for e in entries]
+    ordered = sorted(entries, key=lambda e: extract(e.search_keys))
+    return rows, ordered
+
+
+def measure(func, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return median(timings)
+
+
+def main():
+    try:
+        locale.setlocale(locale.LC_ALL, "")
+    except locale.Error:
+        pass
+    entries = [DiscoOrganization(o["display_name"], o["org_id"]) for o in organizations(ORGANIZATIONS)]
+    entries += [DiscoServer(s["base_url"], s["display_name"], s["server_type"]) for s in servers(SERVERS)]
+
+    uncached = measure(lambda: render_and_sort(entries, uncached_extract_translation)) * 1000
+    cached = measure(lambda: render_and_sort(entries, extract_translation)) * 1000
+    print(f"locale: {locale.getlocale()}, entries: {len(entries)}")
+    print(f"uncached: {uncached:.2f} ms")
+    print(f"cached:   {cached:.2f} ms")
+    print(f"speedup:  {uncached / cached:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Measure the memory used by the full discovery list with the slotted models,
+compared to the previous dict backed models.
+
+The discovery list is parsed twice, as happens when it is fetched again,
+so that the sharing of identifiers and display names across lists is measured.
+The parse times are measured without tracemalloc, which slows down allocations.
+
+Run with: python3 -m benchmarks.models
+"""
+
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from statistics import median
+
+from benchmarks.synthetic import organizations, servers
+from eduvpn import discovery
+from eduvpn.discovery import (
+    normalize_keywords,
+    normalize_translations,
+    parse_disco_organizations,
+    parse_disco_servers,
+)
+
+ORGANIZATIONS = 5000
+SERVERS = 500
+
+
+class DictDiscoOrganization:
+    "The dict backed organization, without interning or sharing"
+
+    def __init__(self, display_name, org_id, keywords=""):
+        self.display_name = display_name
+        self.org_id = org_id
+        self.keywords = keywords
+        self.search_keys = normalize_translations(display_name)
+        self.keyword_keys = normalize_keywords(keywords)
+
+
+class DictDiscoServer:
+    "The dict backed server, without interning or sharing"
+
+    def __init__(self, base_url, display_name, server_type, keywords=""):
+        self.base_url = base_url
+        self.display_name = display_name
+        self.server_type = server_type
+        self.keywords = keywords
+        self.search_keys = normalize_translations(display_name)
+        self.keyword_keys = normalize_keywords(keywords)
+
+
+def parse_dict_backed(orgs_json: str, srvs_json: str):
+    orgs = [
+        DictDiscoOrganization(o.get("display_name", ""), o["org_id"], o.get("keyword_list", ""))
+        for o in json.loads(orgs_json)["organization_list"]
+    ]
+    srvs = [
+        DictDiscoServer(s["base_url"], s.get("display_name", ""), s["server_type"], s.get("keyword_list", ""))
+        for s in json.loads(srvs_json)["server_list"]
+    ]
+    return orgs + srvs
+
+
+def parse_slotted(orgs_json: str, srvs_json: str):
+    return parse_disco_organizations(orgs_json) + parse_disco_servers(srvs_json)
+
+
+def clear_shared():
+    for table in (
+        discovery.shared_display_names,
+        discovery._shared_search_keys,
+        discovery._shared_keywords,
+        discovery._search_keys,
+        discovery._keyword_keys,
+    ):
+        table._table.clear()
+
+
+def timed(parse, orgs_json: str, srvs_json: str) -> float:
+    gc.collect()
+    start = time.perf_counter()
+    parse(orgs_json, srvs_json)
+    return time.perf_counter() - start
+
+
+def measure(parse, orgs_json: str, srvs_json: str, repeat: int = 5):
+    first = []
+    again = []
+    for _ in range(repeat):
+        clear_shared()
+        first.append(timed(parse, orgs_json, srvs_json))
+        again.append(timed(parse, orgs_json, srvs_json))
+
+    clear_shared()
+    tracemalloc.start()
+    lists = [parse(orgs_json, srvs_json) for _ in range(2)]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return median(first), median(again), current, peak, sys.getsizeof(lists[0][0])
+
+
+def main():
+    orgs_json = json.dumps({"organization_list": organizations(ORGANIZATIONS)})
+    srvs_json = json.dumps({"server_list": servers(SERVERS)})
+    print(f"entries: {ORGANIZATIONS + SERVERS}, parsed twice")
+    print(
+        f"{'models':<14}{'first (ms)':>12}{'again (ms)':>12}{'retained (KiB)':>16}{'peak (KiB)':>12}{'instance (B)':>14}"
+    )
+    for name, parse in [("dict backed", parse_dict_backed), ("slotted", parse_slotted)]:
+        first, again, current, peak, size = measure(parse, orgs_json, srvs_json)
+        print(f"{name:<14}{first * 1000:>12.1f}{again * 1000:>12.1f}{current // 1024:>16}{peak // 1024:>12}{size:>14}")
+
+
+if __name__ == "__main__":
+    main()
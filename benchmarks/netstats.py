@@ -0,0 +1,64 @@
+"""
+Compare the per sample cost of reading the interface counters.
+
+The old way reads one sysfs file per counter with readline and seek,
+the new readers fetch all counters with one netlink request or read
+the sysfs files with os.pread.
+
+Run with: python3 -m benchmarks.netstats [interface]
+"""
+
+import sys
+import time
+from statistics import median
+
+from eduvpn.netstats import COUNTERS, LINUX_NET_FOLDER, NetlinkReader, SysfsReader
+
+SAMPLES = 2000
+
+
+def readline_counters(files):
+    values = []
+    for f in files:
+        values.append(int(f.readline()))
+        f.seek(0)
+    return values
+
+
+def measure(func, *args, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(SAMPLES):
+            func(*args)
+        timings.append(time.perf_counter() - start)
+    return median(timings) / SAMPLES
+
+
+def main():
+    iface = sys.argv[1] if len(sys.argv) > 1 else "lo"
+    directory = LINUX_NET_FOLDER / iface / "statistics"
+    rx_files = [open(directory / "rx_bytes", "r"), open(directory / "tx_bytes", "r")]
+    all_files = [open(directory / counter, "r") for counter in COUNTERS]
+    sysfs = SysfsReader(iface)
+    netlink = NetlinkReader(iface)
+
+    print(f"{'reader':<36}{'per sample (us)':>16}")
+    results = [
+        ("readline rx+tx", measure(readline_counters, rx_files)),
+        ("readline all counters", measure(readline_counters, all_files)),
+        ("sysfs pread rx", measure(sysfs.rx_bytes)),
+        ("sysfs pread all counters", measure(sysfs.read)),
+        ("netlink all counters", measure(netlink.read)),
+    ]
+    for name, timing in results:
+        print(f"{name:<36}{timing * 1e6:>16.2f}")
+
+    for f in rx_files + all_files:
+        f.close()
+    sysfs.close()
+    netlink.close()
+
+
+if __name__ == "__main__":
+    main()
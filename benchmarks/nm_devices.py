@@ -0,0 +1,72 @@
+"""
+Compare finding the WireGuard device of the eduVPN connection by scanning
+all devices with the device index of the state mirror.
+
+NetworkManager is simulated with a fake client with many virtual devices,
+like on a workstation running containers: bridges, veths and tuns, each
+with a few available connections. The WireGuard device is the last one.
+The lookup is done for the MTU on every failover start and on every
+disconnect. This needs the NM typelib to be installed as eduvpn.nm
+imports it.
+
+Run with: python3 -m benchmarks.nm_devices
+"""
+
+import time
+from statistics import median
+
+from eduvpn.nm import NMStateMirror
+from tests.mock_nm import FakeClient, FakeDevice
+
+DEVICES = [50, 200, 1000]
+LOOKUPS = 1000
+UUID = "eduvpn-wireguard"
+
+
+def fake_devices(count: int):
+    types = ["bridge", "veth", "tun", "ethernet"]
+    devices = [
+        FakeDevice(f"dev{i}", types[i % len(types)], [f"connection-{i}-{j}" for j in range(3)]) for i in range(count)
+    ]
+    devices.append(FakeDevice("wg0", "wireguard", [UUID]))
+    return devices
+
+
+def scan(client: FakeClient, uuid: str):
+    # The lookup as it was done before the device index
+    devices = [
+        device
+        for device in client.get_all_devices()
+        if device.get_type_description() == "wireguard"
+        and uuid in {conn.get_uuid() for conn in device.get_available_connections()}
+    ]
+    if not devices:
+        return None
+    return devices[0]
+
+
+def measure(func, *args, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(LOOKUPS):
+            func(*args)
+        timings.append(time.perf_counter() - start)
+    return median(timings) / LOOKUPS
+
+
+def main():
+    print(f"{'devices':<10}{'scan (us)':>12}{'index (us)':>13}{'speedup':>10}{'index build (ms)':>19}")
+    for count in DEVICES:
+        client = FakeClient(0, fake_devices(count))
+        start = time.perf_counter()
+        mirror = NMStateMirror(client)
+        build = (time.perf_counter() - start) * 1000
+        assert scan(client, UUID) is mirror.device(UUID, "wireguard")
+        scan_time = measure(scan, client, UUID) * 1e6
+        index_time = measure(mirror.device, UUID, "wireguard") * 1e6
+        print(f"{count:<10}{scan_time:>12.2f}{index_time:>13.2f}{scan_time / index_time:>9.1f}x{build:>19.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Compare looking up the eduVPN connection by scanning the active
+connections of NetworkManager with the UUID indexed state mirror.
+
+NetworkManager is simulated with a fake client holding hundreds of
+active connections, the eduVPN connection is the last one. This needs
+the NM typelib to be installed as eduvpn.nm imports it.
+
+Run with: python3 -m benchmarks.nm_mirror
+"""
+
+import time
+from statistics import median
+
+from eduvpn.nm import NMStateMirror
+from tests.mock_nm import FakeClient
+
+CONNECTIONS = [50, 200, 800]
+LOOKUPS = 1000
+
+
+def scan(client: FakeClient, uuid: str):
+    # The lookup as it was done for every property before the mirror
+    for connection in client.get_active_connections():
+        if connection.get_uuid() == uuid:
+            devices = connection.get_devices()
+            if not devices:
+                return None
+            return devices[0].get_iface()
+    return None
+
+
+def lookup(mirror: NMStateMirror, uuid: str):
+    snapshot = mirror.get(uuid)
+    if snapshot is None:
+        return None
+    return snapshot.iface
+
+
+def measure(func, *args, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(LOOKUPS):
+            func(*args)
+        timings.append(time.perf_counter() - start)
+    return median(timings) / LOOKUPS
+
+
+def main():
+    print(f"{'connections':<14}{'scan (us)':>12}{'mirror (us)':>14}{'speedup':>10}")
+    for count in CONNECTIONS:
+        client = FakeClient(count)
+        mirror = NMStateMirror(client)
+        uuid = client.connections[-1].get_uuid()
+        assert scan(client, uuid) == lookup(mirror, uuid)
+        scan_time = measure(scan, client, uuid) * 1e6
+        mirror_time = measure(lookup, mirror, uuid) * 1e6
+        print(f"{count:<14}{scan_time:>12.2f}{mirror_time:>14.2f}{scan_time / mirror_time:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
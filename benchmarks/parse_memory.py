@@ -0,0 +1,57 @@
+"""
+Compare the peak memory (tracemalloc) and time of the eager discovery parser
+with the lazy parser that only materializes the entries that are shown.
+
+Run with: python3 -m benchmarks.parse_memory
+"""
+
+import time
+import tracemalloc
+
+from benchmarks.synthetic import organizations_json, servers_json
+from eduvpn.discovery import (
+    parse_disco_organizations,
+    parse_disco_organizations_lazy,
+    parse_disco_servers,
+    parse_disco_servers_lazy,
+)
+
+ORGANIZATIONS = 20000
+SERVERS = 2000
+# The number of rows that are displayed
+SHOWN = 50
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, current, peak
+
+
+def main():
+    orgs_json = organizations_json(ORGANIZATIONS)
+    srvs_json = servers_json(SERVERS)
+
+    def eager():
+        return parse_disco_organizations(orgs_json), parse_disco_servers(srvs_json)
+
+    def lazy():
+        orgs = parse_disco_organizations_lazy(orgs_json)
+        srvs = parse_disco_servers_lazy(srvs_json)
+        shown = orgs[:SHOWN] + srvs[:SHOWN]
+        return orgs, srvs, shown
+
+    print(f"payload: {len(orgs_json) + len(srvs_json)} bytes, {ORGANIZATIONS + SERVERS} entries, {SHOWN} shown")
+    print(f"{'parser':<10}{'time (ms)':>12}{'retained (KiB)':>16}{'peak (KiB)':>12}")
+    for name, func in [("eager", eager), ("lazy", lazy)]:
+        elapsed, current, peak = measure(func)
+        print(f"{name:<10}{elapsed * 1000:>12.1f}{current // 1024:>16}{peak // 1024:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compare the number of ProxyGuard peer routing rules and the time to compute
+them when one rule is added per peer IP with aggregating the peer IPs into
+at most MAX_PROXY_RULES covering networks per address family.
+
+The peer IPs are generated like the addresses of a CDN fronted peer:
+clusters of addresses in a few networks of both address families.
+The NM rule objects themselves are not built as that needs the NM typelib.
+
+Run with: python3 -m benchmarks.proxy_rules
+"""
+
+import random
+import time
+from ipaddress import IPv4Address, IPv6Address, ip_address
+from statistics import median
+
+from eduvpn.connection import aggregate_networks
+
+# Keep in sync with eduvpn.nm.MAX_PROXY_RULES, eduvpn.nm needs the NM typelib
+MAX_PROXY_RULES = 8
+PEER_IPS = [10, 100, 1000]
+BUILDS = 50
+
+
+def cdn_peer_ips(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    ipv4_clusters = [rng.randrange(1, 224) << 24 | rng.randrange(0, 1 << 24) & ~0xFFFF for _ in range(12)]
+    ipv6_clusters = [0x2001_0DB8 << 96 | rng.randrange(0, 1 << 32) << 64 for _ in range(6)]
+    peer_ips = []
+    for i in range(count):
+        if i % 4 == 3:
+            peer_ips.append(str(IPv6Address(rng.choice(ipv6_clusters) | rng.randrange(0, 1 << 16))))
+        else:
+            peer_ips.append(str(IPv4Address(rng.choice(ipv4_clusters) | rng.randrange(0, 1 << 16))))
+    return peer_ips
+
+
+def per_address(peer_ips):
+    # The rule destinations as they were computed before aggregating
+    rules = []
+    for version, prefixlen in ((4, 32), (6, 128)):
+        for peer_ip in peer_ips:
+            if ip_address(peer_ip).version == version:
+                rules.append((peer_ip, prefixlen))
+    return rules
+
+
+def aggregated(peer_ips):
+    return [
+        (str(network.network_address), network.prefixlen) for network in aggregate_networks(peer_ips, MAX_PROXY_RULES)
+    ]
+
+
+def measure(func, *args, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(BUILDS):
+            func(*args)
+        timings.append(time.perf_counter() - start)
+    return median(timings) / BUILDS
+
+
+def main():
+    print(f"{'peer ips':<10}{'rules':>8}{'time (us)':>12}{'aggregated':>12}{'time (us)':>12}")
+    for count in PEER_IPS:
+        peer_ips = cdn_peer_ips(count)
+        old_rules = per_address(peer_ips)
+        new_rules = aggregated(peer_ips)
+        old = measure(per_address, peer_ips) * 1e6
+        new = measure(aggregated, peer_ips) * 1e6
+        print(f"{count:<10}{len(old_rules):>8}{old:>12.1f}{len(new_rules):>12}{new:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
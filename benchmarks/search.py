@@ -0,0 +1,95 @@
+"""
+Compare the per keystroke latency of the in-process search index
+with searching through eduvpn-common.
+
+The eduvpn-common path is simulated with a fake wrapper that returns the
+pre-serialized JSON of the search results, so only the Python side of the
+FFI path (parsing and building the objects) is measured.
+
+Run with: python3 -m benchmarks.search
+"""
+
+import json
+import time
+from statistics import median
+
+from benchmarks.synthetic import organizations, servers
+from eduvpn.server import ServerDatabase
+
+ORGANIZATIONS = 5000
+SERVERS = 500
+QUERIES = ["university of sc", "tromsø", "idp42", "hogeschool applied"]
+
+
+def matches(entry, query: str) -> bool:
+    haystack = " ".join(entry["display_name"].values()).casefold()
+    keywords = entry.get("keyword_list", "")
+    if isinstance(keywords, dict):
+        keywords = " ".join(keywords.values())
+    haystack += " " + keywords.casefold()
+    return all(token in haystack for token in query.casefold().split())
+
+
+class FakeWrapper:
+    def __init__(self):
+        self.orgs = organizations(ORGANIZATIONS)
+        self.servers = servers(SERVERS)
+        self.responses = {}
+
+    def prepare(self, query: str):
+        orgs = [o for o in self.orgs if matches(o, query)]
+        srvs = [s for s in self.servers if matches(s, query)]
+        self.responses[query] = (
+            json.dumps({"organization_list": orgs}),
+            json.dumps({"server_list": srvs}),
+        )
+
+    def get_servers(self) -> str:
+        return "{}"
+
+    def get_disco_organizations(self, search: str = "") -> str:
+        return self.responses[search][0]
+
+    def get_disco_servers(self, search: str = "") -> str:
+        return self.responses[search][1]
+
+
+def keystrokes(query: str):
+    return [query[:i] for i in range(1, len(query) + 1)]
+
+
+def measure(func, query: str, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(query)
+        timings.append(time.perf_counter() - start)
+    return median(timings)
+
+
+def main():
+    wrapper = FakeWrapper()
+    server_db = ServerDatabase(wrapper)
+    wrapper.prepare("")
+    start = time.perf_counter()
+    server_db.disco_update()
+    print(f"initial discovery list: {len(server_db.cached)} entries, {time.perf_counter() - start:.3f}s")
+    for query in QUERIES:
+        for q in keystrokes(query):
+            wrapper.prepare(q)
+
+    print(f"{'query':<24}{'results':>8}{'ffi (ms)':>12}{'index (ms)':>12}{'speedup':>10}")
+    for query in QUERIES:
+        ffi_total = index_total = 0.0
+        for q in keystrokes(query):
+            ffi_total += measure(server_db.disco_update, q)
+            index_total += measure(server_db.search_predefined, q)
+        strokes = len(query)
+        ffi_avg = ffi_total / strokes * 1000
+        index_avg = index_total / strokes * 1000
+        results = len(server_db.search_predefined(query))
+        print(f"{query:<24}{results:>8}{ffi_avg:>12.3f}{index_avg:>12.3f}{ffi_avg / index_avg:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compare loading the discovery list from the on-disk snapshot
+with parsing the discovery JSON, as done on a cold start.
+
+Both sides do the same work: they end with the discovery list published
+in a ServerDatabase, together with its key index and search index. The
+sharing tables are cleared before every run, as they are empty when the
+client starts.
+
+Run with: python3 -m benchmarks.snapshot
+"""
+
+import gc
+import tempfile
+import time
+from pathlib import Path
+from statistics import median
+
+from benchmarks.models import clear_shared
+from benchmarks.synthetic import organizations_json, servers_json
+from eduvpn.discovery import dump_snapshot, parse_disco_organizations, parse_disco_servers
+from eduvpn.server import ServerDatabase
+
+ORGANIZATIONS = 5000
+SERVERS = 500
+
+
+def measure(func, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        clear_shared()
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return median(timings)
+
+
+def main():
+    orgs_json = organizations_json(ORGANIZATIONS)
+    srvs_json = servers_json(SERVERS)
+
+    def parse():
+        return parse_disco_organizations(orgs_json) + parse_disco_servers(srvs_json)
+
+    def fetch():
+        ServerDatabase(None).cached = parse()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "discovery.snapshot"
+        path.write_bytes(dump_snapshot(parse()))
+
+        def load():
+            assert ServerDatabase(None, snapshot_path=path).load_snapshot()
+
+        parse_time = measure(fetch) * 1000
+        load_time = measure(load) * 1000
+        print(f"entries: {ORGANIZATIONS + SERVERS}")
+        print(f"json:     {len(orgs_json) + len(srvs_json):>10} bytes {parse_time:>10.3f} ms")
+        print(f"snapshot: {path.stat().st_size:>10} bytes {load_time:>10.3f} ms")
+        print(f"speedup: {parse_time / load_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
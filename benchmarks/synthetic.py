@@ -0,0 +1,84 @@
+"""
+Synthetic discovery data for the benchmarks.
+"""
+
+import json
+import random
+from typing import Any, Dict, List
+
+WORDS = [
+    "University",
+    "Hogeschool",
+    "Universität",
+    "Université",
+    "College",
+    "Institute",
+    "Technology",
+    "Applied",
+    "Sciences",
+    "Research",
+    "National",
+    "Medical",
+    "Center",
+    "Academy",
+    "Library",
+    "Network",
+]
+
+PLACES = [
+    "Amsterdam",
+    "Utrecht",
+    "Tromsø",
+    "Zürich",
+    "Kraków",
+    "Lisboa",
+    "Göteborg",
+    "Reykjavík",
+    "Dublin",
+    "Brno",
+    "Tallinn",
+    "Sevilla",
+]
+
+
+def display_name(rng: random.Random, i: int) -> Dict[str, str]:
+    words = rng.sample(WORDS, 2)
+    place = rng.choice(PLACES)
+    name = f"{words[0]} of {words[1]} {place} {i}"
+    return {"en": name, "nl": f"{words[1]} {words[0]} {place} {i}", "de": f"{name} (de)"}
+
+
+def organizations(count: int, seed: int = 1) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    orgs = []
+    for i in range(count):
+        orgs.append(
+            {
+                "display_name": display_name(rng, i),
+                "org_id": f"https://idp{i}.example.org/saml",
+                "secure_internet_home": f"https://vpn{i % 40}.example.org/",
+                "keyword_list": {"en": f"idp{i} {rng.choice(PLACES).lower()}"},
+            }
+        )
+    return orgs
+
+
+def servers(count: int, seed: int = 2) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [
+        {
+            "base_url": f"https://vpn{i}.example.org/",
+            "display_name": display_name(rng, i),
+            "server_type": "institute_access" if i % 10 else "secure_internet",
+            "keyword_list": f"vpn{i}",
+        }
+        for i in range(count)
+    ]
+
+
+def organizations_json(count: int) -> str:
+    return json.dumps({"organization_list": organizations(count)})
+
+
+def servers_json(count: int) -> str:
+    return json.dumps({"server_list": servers(count)})
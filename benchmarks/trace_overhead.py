@@ -0,0 +1,50 @@
+"""
+Measure the cost of a traced span when tracing is disabled, as it is
+unless EDUVPN_TRACE is set, and when it is enabled.
+
+Run with: python3 -m benchmarks.trace_overhead
+"""
+
+import time
+from pathlib import Path
+from statistics import median
+
+from eduvpn.trace import Tracer
+
+SPANS = 100000
+
+
+def begin_end(tracer: Tracer):
+    tracer.end(tracer.begin("nm.add_connection"))
+
+
+def with_span(tracer: Tracer):
+    with tracer.span("parse"):
+        pass
+
+
+def nothing(tracer: Tracer):
+    pass
+
+
+def measure(func, tracer: Tracer, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(SPANS):
+            func(tracer)
+        timings.append(time.perf_counter() - start)
+    return median(timings) / SPANS
+
+
+def main():
+    disabled = Tracer()
+    baseline = measure(nothing, disabled) * 1e9
+    print(f"{'span':<12}{'disabled (ns)':>15}{'enabled (ns)':>15}")
+    for name, func in [("begin/end", begin_end), ("with", with_span)]:
+        enabled = measure(func, Tracer(Path("trace.json"))) * 1e9 - baseline
+        print(f"{name:<12}{measure(func, disabled) * 1e9 - baseline:>15.0f}{enabled:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
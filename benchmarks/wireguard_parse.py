@@ -0,0 +1,78 @@
+"""
+Compare parsing a WireGuard config with configparser, followed by splitting
+and parsing the addresses, DNS entries and allowed IPs as it was done when
+building the NetworkManager profile, with the single pass parser.
+
+The old path passed the allowed IPs to NetworkManager as strings, the single
+pass parser returns them as ip_network objects. The third column is the old
+path with the allowed IPs also parsed with ip_network, to compare equal work.
+
+Run with: python3 -m benchmarks.wireguard_parse
+"""
+
+import time
+from configparser import ConfigParser
+from ipaddress import ip_address, ip_interface, ip_network
+from statistics import median
+
+from eduvpn.connection import parse_wireguard
+
+PARSES = 2000
+
+
+def wireguard_config(allowed_ips: int) -> str:
+    networks = ", ".join(f"10.{i // 256}.{i % 256}.0/24" for i in range(allowed_ips))
+    return f"""[Interface]
+PrivateKey = aGVsbG8gd29ybGQgaGVsbG8gd29ybGQgaGVsbG8gd28=
+Address = 10.10.10.2/24, fd00:4242:4242:4242::2/64
+DNS = 9.9.9.9, 2620:fe::fe, example.org
+
+[Peer]
+PublicKey = d29ybGQgaGVsbG8gd29ybGQgaGVsbG8gd29ybGQgaGU=
+AllowedIPs = {networks}, fd00::/8
+Endpoint = vpn.example.org:51820
+"""
+
+
+def configparser_path(config_str: str):
+    config = ConfigParser()
+    config.read_string(config_str)
+    addresses = [ip_interface(ip.strip()) for ip in config["Interface"]["Address"].split(",")]
+    dns = []
+    search = []
+    for entry in config["Interface"]["DNS"].split(","):
+        try:
+            dns.append(ip_address(entry.strip()))
+        except ValueError:
+            search.append(entry.strip())
+    allowed_ips = [ip.strip() for ip in config["Peer"]["AllowedIPs"].split(",")]
+    return addresses, dns, search, allowed_ips, config["Interface"]["PrivateKey"]
+
+
+def configparser_networks_path(config_str: str):
+    addresses, dns, search, allowed_ips, private_key = configparser_path(config_str)
+    return addresses, dns, search, [ip_network(ip, strict=False) for ip in allowed_ips], private_key
+
+
+def measure(func, *args, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(PARSES):
+            func(*args)
+        timings.append(time.perf_counter() - start)
+    return median(timings) / PARSES
+
+
+def main():
+    print(f"{'allowed ips':<14}{'configparser (us)':>19}{'+ ip_network (us)':>19}{'single pass (us)':>18}")
+    for allowed_ips in [2, 20, 200]:
+        config_str = wireguard_config(allowed_ips)
+        old = measure(configparser_path, config_str) * 1e6
+        old_networks = measure(configparser_networks_path, config_str) * 1e6
+        new = measure(parse_wireguard, config_str) * 1e6
+        print(f"{allowed_ips:<14}{old:>19.1f}{old_networks:>19.1f}{new:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,16 @@ import json
 import logging
 import os
 import signal
+import threading
 import time
 import webbrowser
-from typing import Any, Callable, Iterator, Optional, TextIO
+from typing import Any, Callable, Iterator, Optional
 
 from eduvpn_common.main import EduVPN, ServerType, WrappedError
 from eduvpn_common.state import State, StateType
 from eduvpn_common.types import ProxyReady, ProxySetup, ReadRxBytes, RefreshList  # type: ignore[attr-defined]
 
-from eduvpn import nm
+from eduvpn import nm, trace
 from eduvpn.config import Configuration
 from eduvpn.connection import (
     Config,
@@ -21,8 +22,17 @@ from eduvpn.connection import (
     parse_tokens,
 )
 from eduvpn.keyring import DBusKeyring, InsecureFileKeyring, TokenKeyring
-from eduvpn.server import ServerDatabase, parse_profiles, parse_required_transition
+from eduvpn.netstats import StatsReader
+from eduvpn.server import (
+    ServerDatabase,
+    ServerView,
+    diff_servers,
+    parse_profiles,
+    parse_required_transition,
+)
+from eduvpn.settings import DISCOVERY_SNAPSHOT_FILENAME
 from eduvpn.utils import (
+    StageTimings,
     handle_exception,
     model_transition,
     run_in_background_thread,
@@ -30,6 +40,7 @@ from eduvpn.utils import (
     set_failovered,
     set_online_detecting,
     set_server_list_refresh,
+    when_all,
 )
 from eduvpn.variants import ApplicationVariant
 
@@ -39,12 +50,21 @@ logger = logging.getLogger(__name__)
 class ApplicationModelTransitions:
     def __init__(self, common: EduVPN, variant: ApplicationVariant) -> None:
         self.common = common
+        self.server_db = ServerDatabase(
+            common, variant.use_predefined_servers, variant.config_prefix / DISCOVERY_SNAPSHOT_FILENAME
+        )
+        # This must be registered before any other callbacks
+        self.server_db.track_transitions(common.event_handler)
         self.common.register_class_callbacks(self)
-        self.server_db = ServerDatabase(common, variant.use_predefined_servers)
+        # Load the last discovery list so that it can be searched before discovery is fetched,
+        # the snapshot includes the search index so this does not parse or index the list
+        self.server_db.load_snapshot()
 
     @model_transition(State.MAIN, StateType.ENTER)
     def get_previous_servers(self, old_state: State, data):
         logger.debug(f"Transition: MAIN, old state: {old_state}")
+        # A server could have been added, removed or changed before going back to the main state
+        self.server_db.invalidate()
         return self.server_db.configured
 
     @model_transition(State.DEREGISTERED, StateType.ENTER)
@@ -100,6 +120,8 @@ class ApplicationModelTransitions:
     @model_transition(State.GOT_CONFIG, StateType.ENTER)
     def parse_config(self, old_state: State, data):
         logger.debug(f"Transition: GOT_CONFIG, old state: {old_state}")
+        # The profile and location could have been chosen while getting the config
+        self.server_db.invalidate()
         return self.server_db.current
 
     @run_in_background_thread("open-browser")
@@ -159,7 +181,25 @@ class ApplicationModel:
         return self._keyring
 
     def refresh_list(self):
-        set_server_list_refresh(self.common, self.server_db.configured)
+        # The server list has been refreshed by discovery, e.g. servers can be delisted
+        # Compare with the last snapshot, the current one can already contain the changes if it was invalidated
+        previous = self.server_db.last_configured
+        self.server_db.invalidate()
+        delta = diff_servers(previous, self.server_db.configured)
+        logger.debug(f"Server list refreshed: {delta!r}")
+        if delta:
+            set_server_list_refresh(self.common, delta)
+        self.reconcile_discovery()
+
+    @run_in_background_thread("reconcile-discovery")
+    def reconcile_discovery(self):
+        # Replace the discovery list from the snapshot with the fresh one
+        if not self.variant.use_predefined_servers:
+            return
+        try:
+            self.server_db.disco_update()
+        except Exception as e:
+            logger.warning(f"Failed to update the discovery list: {e}")
 
     def register(self, debug: bool):
         self.common.register(debug=debug)
@@ -182,11 +222,19 @@ class ApplicationModel:
     def current_server(self):
         return self.server_db.current
 
-    def get_failover_rx(self, filehandler: Optional[TextIO]) -> int:
-        rx_bytes = self.nm_manager.get_stats_bytes(filehandler)
-        if rx_bytes is None:
-            return -1
-        return rx_bytes
+    def failover_rx_callback(self, reader: StatsReader) -> Callable[[], int]:
+        """
+        Get the callback for eduvpn-common to read the received bytes during failover
+
+        It is called in a tight loop, so it only does one read on the already opened reader.
+        """
+        read = reader.rx_bytes
+
+        def read_rx() -> int:
+            rx_bytes = read()
+            return -1 if rx_bytes is None else rx_bytes
+
+        return read_rx
 
     def should_failover(self):
         if self._should_failover:
@@ -209,9 +257,9 @@ class ApplicationModel:
     @run_in_background_thread("start-failover")
     def start_failover(self, callback: Callable):
         try:
-            rx_bytes_file = self.nm_manager.open_stats_file("rx_bytes")
-            if rx_bytes_file is None:
-                logger.error("Failed to initialize failover, failed to open rx bytes file")
+            stats_reader = self.nm_manager.open_rx_reader()
+            if stats_reader is None:
+                logger.error("Failed to initialize failover, failed to open the interface statistics")
                 callback(False)
                 return
             endpoint = self.nm_manager.failover_endpoint_ip
@@ -228,12 +276,19 @@ class ApplicationModel:
             )
             failover_delay = float(os.getenv("EDUVPN_FAILOVER_DELAY", 1))
             logger.debug(f"Sleeping for {failover_delay}s to begin failover")
-            time.sleep(failover_delay)
-            dropped = self.common.start_failover(
-                endpoint,
-                mtu,
-                ReadRxBytes(lambda: self.get_failover_rx(rx_bytes_file)),
-            )
+            with trace.span("failover.delay", "failover"):
+                time.sleep(failover_delay)
+            span = trace.begin("failover", "failover", mtu=mtu)
+            try:
+                dropped = self.common.start_failover(
+                    endpoint,
+                    mtu,
+                    ReadRxBytes(self.failover_rx_callback(stats_reader)),
+                )
+            finally:
+                stats_reader.close()
+                trace.end(span)
+                trace.dump()
 
             if dropped:
                 logger.debug("Failover exited, connection is dropped")
@@ -250,6 +305,7 @@ class ApplicationModel:
         if server.country_code == country_code:
             return
         self.common.set_secure_location(server.org_id, country_code)
+        self.server_db.invalidate()
         self.common.set_state(State.MAIN)
 
     def go_back(self):
@@ -258,11 +314,13 @@ class ApplicationModel:
 
     def add(self, server, callback=None):
         self.common.add_server(server.category_id, server.identifier)
+        self.server_db.invalidate()
         if callback:
             callback(server)
 
     def remove(self, server):
         self.common.remove_server(server.category_id, server.identifier)
+        self.server_db.invalidate()
         # Delete tokens from the keyring
         self.clear_tokens(server.category_id, server.identifier)
         self.common.set_state(State.MAIN)
@@ -332,17 +390,38 @@ class ApplicationModel:
         self._peer_ips_proxy = json.loads(peer_ips)
 
     @run_in_background_thread("start-proxy")
-    def start_proxy(self, proxy, callback):
+    def start_proxy(
+        self,
+        proxy,
+        callback,
+        setup_callback: Optional[Callable] = None,
+        error_callback: Optional[Callable] = None,
+    ):
+        ready = threading.Event()
+
+        def on_setup(fd, peer_ips):
+            trace.instant("proxy.setup")
+            self.on_proxy_setup(fd, peer_ips)
+            if setup_callback:
+                setup_callback()
+
+        def on_ready():
+            ready.set()
+            callback()
+
         try:
-            self.common.start_proxyguard(
+            self.common.start_proxyguard(  # type: ignore[attr-defined]
                 proxy.listen,
                 proxy.source_port,
                 proxy.peer,
-                ProxySetup(self.on_proxy_setup),
-                ProxyReady(lambda: callback()),
+                ProxySetup(on_setup),
+                ProxyReady(on_ready),
             )
         except Exception as e:
             handle_exception(self.common, e)
+            # The proxy failed before the connection could be activated
+            if error_callback and not ready.is_set():
+                error_callback()
 
     def connect(
         self,
@@ -354,7 +433,11 @@ class ApplicationModel:
         # to override the prefer TCP setting
         if os.environ.get("EDUVPN_PREFER_TCP", "0") == "1":
             prefer_tcp = True
+        # The NetworkManager profile is set while the proxy comes up
+        stages = StageTimings("connect")
+        stages.begin("config")
         config = self.connect_get_config(server, prefer_tcp=prefer_tcp)
+        stages.end("config")
         if not config:
             logger.warning("no configuration available")
             if callback:
@@ -402,6 +485,9 @@ class ApplicationModel:
             self.reconnect_tcp(on_reconnected)
 
         def on_connected(success: bool):
+            stages.end("activate")
+            logger.debug(stages.summary())
+            trace.dump()
             if success:
                 # failover should not continue
                 if not self.should_failover():
@@ -413,17 +499,49 @@ class ApplicationModel:
             else:
                 on_fail()
 
-        def on_connect(success: bool):
+        def on_ready(success: bool):
             if success:
+                stages.begin("activate")
                 self.nm_manager.activate_connection(on_connected)
             else:
                 on_fail()
 
+        # Activate when the profile is set and the proxy, if any, is ready
+        ready = when_all(2 if config.proxy else 1, on_ready)
+
+        # With a proxy the profile is set before the proxy is ready, if the proxy fails it is deleted
+        profile_lock = threading.Lock()
+        profile_started = threading.Event()
+        profile_set = threading.Event()
+        proxy_failed = threading.Event()
+
+        def delete_profile():
+            def on_deleted(success: bool):
+                logger.debug(f"deleted the profile after the proxy failed: {success}")
+
+            self.nm_manager.delete_connection(on_deleted)
+
+        def on_connect(success: bool):
+            stages.end("profile")
+            with profile_lock:
+                if success:
+                    profile_set.set()
+                delete = success and proxy_failed.is_set()
+            if delete:
+                delete_profile()
+            ready(success)
+
         @run_in_glib_thread
         def connect(config):
+            with profile_lock:
+                if proxy_failed.is_set():
+                    return
+                profile_started.set()
+            stages.begin("profile")
             if not self.common.in_state(State.CONNECTING):
                 self.common.set_state(State.CONNECTING)
-            connection = Connection.parse(config)
+            with trace.span("parse"):
+                connection = Connection.parse(config)
             connection.connect(
                 self.nm_manager,
                 config.default_gateway,
@@ -436,7 +554,34 @@ class ApplicationModel:
             self._peer_ips_proxy = None
 
         if config.proxy:
-            self.start_proxy(config.proxy, lambda: connect(config))
+            started = threading.Lock()
+
+            # The profile needs the peer IPs of the proxy, which are known before it is ready
+            def connect_once():
+                if started.acquire(blocking=False):
+                    connect(config)
+
+            def on_proxy_ready():
+                stages.end("proxy")
+                connect_once()
+                ready(True)
+
+            @run_in_glib_thread
+            def on_proxy_failed():
+                stages.end("proxy")
+                with profile_lock:
+                    proxy_failed.set()
+                    # A profile that is still being set is deleted when it is set
+                    delete = profile_set.is_set()
+                if delete:
+                    delete_profile()
+                if profile_started.is_set() and self.common.in_state(State.CONNECTING):
+                    self.common.set_state(State.DISCONNECTING)
+                    self.common.set_state(State.DISCONNECTED)
+                ready(False)
+
+            stages.begin("proxy")
+            self.start_proxy(config.proxy, on_proxy_ready, connect_once, on_proxy_failed)
         else:
             connect(config)
 
@@ -445,8 +590,8 @@ class ApplicationModel:
             if success:
                 self.activate_connection(callback, prefer_tcp=prefer_tcp)
 
-        # Reconnect
-        self.deactivate_connection(on_disconnected)
+        # Reconnect, the connection is kept so that it is updated instead of added again
+        self.deactivate_connection(on_disconnected, delete=False)
 
     # https://github.com/eduvpn/documentation/blob/v3/API.md#session-expiry
     def renew_session(self, callback: Optional[Callable] = None):
@@ -466,12 +611,12 @@ class ApplicationModel:
 
         if was_connected:
             # Call /disconnect and reconnect with callback
-            self.deactivate_connection(reconnect)
+            self.deactivate_connection(reconnect, delete=False)
         else:
             reconnect()
 
-    def disconnect(self, callback: Optional[Callable] = None) -> None:
-        self.nm_manager.deactivate_connection(callback)
+    def disconnect(self, callback: Optional[Callable] = None, delete: bool = True) -> None:
+        self.nm_manager.deactivate_connection(callback, delete)
 
     def set_profile(self, profile: str, connect=False):
         was_connected = self.common.in_state(State.CONNECTED)
@@ -481,6 +626,7 @@ class ApplicationModel:
                 return
             # Set the profile ID
             self.common.set_profile(profile)
+            self.server_db.invalidate()
 
             # Connect if we should and if we were previously connected
             if connect and was_connected:
@@ -490,7 +636,7 @@ class ApplicationModel:
         # and the connection should be modified
         # the do_profile will be called in the callback
         if was_connected and connect:
-            self.deactivate_connection(do_profile)
+            self.deactivate_connection(do_profile, delete=False)
         else:
             do_profile()
 
@@ -542,7 +688,7 @@ class ApplicationModel:
         if callback:
             callback()
 
-    def deactivate_connection(self, callback: Optional[Callable] = None, cleanup=True) -> None:
+    def deactivate_connection(self, callback: Optional[Callable] = None, cleanup=True, delete=True) -> None:
         curr = None
         if self.common.in_state(State.CONNECTED):
             curr = State.CONNECTED
@@ -576,11 +722,14 @@ class ApplicationModel:
                 if callback:
                     callback(False)
 
-        self.disconnect(on_disconnected)
+        self.disconnect(on_disconnected, delete)
 
     def search_predefined(self, query: str) -> Iterator[Any]:
         return self.server_db.search_predefined(query)
 
+    def search_view(self, query: str) -> Optional[ServerView]:
+        return self.server_db.search_view(query)
+
     def search_custom(self, query: str) -> Iterator[Any]:
         return self.server_db.search_custom(query)
 
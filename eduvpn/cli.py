@@ -4,6 +4,7 @@ import argparse
 import readline  # noqa: F401
 import signal
 import sys
+import time
 from functools import partial
 from typing import Optional
 
@@ -16,14 +17,15 @@ from eduvpn import __version__
 from eduvpn.app import Application
 from eduvpn.connection import parse_expiry
 from eduvpn.i18n import retrieve_country_name
+from eduvpn.netstats import StatsSampler
 from eduvpn.server import (
     InstituteServer,
     Profile,
     SecureInternetServer,
     Server,
-    ServerDatabase,
     ServerGroup,
-    group_servers,
+    ServerView,
+    server_view,
 )
 from eduvpn.settings import (
     CLIENT_ID,
@@ -37,27 +39,14 @@ from eduvpn.utils import (
     FAILOVERED_STATE,
     ONLINEDETECT_STATE,
     cmd_transition,
+    get_human_readable_bytes,
     init_logger,
     run_in_background_thread,
 )
 from eduvpn.variants import EDUVPN, LETS_CONNECT, ApplicationVariant
 
-
-def get_grouped_index(servers, index, sort=True):
-    if index < 0 or index >= len(servers):
-        return None
-
-    grouped_servers = group_servers(servers)
-    if not sort:
-        return (
-            grouped_servers[ServerGroup.INSTITUTE_ACCESS]
-            + grouped_servers[ServerGroup.SECURE_INTERNET]
-            + grouped_servers[ServerGroup.OTHER]
-        )[index]
-    servers_added = sorted(grouped_servers[ServerGroup.INSTITUTE_ACCESS], key=lambda x: str(x))
-    servers_added += sorted(grouped_servers[ServerGroup.SECURE_INTERNET], key=lambda x: str(x))
-    servers_added += sorted(grouped_servers[ServerGroup.OTHER], key=lambda x: str(x))
-    return servers_added[index]
+# The number of seconds to measure the transfer rate for the status command
+STATUS_SAMPLE_INTERVAL = 0.5
 
 
 def ask_profiles(setter, profiles, current: Optional[Profile] = None) -> bool:
@@ -129,7 +118,8 @@ class CommandLine:
         self.common = common
         self.app = Application(variant, common)
         self.nm_manager = self.app.nm_manager
-        self.server_db = ServerDatabase(common, variant.use_predefined_servers)
+        # Share the server database with the model such that the configured servers snapshot stays coherent
+        self.server_db = self.app.model.server_db
         self.transitions = CommandLineTransitions(self.app, self.nm_manager)
         self.skip_yes = False
         self.common.register_class_callbacks(self.transitions)
@@ -148,7 +138,8 @@ class CommandLine:
 
     def ask_server_input(self, servers, fallback_search=False, query=""):
         print("Multiple servers found:")
-        self.list_groups(group_servers(servers), query == "")
+        view = server_view(servers, query == "")
+        self.list_groups(view)
 
         while True:
             if fallback_search:
@@ -157,7 +148,7 @@ class CommandLine:
                 server_nr = input("\nPlease select a server number: ")
             try:
                 server_index = int(server_nr)
-                server = get_grouped_index(servers, server_index - 1, query == "")
+                server = view.get(server_index - 1)
                 if not server:
                     print(f"Invalid server number: {server_index}")
                 else:
@@ -295,19 +286,19 @@ class CommandLine:
         elif custom_url:
             server = Server(custom_url, {"en": "Custom Server"})
         elif number is not None:
-            server = get_grouped_index(self.server_db.configured, number - 1)
+            server = self.server_db.configured_view().get(number - 1)
             if not server:
                 print(f"Configured server with number: {number} does not exist")
         elif number_all is not None:
-            servers = self.get_discovery()
-            server = get_grouped_index(servers, number_all - 1)
+            self.get_discovery()
+            server = self.server_db.disco_view().get(number_all - 1)
             if not server:
                 print(
                     f"Server with number: {number_all} does not exist. Maybe the server list had an update? Make sure to re-run list --all"
                 )
         return server
 
-    def status(self, _args={}):
+    def status(self, args={}):
         if not self.common.in_state(State.CONNECTED):
             print("You are currently not connected to a server", file=sys.stderr)
             return False
@@ -321,6 +312,33 @@ class CommandLine:
         if isinstance(current, SecureInternetServer):
             print(f"Current location: {retrieve_country_name(current.country_code)}")
         print(f"VPN Protocol: {self.nm_manager.protocol}")
+        if args.get("rate"):
+            self.print_transfer_rate()
+        else:
+            self.print_transferred()
+
+    def print_transferred(self):
+        reader = self.nm_manager.open_stats_reader()
+        if reader is None:
+            return
+        stats = reader.read()
+        reader.close()
+        if stats is None:
+            return
+        print(f"Received: {get_human_readable_bytes(stats.rx_bytes)}")
+        print(f"Sent: {get_human_readable_bytes(stats.tx_bytes)}")
+
+    def print_transfer_rate(self):
+        sampler = StatsSampler(self.nm_manager.open_stats_reader, STATUS_SAMPLE_INTERVAL)
+        if sampler.sample():
+            time.sleep(STATUS_SAMPLE_INTERVAL)
+            sampler.sample()
+        rate = sampler.rate()
+        sampler.stop()
+        if rate is None:
+            return
+        print(f"Receiving: {get_human_readable_bytes(int(rate[0]))}/s")
+        print(f"Sending: {get_human_readable_bytes(int(rate[1]))}/s")
 
     def connect(self, variables={}):
         if self.common.in_state(State.CONNECTED):
@@ -356,16 +374,13 @@ class CommandLine:
 
         nm.action_with_mainloop(disconnect)
 
-    def list_groups(self, grouped_servers, sort=True):
+    def list_groups(self, view: ServerView):
         total_servers = 1
-        if len(grouped_servers[ServerGroup.INSTITUTE_ACCESS]) > 0:
+        ias = view.groups[ServerGroup.INSTITUTE_ACCESS]
+        if len(ias) > 0:
             print("============================")
             print("Institute Access Servers")
             print("============================")
-
-        ias = grouped_servers[ServerGroup.INSTITUTE_ACCESS]
-        if sort:
-            ias = sorted(ias, key=lambda x: str(x))
         for institute in ias:
             prefix = ""
             if getattr(institute, "delisted", False):
@@ -373,10 +388,8 @@ class CommandLine:
             print(f"[{total_servers}]: {prefix}{str(institute)}")
             total_servers += 1
 
-        sis = grouped_servers[ServerGroup.SECURE_INTERNET]
-        if sis:
-            sis = sorted(sis, key=lambda x: str(x))
-        if len(grouped_servers[ServerGroup.SECURE_INTERNET]) > 0:
+        sis = view.groups[ServerGroup.SECURE_INTERNET]
+        if len(sis) > 0:
             print("============================")
             print("Secure Internet Server")
             print("============================")
@@ -387,10 +400,8 @@ class CommandLine:
             print(f"[{total_servers}]: {prefix}{str(secure)}")
             total_servers += 1
 
-        custs = grouped_servers[ServerGroup.OTHER]
-        if custs:
-            custs = sorted(custs, key=lambda x: str(x))
-        if len(grouped_servers[ServerGroup.OTHER]) > 0:
+        custs = view.groups[ServerGroup.OTHER]
+        if len(custs) > 0:
             print("============================")
             print("Custom Servers")
             print("============================")
@@ -401,10 +412,12 @@ class CommandLine:
             print("The number for the server is in [brackets]")
 
     def list(self, args={}):
-        servers = self.server_db.configured
         if args.get("all"):
-            servers = self.get_discovery()
-        self.list_groups(group_servers(servers))
+            self.get_discovery()
+            view = self.server_db.disco_view()
+        else:
+            view = self.server_db.configured_view()
+        self.list_groups(view)
 
     def remove_server(self, server):
         if not server:
@@ -463,6 +476,8 @@ class CommandLine:
 
         def setter(loc):
             self.app.common.set_secure_location(server.org_id, loc)
+            # The cached secure internet server still has the old location
+            self.server_db.invalidate()
 
         ask_locations(setter, server.locations)
 
@@ -524,7 +539,7 @@ class CommandLine:
             if number is None:
                 print("Please enter a number")
                 return
-            server = get_grouped_index(self.server_db.configured, number - 1)
+            server = self.server_db.configured_view().get(number - 1)
             if not server:
                 print(f"Configured server with number: {number} does not exist")
         return self.remove_server(server)
@@ -665,7 +680,12 @@ class CommandLine:
         remove_parser.set_defaults(func=lambda args: self.remove(vars(args)))
 
         status_parser = subparsers.add_parser("status", help="see the current status of eduVPN")
-        status_parser.set_defaults(func=self.status)
+        status_parser.add_argument(
+            "--rate",
+            action="store_true",
+            help=f"measure the transfer rate, this takes {STATUS_SAMPLE_INTERVAL} seconds",
+        )
+        status_parser.set_defaults(func=lambda args: self.status(vars(args)))
 
         parsed = parser.parse_args()
 
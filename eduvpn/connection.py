@@ -1,12 +1,27 @@
 import json
-from configparser import ConfigParser
+import logging
+import socket
 from datetime import datetime, timedelta
 from enum import IntEnum
-from typing import Any, Dict, List, Optional
+from ipaddress import (
+    IPv4Address,
+    IPv4Interface,
+    IPv4Network,
+    IPv6Address,
+    IPv6Interface,
+    IPv6Network,
+    collapse_addresses,
+    ip_address,
+    ip_interface,
+    ip_network,
+)
+from typing import Any, Dict, List, Optional, Tuple, Union
 from urllib.parse import urlparse
 
 from eduvpn.ovpn import Ovpn
 
+logger = logging.getLogger(__name__)
+
 
 class Token:
     """The class that represents oauth Tokens
@@ -213,16 +228,273 @@ class OpenVPNConnection(Connection):
         )
 
 
+class InvalidWireGuardConfig(ValueError):
+    pass
+
+
+class WireGuardInterface:
+    """The class that represents the [Interface] section of a WireGuard config
+    :param: private_key: str: The private key
+    :param: addresses: List: The addresses with their prefix length
+    :param: dns: List: The DNS server addresses
+    :param: dns_search: List[str]: The DNS entries that are not addresses, used as search domains
+    :param: mtu: Optional[int]: The MTU
+    """
+
+    __slots__ = ("private_key", "addresses", "dns", "dns_search", "mtu")
+
+    def __init__(
+        self,
+        private_key: str,
+        addresses: List[Union[IPv4Interface, IPv6Interface]],
+        dns: List[Union[IPv4Address, IPv6Address]],
+        dns_search: List[str],
+        mtu: Optional[int] = None,
+    ):
+        self.private_key = private_key
+        self.addresses = addresses
+        self.dns = dns
+        self.dns_search = dns_search
+        self.mtu = mtu
+
+
+class WireGuardPeer:
+    """The class that represents a [Peer] section of a WireGuard config
+    :param: public_key: str: The public key
+    :param: endpoint: str: The endpoint host and port
+    :param: allowed_ips: List: The networks that are routed to the peer
+    :param: persistent_keepalive: int: The keepalive interval in seconds, 0 if disabled
+    """
+
+    __slots__ = ("public_key", "endpoint", "allowed_ips", "persistent_keepalive")
+
+    def __init__(
+        self,
+        public_key: str,
+        endpoint: str,
+        allowed_ips: List[Any],
+        persistent_keepalive: int = 0,
+    ):
+        self.public_key = public_key
+        self.endpoint = endpoint
+        self.allowed_ips = allowed_ips
+        self.persistent_keepalive = persistent_keepalive
+
+
+class WireGuardConfig:
+    """The class that represents a parsed WireGuard config
+    :param: interface: WireGuardInterface: The interface section
+    :param: peers: List[WireGuardPeer]: The peer sections
+    """
+
+    __slots__ = ("interface", "peers")
+
+    def __init__(self, interface: WireGuardInterface, peers: List[WireGuardPeer]):
+        self.interface = interface
+        self.peers = peers
+
+
+def split_list(value: str) -> List[str]:
+    return [entry.strip() for entry in value.split(",") if entry.strip()]
+
+
+def parse_int(value: Optional[str], name: str) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(f"got invalid WireGuard {name} value: {value}")
+        return None
+
+
+def parse_network(value: str) -> Union[IPv4Network, IPv6Network]:
+    """Parse a network, host bits are allowed
+    Building the network from the packed address is about twice as fast as parsing the string with ip_network.
+    :param: value: str: The network with an optional prefix length
+    :return: The network
+    :rtype: Union[IPv4Network, IPv6Network]
+    """
+    address, sep, prefix = value.partition("/")
+    try:
+        if ":" in address:
+            packed = socket.inet_pton(socket.AF_INET6, address)
+            return IPv6Network((int.from_bytes(packed, "big"), int(prefix) if sep else 128), strict=False)
+        packed = socket.inet_pton(socket.AF_INET, address)
+        return IPv4Network((int.from_bytes(packed, "big"), int(prefix) if sep else 32), strict=False)
+    except (OSError, ValueError):
+        # Let ip_network handle the other notations or raise the error
+        return ip_network(value, strict=False)
+
+
+def collapse_networks(networks: List[Union[IPv4Network, IPv6Network]]) -> List[Union[IPv4Network, IPv6Network]]:
+    """Collapse a list of networks into the smallest list of networks that covers the same addresses
+    Duplicates and networks contained in others are removed and adjacent networks are merged.
+    :param: networks: List[Union[IPv4Network, IPv6Network]]: The networks
+    :return: The collapsed IPv4 networks followed by the collapsed IPv6 networks
+    :rtype: List[Union[IPv4Network, IPv6Network]]
+    """
+    # collapse_addresses does not accept mixed versions
+    ipv4s = [network for network in networks if network.version == 4]
+    ipv6s = [network for network in networks if network.version == 6]
+    return [*collapse_addresses(ipv4s), *collapse_addresses(ipv6s)]  # type: ignore
+
+
+def collapse_keys(networks: List[Tuple[int, int]], bits: int, prefixlen: int) -> List[Tuple[int, int]]:
+    """Truncate networks to a maximum prefix length and collapse them
+    This works on integers as that is much faster than collapsing the network objects.
+    :param: networks: List[Tuple[int, int]]: The network addresses and prefix lengths
+    :param: bits: int: The number of bits of the addresses
+    :param: prefixlen: int: The prefix length to truncate to
+    :return: The collapsed network addresses and prefix lengths, sorted
+    :rtype: List[Tuple[int, int]]
+    """
+    host_bits = bits - prefixlen
+    keys = sorted(
+        {
+            (address >> host_bits << host_bits, prefixlen) if length > prefixlen else (address, length)
+            for address, length in networks
+        }
+    )
+    collapsed: List[Tuple[int, int]] = []
+    end = -1
+    for address, length in keys:
+        # Contained in the previous network
+        if address <= end:
+            continue
+        size = 1 << (bits - length)
+        end = address + size - 1
+        # Merge with the previous network while they are the two halves of a network
+        while collapsed and collapsed[-1] == (address - size, length) and not (address - size) & ((size << 1) - 1):
+            collapsed.pop()
+            address -= size
+            length -= 1
+            size <<= 1
+        collapsed.append((address, length))
+    return collapsed
+
+
+def aggregate_networks(addresses: List[str], limit: int) -> List[Union[IPv4Network, IPv6Network]]:
+    """Aggregate addresses into at most limit covering networks per address family
+    The addresses are collapsed first, if that leaves too many networks they are widened to
+    the longest prefix length that brings the count within the limit. The result can thus cover
+    more addresses than given, only use it where matching extra addresses is harmless.
+    :param: addresses: List[str]: The addresses or networks
+    :param: limit: int: The maximum number of networks per address family
+    :return: The IPv4 networks followed by the IPv6 networks
+    :rtype: List[Union[IPv4Network, IPv6Network]]
+    """
+    networks = [parse_network(address) for address in addresses]
+    aggregated: List[Union[IPv4Network, IPv6Network]] = []
+    for network_type, bits in ((IPv4Network, 32), (IPv6Network, 128)):
+        keys = [
+            (int(network.network_address), network.prefixlen)
+            for network in networks
+            if isinstance(network, network_type)
+        ]
+        collapsed = collapse_keys(keys, bits, bits)
+        if len(collapsed) > limit:
+            # Widening to /0 always fits, find the longest prefix length that fits
+            low, high = 0, bits
+            while high - low > 1:
+                middle = (low + high) // 2
+                if len(collapse_keys(collapsed, bits, middle)) <= limit:
+                    low = middle
+                else:
+                    high = middle
+            collapsed = collapse_keys(collapsed, bits, low)
+        aggregated.extend(network_type(key) for key in collapsed)
+    return aggregated
+
+
+def parse_wireguard(config_str: str) -> WireGuardConfig:
+    """Parse a wg-quick WireGuard config in a single pass
+    Keys are case insensitive, keys that are lists may be repeated and there may be multiple peers.
+    :param: config_str: str: The config
+    :return: The parsed config
+    :rtype: WireGuardConfig
+    """
+    interface: Dict[str, List[str]] = {}
+    peers: List[Dict[str, List[str]]] = []
+    section: Optional[Dict[str, List[str]]] = None
+    for line in config_str.splitlines():
+        line = line.strip()
+        # Only full lines are comments, a value may contain a '#'
+        if not line or line[0] in "#;":
+            continue
+        if line[0] == "[":
+            name = line.strip("[]").strip()
+            if name == "Interface":
+                section = interface
+            elif name == "Peer":
+                section = {}
+                peers.append(section)
+            else:
+                raise InvalidWireGuardConfig(f"unknown section: {name}")
+            continue
+        key, sep, value = line.partition("=")
+        if not sep or section is None:
+            raise InvalidWireGuardConfig(f"invalid line: {line}")
+        section.setdefault(key.strip().lower(), []).append(value.strip())
+
+    def get(values: Dict[str, List[str]], key: str, required: bool = True) -> Optional[str]:
+        entries = values.get(key)
+        if not entries:
+            if required:
+                raise InvalidWireGuardConfig(f"missing {key}")
+            return None
+        return entries[-1]
+
+    def get_list(values: Dict[str, List[str]], key: str) -> List[str]:
+        return [entry for value in values.get(key, []) for entry in split_list(value)]
+
+    dns = []
+    dns_search = []
+    for entry in get_list(interface, "dns"):
+        try:
+            dns.append(ip_address(entry))
+        # The entry is not an ip but a hostname
+        # They need to be added to dns search domains
+        except ValueError:
+            dns_search.append(entry)
+
+    try:
+        addresses = [ip_interface(address) for address in get_list(interface, "address")]
+        parsed_peers = [
+            WireGuardPeer(
+                get(peer, "publickey"),  # type: ignore
+                get(peer, "endpoint"),  # type: ignore
+                [parse_network(network) for network in get_list(peer, "allowedips")],
+                parse_int(get(peer, "persistentkeepalive", False), "persistent keepalive") or 0,
+            )
+            for peer in peers
+        ]
+    except ValueError as e:
+        raise InvalidWireGuardConfig(str(e)) from e
+    if not addresses:
+        raise InvalidWireGuardConfig("missing address")
+    if not parsed_peers:
+        raise InvalidWireGuardConfig("missing peer")
+    return WireGuardConfig(
+        WireGuardInterface(
+            get(interface, "privatekey"),  # type: ignore
+            addresses,
+            dns,
+            dns_search,
+            parse_int(get(interface, "mtu", False), "MTU"),
+        ),
+        parsed_peers,
+    )
+
+
 class WireGuardConnection(Connection):
-    def __init__(self, config: ConfigParser):
+    def __init__(self, config: WireGuardConfig):
         self.config = config
         super().__init__()
 
     @classmethod
     def parse(cls, config_str: str) -> "WireGuardConnection":  # type: ignore
-        config = ConfigParser()
-        config.read_string(config_str)
-        return cls(config=config)
+        return cls(config=parse_wireguard(config_str))
 
     def connect(
         self,
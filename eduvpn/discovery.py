@@ -1,24 +1,183 @@
 import json
-from typing import Dict, List
+import re
+import struct
+import sys
+import unicodedata
+import zlib
+from array import array
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Set, Tuple, Union, overload
 
 from eduvpn_common.main import ServerType
 
-from eduvpn.i18n import extract_translation
+from eduvpn.i18n import Translations, extract_translation
 
+TranslatedStr = Union[str, Dict[str, str]]
 
-class DiscoOrganization:
+
+def normalize(text: str) -> str:
+    """Normalize a string for searching and sorting
+    The string is case folded and accents are stripped, e.g. "Zürich" becomes "zurich"
+    :param: text: str: The string to normalize
+    :return: The normalized string
+    :rtype: str
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def normalize_translations(d: TranslatedStr) -> Dict[str, str]:
+    """Normalize every translation of a translated string
+    :param: d: TranslatedStr: The translated string
+    :return: The normalized translations by language, a plain string gets the empty language
+    :rtype: Dict[str, str]
+    """
+    if isinstance(d, dict):
+        return {lang: normalize(v) for lang, v in d.items()}
+    return {"": normalize(d)}
+
+
+def normalize_keywords(keywords: TranslatedStr) -> Tuple[str, ...]:
+    "Normalize every translation of the discovery keywords."
+    return tuple(normalize(k) for k in translations(keywords))
+
+
+class SharedTranslations:
+    """A table of translated strings that are shared by key, e.g. by server identifier
+    When the same entry is parsed again, e.g. when discovery is refreshed, an equal
+    translated string is replaced by the shared one so that it is only stored once.
+    The shared dictionaries are Translations that cache their resolved translation,
+    they must not be modified
+    :param: max_size: int: The maximum number of entries, the table is cleared when it is full
+    """
+
+    def __init__(self, max_size: int = 65536):
+        self.max_size = max_size
+        self._table: Dict[str, Dict[str, str]] = {}
+
+    def share(self, key: str, d: Any) -> Any:
+        """Return the shared instance of a translated string
+        :param: key: str: The key of the translated string
+        :param: d: TranslatedStr: The translated string
+        :return: The shared translated string
+        :rtype: TranslatedStr
+        """
+        if not isinstance(d, dict):
+            return d
+        shared = self._table.get(key)
+        if shared is not None and shared == d:
+            return shared
+        if len(self._table) >= self.max_size:
+            self._table.clear()
+        shared = self._table[key] = Translations(d)
+        return shared
+
+
+class NormalizedKeys:
+    """The normalized keys of translated strings by key, e.g. by server identifier
+    When the same entry is parsed again with an equal translated string, the keys
+    that were normalized before are returned instead of normalizing it again.
+    :param: normalize: Callable[[Any], Any]: The function that normalizes a translated string
+    :param: max_size: int: The maximum number of entries, the table is cleared when it is full
+    """
+
+    def __init__(self, normalize: Callable[[Any], Any], max_size: int = 65536):
+        self.normalize = normalize
+        self.max_size = max_size
+        self._table: Dict[str, Tuple[Any, Any]] = {}
+
+    def get(self, key: str, d: Any) -> Any:
+        """Return the normalized keys of a translated string
+        :param: key: str: The key of the translated string
+        :param: d: TranslatedStr: The translated string
+        :return: The normalized keys
+        """
+        cached = self._table.get(key)
+        if cached is not None and (cached[0] is d or cached[0] == d):
+            return cached[1]
+        keys = self.normalize(d)
+        if len(self._table) >= self.max_size:
+            self._table.clear()
+        self._table[key] = (d, keys)
+        return keys
+
+
+shared_display_names = SharedTranslations()
+_shared_search_keys = SharedTranslations()
+_shared_keywords = SharedTranslations()
+_search_keys = NormalizedKeys(lambda d: Translations(normalize_translations(d)))
+_keyword_keys = NormalizedKeys(normalize_keywords)
+
+
+class DiscoEntry:
+    """The base class of the discovery entries
+    Entries are equal and hash the same if they have the same category and identifier
+    """
+
+    __slots__ = ("display_name", "keywords", "search_keys", "keyword_keys")
+
+    def __init__(
+        self,
+        identifier: str,
+        display_name: Dict[str, str],
+        keywords: TranslatedStr,
+        search_keys: Optional[Dict[str, str]],
+        keyword_keys: Optional[Tuple[str, ...]],
+    ):
+        self.display_name = shared_display_names.share(identifier, display_name)
+        self.keywords = _shared_keywords.share(identifier, keywords)
+        if search_keys is None:
+            # The normalized keys are already shared for an equal display name
+            self.search_keys = _search_keys.get(identifier, self.display_name)
+        else:
+            self.search_keys = _shared_search_keys.share(identifier, search_keys)
+        self.keyword_keys = keyword_keys if keyword_keys is not None else _keyword_keys.get(identifier, self.keywords)
+
+    @property
+    def identifier(self) -> str:
+        raise NotImplementedError
+
+    @property
+    def category_id(self) -> ServerType:
+        raise NotImplementedError
+
+    @property
+    def sort_key(self) -> str:
+        "The normalized display name in the current language"
+        return extract_translation(self.search_keys)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, DiscoEntry):
+            return NotImplemented
+        return self.category_id == other.category_id and self.identifier == other.identifier
+
+    def __hash__(self) -> int:
+        return hash((self.category_id, self.identifier))
+
+    def __str__(self):
+        return extract_translation(self.display_name)
+
+
+class DiscoOrganization(DiscoEntry):
     """The class that represents an organization from discovery
     :param: display_name: Dict[str, str]: The display name of the organizations
     :param: org_id: str: The organization ID
+    :param: keywords: TranslatedStr: The keywords that can be used to search for the organization
+    :param: search_keys: Optional[Dict[str, str]]: The normalized display names, computed if not given
+    :param: keyword_keys: Optional[Tuple[str, ...]]: The normalized keywords, computed if not given
     """
 
+    __slots__ = ("org_id",)
+
     def __init__(
         self,
         display_name: Dict[str, str],
         org_id: str,
+        keywords: TranslatedStr = "",
+        search_keys: Optional[Dict[str, str]] = None,
+        keyword_keys: Optional[Tuple[str, ...]] = None,
     ):
-        self.display_name = display_name
-        self.org_id = org_id
+        self.org_id = sys.intern(org_id)
+        super().__init__(self.org_id, display_name, keywords, search_keys, keyword_keys)
 
     @property
     def identifier(self):
@@ -28,26 +187,31 @@ class DiscoOrganization:
     def category_id(self) -> ServerType:
         return ServerType.SECURE_INTERNET
 
-    def __str__(self):
-        return extract_translation(self.display_name)
-
 
-class DiscoServer:
+class DiscoServer(DiscoEntry):
     """The class that represents a discovery server, this can be an institute access or secure internet server
     :param: base_url: str: The base URL of the server
     :param: display_name: Dict[str, str]: The display name of the server
     :param: server_type: str: The server type as a string
+    :param: keywords: TranslatedStr: The keywords that can be used to search for the server
+    :param: search_keys: Optional[Dict[str, str]]: The normalized display names, computed if not given
+    :param: keyword_keys: Optional[Tuple[str, ...]]: The normalized keywords, computed if not given
     """
 
+    __slots__ = ("base_url", "server_type")
+
     def __init__(
         self,
         base_url: str,
         display_name: Dict[str, str],
         server_type: str,
+        keywords: TranslatedStr = "",
+        search_keys: Optional[Dict[str, str]] = None,
+        keyword_keys: Optional[Tuple[str, ...]] = None,
     ):
-        self.base_url = base_url
-        self.display_name = display_name
-        self.server_type = server_type
+        self.base_url = sys.intern(base_url)
+        super().__init__(self.base_url, display_name, keywords, search_keys, keyword_keys)
+        self.server_type = sys.intern(server_type)
 
     @property
     def identifier(self):
@@ -57,22 +221,34 @@ class DiscoServer:
     def category_id(self) -> ServerType:
         return ServerType.INSTITUTE_ACCESS
 
-    def __str__(self):
-        return extract_translation(self.display_name)
-
 
 def parse_disco_server(s: dict) -> DiscoServer:
     b_url = s["base_url"]
     display_name = s.get("display_name", "")
     # Mandatory
     server_type = s["server_type"]
-    return DiscoServer(b_url, display_name, server_type)
+    keywords = s.get("keyword_list", "")
+    return DiscoServer(
+        b_url,
+        display_name,
+        server_type,
+        keywords,
+        None,
+        None,
+    )
 
 
 def parse_disco_organization(o: dict) -> DiscoOrganization:
     display_name = o.get("display_name", "")
     org_id = o["org_id"]
-    return DiscoOrganization(display_name, org_id)
+    keywords = o.get("keyword_list", "")
+    return DiscoOrganization(
+        display_name,
+        org_id,
+        keywords,
+        None,
+        None,
+    )
 
 
 def parse_disco_servers(json_str: str) -> List[DiscoServer]:
@@ -93,3 +269,396 @@ def parse_disco_organizations(json_str: str) -> List[DiscoOrganization]:
         disco_org = parse_disco_organization(o)
         disco_orgs.append(disco_org)
     return disco_orgs
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+
+def _skip(json_str: str, pos: int, expected: str = "") -> int:
+    pos = _WHITESPACE.match(json_str, pos).end()  # type: ignore[union-attr]
+    if expected:
+        if json_str[pos : pos + 1] != expected:
+            raise ValueError(f"expected {expected!r} at position {pos}")
+        pos = _WHITESPACE.match(json_str, pos + 1).end()  # type: ignore[union-attr]
+    return pos
+
+
+def iter_disco_spans(json_str: str, list_key: str) -> Iterator[Tuple[int, int]]:
+    """Iterate over the start and end offsets of the entries in a discovery list
+    Only a single entry is decoded at a time, the decoded entries are not kept
+    :param: json_str: str: The discovery JSON, e.g. {"server_list": [...]}
+    :param: list_key: str: The key of the list, e.g. "server_list"
+    :raises ValueError: If the JSON is invalid
+    :return: An iterator over the offsets of each entry
+    :rtype: Iterator[Tuple[int, int]]
+    """
+    pos = _skip(json_str, 0, "{")
+    while json_str[pos : pos + 1] != "}":
+        key, pos = _decoder.raw_decode(json_str, pos)
+        pos = _skip(json_str, pos, ":")
+        if key != list_key:
+            # Skip the value of another key
+            _, pos = _decoder.raw_decode(json_str, pos)
+        elif json_str[pos : pos + 1] == "[":
+            pos = _skip(json_str, pos + 1)
+            while json_str[pos : pos + 1] != "]":
+                _, end = _decoder.raw_decode(json_str, pos)
+                yield pos, end
+                pos = _skip(json_str, end)
+                if json_str[pos : pos + 1] == ",":
+                    pos = _skip(json_str, pos + 1)
+            pos += 1
+        else:
+            # e.g. null
+            _, pos = _decoder.raw_decode(json_str, pos)
+        pos = _skip(json_str, pos)
+        if json_str[pos : pos + 1] == ",":
+            pos = _skip(json_str, pos + 1)
+
+
+class DiscoList(Sequence):
+    """A lazily parsed discovery list
+    It only keeps the discovery JSON and the offsets of the entries,
+    an entry is parsed when it is accessed, e.g. when it is displayed or selected
+    :param: json_str: str: The discovery JSON
+    :param: list_key: str: The key of the list, e.g. "server_list"
+    :param: parse: Callable[[dict], Any]: The function to parse an entry
+    """
+
+    def __init__(self, json_str: str, list_key: str, parse: Callable[[dict], Any]):
+        self._json = json_str
+        self._parse = parse
+        self._spans = array("Q")
+        for start, end in iter_disco_spans(json_str, list_key):
+            self._spans.extend((start, end))
+        self._parsed: Dict[int, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._spans) // 2
+
+    @overload
+    def __getitem__(self, index: int) -> Any: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[Any]: ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("discovery list index out of range")
+        entry = self._parsed.get(index)
+        if entry is None:
+            start, end = self._spans[2 * index], self._spans[2 * index + 1]
+            entry = self._parse(json.loads(self._json[start:end]))
+            self._parsed[index] = entry
+        return entry
+
+    @property
+    def materialized(self) -> int:
+        "The number of entries that have been parsed"
+        return len(self._parsed)
+
+
+def parse_disco_servers_lazy(json_str: str) -> DiscoList:
+    "Lazily parse the discovery servers, see DiscoList"
+    return DiscoList(json_str, "server_list", parse_disco_server)
+
+
+def parse_disco_organizations_lazy(json_str: str) -> DiscoList:
+    "Lazily parse the discovery organizations, see DiscoList"
+    return DiscoList(json_str, "organization_list", parse_disco_organization)
+
+
+# The discovery snapshot format, all integers are little endian:
+# - the header: magic, version, number of entries, number of trigrams, number of integers, size of the strings
+# - the zlib compressed integers (uint32) followed by the UTF-8 strings, separated by NUL.
+#   The integers describe the entries and the postings of the search index and point into the strings
+# The entries are stored with their normalized keys and the postings of the search index,
+# so that loading does not have to normalize or index again.
+# Bump the version whenever the layout, the normalization or the indexing changes
+SNAPSHOT_MAGIC = b"EDUVPNDS"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct("<8sIIIII")
+# Marks a translated string that is a plain string instead of a dictionary
+_PLAIN = 0xFFFFFFFF
+_ORGANIZATION = 0
+_SERVER = 1
+
+
+class SnapshotError(Exception):
+    "The discovery snapshot is invalid"
+
+
+def _uint32_array(data: bytes = b"") -> array:
+    ints = array("I")
+    if ints.itemsize != 4:
+        ints = array("L")
+    ints.frombytes(data)
+    if sys.byteorder != "little":
+        ints.byteswap()
+    return ints
+
+
+def dump_snapshot(
+    entries: Sequence[Union[DiscoServer, DiscoOrganization]],
+    postings: Optional[Mapping[str, Sequence[int]]] = None,
+) -> bytes:
+    """Serialize the discovery entries and their search index postings to a snapshot, see load_snapshot
+    :param: entries: Sequence[Union[DiscoServer, DiscoOrganization]]: The discovery entries
+    :param: postings: Optional[Mapping[str, Sequence[int]]]: The postings of the search index of the entries,
+        computed if not given
+    :raises SnapshotError: If the entries cannot be serialized
+    :return: The snapshot
+    :rtype: bytes
+    """
+    if postings is None:
+        postings = SearchIndex(entries).postings
+    strings: Dict[str, int] = {}
+    ints = _uint32_array()
+
+    def string(value: str) -> int:
+        if "\0" in value:
+            raise SnapshotError("strings with NUL cannot be stored")
+        return strings.setdefault(value, len(strings))
+
+    for entry in entries:
+        if isinstance(entry, DiscoOrganization):
+            ints.extend((_ORGANIZATION, string(entry.org_id), string("")))
+        else:
+            ints.extend((_SERVER, string(entry.base_url), string(entry.server_type)))
+        # The display name can be a plain string, just like when parsing discovery
+        if isinstance(entry.display_name, dict):
+            ints.append(len(entry.display_name))
+            ints.extend(string(lang) for lang in entry.display_name)
+            ints.extend(string(value) for value in entry.display_name.values())
+        else:
+            ints.extend((_PLAIN, string(entry.display_name)))
+        # The search keys are in the languages of the display name
+        if list(entry.search_keys) != (list(entry.display_name) if isinstance(entry.display_name, dict) else [""]):
+            raise SnapshotError(f"the search keys of {entry.identifier} do not match its display name")
+        ints.extend(string(key) for key in entry.search_keys.values())
+        if isinstance(entry.keywords, dict):
+            ints.append(len(entry.keywords))
+            ints.extend(string(lang) for lang in entry.keywords)
+            ints.extend(string(value) for value in entry.keywords.values())
+        else:
+            ints.extend((_PLAIN, string(entry.keywords)))
+        ints.append(len(entry.keyword_keys))
+        ints.extend(string(k) for k in entry.keyword_keys)
+    for gram, entry_ids in postings.items():
+        ints.extend((string(gram), len(entry_ids)))
+        ints.extend(entry_ids)
+
+    blob = "\0".join(strings).encode("utf-8")
+    if sys.byteorder != "little":
+        ints.byteswap()
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(entries), len(postings), len(ints), len(blob))
+    return header + zlib.compress(ints.tobytes() + blob)
+
+
+def load_snapshot(
+    data: bytes,
+) -> Tuple[List[Union[DiscoServer, DiscoOrganization]], Mapping[str, Sequence[int]]]:
+    """Load the discovery entries and their search index postings from a snapshot
+    The entries are restored as they were dumped, they are not normalized or shared again
+    :param: data: bytes: The snapshot
+    :raises SnapshotError: If the snapshot is invalid or has a different version
+    :return: The discovery entries and the postings to pass to SearchIndex
+    :rtype: Tuple[List[Union[DiscoServer, DiscoOrganization]], Mapping[str, Sequence[int]]]
+    """
+    try:
+        magic, version, count, gram_count, int_count, blob_size = SNAPSHOT_HEADER.unpack_from(data)
+    except struct.error as e:
+        raise SnapshotError("truncated header") from e
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotError("invalid magic")
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotError(f"unsupported version: {version}")
+    try:
+        payload = zlib.decompress(data[SNAPSHOT_HEADER.size :])
+    except zlib.error as e:
+        raise SnapshotError("invalid compressed data") from e
+    if len(payload) != int_count * 4 + blob_size:
+        raise SnapshotError("invalid size")
+    ints = _uint32_array(payload[: int_count * 4])
+    try:
+        strings = payload[int_count * 4 :].decode("utf-8").split("\0")
+    except UnicodeDecodeError as e:
+        raise SnapshotError("invalid strings") from e
+
+    # The entries are created without their constructors, which would normalize and share them again
+    get = strings.__getitem__
+    new_organization = DiscoOrganization.__new__
+    new_server = DiscoServer.__new__
+    entries: List[Union[DiscoServer, DiscoOrganization]] = []
+    postings: Dict[str, Sequence[int]] = {}
+    pos = 0
+    try:
+        for _ in range(count):
+            kind, identifier, server_type, n = ints[pos : pos + 4]
+            pos += 4
+            display_name: TranslatedStr
+            if n == _PLAIN:
+                display_name = strings[ints[pos]]
+                search_keys = Translations({"": strings[ints[pos + 1]]})
+                pos += 2
+            else:
+                langs = list(map(get, ints[pos : pos + n]))
+                display_name = Translations(zip(langs, map(get, ints[pos + n : pos + 2 * n])))
+                search_keys = Translations(zip(langs, map(get, ints[pos + 2 * n : pos + 3 * n])))
+                pos += 3 * n
+            keywords: TranslatedStr
+            n = ints[pos]
+            if n == _PLAIN:
+                keywords = strings[ints[pos + 1]]
+                pos += 2
+            else:
+                keywords = Translations(
+                    zip(map(get, ints[pos + 1 : pos + 1 + n]), map(get, ints[pos + 1 + n : pos + 1 + 2 * n]))
+                )
+                pos += 1 + 2 * n
+            n = ints[pos]
+            keyword_keys = tuple(map(get, ints[pos + 1 : pos + 1 + n]))
+            pos += 1 + n
+            entry: Union[DiscoServer, DiscoOrganization]
+            if kind == _ORGANIZATION:
+                entry = new_organization(DiscoOrganization)
+                entry.org_id = strings[identifier]
+            else:
+                entry = new_server(DiscoServer)
+                entry.base_url = strings[identifier]
+                entry.server_type = strings[server_type]
+            entry.display_name = display_name
+            entry.keywords = keywords
+            entry.search_keys = search_keys
+            entry.keyword_keys = keyword_keys
+            entries.append(entry)
+        for _ in range(gram_count):
+            gram, n = ints[pos : pos + 2]
+            postings[strings[gram]] = ints[pos + 2 : pos + 2 + n]
+            pos += 2 + n
+    except (IndexError, ValueError) as e:
+        raise SnapshotError("invalid entries") from e
+    if pos != len(ints):
+        raise SnapshotError("trailing data")
+    return entries, postings
+
+
+def translations(d: TranslatedStr) -> List[str]:
+    "Return every translation of a translated string."
+    if isinstance(d, dict):
+        return list(d.values())
+    if not d:
+        return []
+    return [d]
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """An in-process trigram index over the discovery list
+    It is used to search the discovery list without going to eduvpn-common for every query
+    :param: entries: Sequence[Union[DiscoServer, DiscoOrganization]]: The discovery entries to index
+    :param: postings: Optional[Mapping[str, Sequence[int]]]: The entry ids by trigram, e.g. from a snapshot,
+        computed if not given
+    """
+
+    # The number of ranks, see search
+    RANKS = 5
+
+    def __init__(
+        self,
+        entries: Sequence[Union[DiscoServer, DiscoOrganization]],
+        postings: Optional[Mapping[str, Sequence[int]]] = None,
+    ):
+        self.entries = list(entries)
+        self.organizations = any(isinstance(e, DiscoOrganization) for e in self.entries)
+        # Per entry the normalized display names, once as a set and once joined
+        # with a newline (to match prefixes) and a space (to match word prefixes)
+        self._names: List[Set[str]] = []
+        self._lines: List[str] = []
+        self._words: List[str] = []
+        # Per entry the normalized names + keywords
+        self._haystacks: List[str] = []
+        # The last query and its matches, used to narrow down the search while typing
+        self._last: Tuple[str, List[int]] = ("", [])
+
+        built: Dict[str, List[int]] = {}
+        for entry_id, entry in enumerate(self.entries):
+            names = list(dict.fromkeys(entry.search_keys.values()))
+            haystack = "\n".join(names + list(entry.keyword_keys))
+            self._names.append(set(names))
+            self._lines.append("\n" + "\n".join(names))
+            self._words.append(" " + " ".join(names))
+            self._haystacks.append(haystack)
+            if postings is None:
+                for gram in trigrams(haystack):
+                    built.setdefault(gram, []).append(entry_id)
+        # trigram -> entry ids
+        self._postings: Mapping[str, Sequence[int]] = built if postings is None else postings
+
+    @property
+    def postings(self) -> Mapping[str, Sequence[int]]:
+        "The entry ids by trigram, they must not be modified"
+        return self._postings
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _candidates(self, query: str, tokens: List[str]) -> Sequence[int]:
+        last_query, last_matches = self._last
+        # Every match of a query is also a match of a query it extends
+        candidates: Sequence[int] = range(len(self.entries))
+        if last_query and query.startswith(last_query):
+            candidates = last_matches
+        for token in tokens:
+            for gram in trigrams(token):
+                postings = self._postings.get(gram)
+                if postings is None:
+                    return []
+                if len(postings) < len(candidates):
+                    candidates = postings
+        return candidates
+
+    def search(self, query: str) -> List[Union[DiscoServer, DiscoOrganization]]:
+        """Search the index
+        The results are ranked as follows, ties are kept in discovery order:
+        an exact name match, a name prefix match, a word prefix match, a name substring match and a keyword match
+        :param: query: str: The search query
+        :return: The matching entries, the best matches first
+        :rtype: List[Union[DiscoServer, DiscoOrganization]]
+        """
+        query = " ".join(normalize(query).split())
+        if not query:
+            return list(self.entries)
+        tokens = query.split()
+        haystacks = self._haystacks
+        # The candidates can give false positives, verify that every token is in the haystack
+        matches = list(self._candidates(query, tokens))
+        for token in tokens:
+            matches = [entry_id for entry_id in matches if token in haystacks[entry_id]]
+        self._last = (query, matches)
+
+        names, lines, words = self._names, self._lines, self._words
+        line_query = "\n" + query
+        word_query = " " + tokens[0]
+        ranked: List[List[int]] = [[] for _ in range(self.RANKS)]
+        for entry_id in matches:
+            if query in names[entry_id]:
+                ranked[0].append(entry_id)
+            elif line_query in lines[entry_id]:
+                ranked[1].append(entry_id)
+            elif word_query in words[entry_id]:
+                ranked[2].append(entry_id)
+            elif query in lines[entry_id]:
+                ranked[3].append(entry_id)
+            else:
+                ranked[4].append(entry_id)
+        entries = self.entries
+        return [entries[entry_id] for rank in ranked for entry_id in rank]
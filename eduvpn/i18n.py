@@ -3,7 +3,7 @@ import json
 import locale
 import logging
 import os
-from typing import Dict, Union
+from typing import Dict, Optional, Tuple, Union
 
 from eduvpn.settings import COUNTRY, COUNTRY_MAP, LANGUAGE
 from eduvpn.utils import get_prefix
@@ -13,6 +13,26 @@ logger = logging.getLogger(__name__)
 
 country_mapping = None
 
+# The languages that are tried in order when extracting a translation
+# This is computed once and reset when the locale changes
+_fallbacks: Optional[Tuple[str, ...]] = None
+
+# Incremented by invalidate, resolved translations of an older generation are stale
+_generation = 0
+
+
+class Translations(dict):
+    """A translated string that caches its translation for the current locale
+    The cache lives as long as the dictionary, the dictionary must not be modified
+    """
+
+    __slots__ = ("resolved",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (generation, translation) of the last resolved translation
+        self.resolved: Optional[Tuple[int, str]] = None
+
 
 def initialize(app_variant: ApplicationVariant):
     prefix = get_prefix()
@@ -31,6 +51,7 @@ def setup(app_variant: ApplicationVariant, prefix: str):
     directory = os.path.join(prefix, "share/locale")
 
     locale.setlocale(locale.LC_ALL, "")
+    invalidate()
     locale.bindtextdomain(domain, directory)  # type: ignore
     locale.textdomain(domain)  # type: ignore
     gettext.bindtextdomain(domain, directory)
@@ -59,14 +80,38 @@ def language() -> str:
         return LANGUAGE
 
 
+def invalidate():
+    """
+    Reset the cached locale fallbacks and translations, this must be called when the locale changes
+    """
+    global _fallbacks, _generation
+    _fallbacks = None
+    _generation += 1
+
+
+def fallbacks() -> Tuple[str, ...]:
+    """
+    Get the languages that are tried in order when extracting a translation
+    """
+    global _fallbacks
+    if _fallbacks is None:
+        _fallbacks = tuple(dict.fromkeys([country(), language(), "en-US", "en"]))
+    return _fallbacks
+
+
 def extract_translation(d: Union[str, Dict[str, str]]):
     if isinstance(d, dict):
-        for m in [country(), language(), "en-US", "en"]:
-            try:
-                return d[m]
-            except KeyError:
-                continue
-        return list(d.values())[0]  # otherwise just return first in list
+        if isinstance(d, Translations) and d.resolved is not None and d.resolved[0] == _generation:
+            return d.resolved[1]
+        for m in fallbacks():
+            translation = d.get(m)
+            if translation is not None:
+                break
+        else:
+            translation = list(d.values())[0]  # otherwise just return first in list
+        if isinstance(d, Translations):
+            d.resolved = (_generation, translation)
+        return translation
     else:
         return d
 
@@ -0,0 +1,494 @@
+"""
+Read the statistics counters of a network interface.
+
+All the counters of an interface are fetched with one RTM_GETSTATS netlink
+request, or RTM_GETLINK on kernels before 4.7. If netlink is not available
+the counters are read from sysfs, using file descriptors that are opened
+once and read with os.pread.
+"""
+
+import errno
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from eduvpn.utils import run_periodically
+
+logger = logging.getLogger(__name__)
+
+LINUX_NET_FOLDER = Path("/sys/class/net")
+
+# See linux/netlink.h and linux/rtnetlink.h
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 1
+RTM_NEWLINK = 16
+RTM_GETLINK = 18
+RTM_NEWSTATS = 92
+RTM_GETSTATS = 94
+IFLA_STATS64 = 23
+IFLA_STATS_LINK_64 = 1
+
+NLMSGHDR = struct.Struct("=IHHII")
+IFINFOMSG = struct.Struct("=BxHiII")
+IF_STATS_MSG = struct.Struct("=BBHII")
+RTATTR = struct.Struct("=HH")
+NLMSGERR = struct.Struct("=i")
+# The first counters of struct rtnl_link_stats64
+STATS64 = struct.Struct("=8Q")
+
+RECV_SIZE = 65536
+
+# The counters in the order of struct rtnl_link_stats64, also the names of the sysfs files
+COUNTERS = (
+    "rx_packets",
+    "tx_packets",
+    "rx_bytes",
+    "tx_bytes",
+    "rx_errors",
+    "tx_errors",
+    "rx_dropped",
+    "tx_dropped",
+)
+
+
+class LinkStats:
+    """
+    The statistics counters of an interface
+    """
+
+    __slots__ = COUNTERS
+
+    def __init__(
+        self,
+        rx_packets: int,
+        tx_packets: int,
+        rx_bytes: int,
+        tx_bytes: int,
+        rx_errors: int,
+        tx_errors: int,
+        rx_dropped: int,
+        tx_dropped: int,
+    ):
+        self.rx_packets = rx_packets
+        self.tx_packets = tx_packets
+        self.rx_bytes = rx_bytes
+        self.tx_bytes = tx_bytes
+        self.rx_errors = rx_errors
+        self.tx_errors = tx_errors
+        self.rx_dropped = rx_dropped
+        self.tx_dropped = tx_dropped
+
+    def __eq__(self, other):
+        return isinstance(other, LinkStats) and all(getattr(self, c) == getattr(other, c) for c in COUNTERS)
+
+    def __repr__(self):
+        fields = ", ".join(f"{c}={getattr(self, c)}" for c in COUNTERS)
+        return f"LinkStats({fields})"
+
+
+class StatsReader:
+    "Base class for the statistics readers of an interface."
+
+    def __init__(self, iface: str):
+        self.iface = iface
+
+    def read(self) -> Optional[LinkStats]:
+        """
+        Read all the counters
+        :return: The counters or None if the interface is gone
+        :rtype: Optional[LinkStats]
+        """
+        raise NotImplementedError
+
+    def rx_bytes(self) -> Optional[int]:
+        """
+        Read the received bytes counter
+        :return: The counter or None if the interface is gone
+        :rtype: Optional[int]
+        """
+        stats = self.read()
+        if stats is None:
+            return None
+        return stats.rx_bytes
+
+    def close(self) -> None:
+        pass
+
+
+class NetlinkReader(StatsReader):
+    """
+    Read the counters of an interface with RTM_GETSTATS requests on a netlink route socket
+
+    RTM_GETSTATS only returns the requested counters, RTM_GETLINK returns all
+    the attributes of the link and is used if RTM_GETSTATS is not supported.
+    :param: iface: str: The name of the interface
+    """
+
+    def __init__(self, iface: str):
+        super().__init__(iface)
+        self.index = socket.if_nametoindex(iface)
+        self._lock = threading.Lock()
+        self._seq = 0
+        # Whether RTM_GETSTATS is supported
+        self.getstats = True
+        self._socket = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_CLOEXEC, socket.NETLINK_ROUTE)
+        self._socket.bind((0, 0))
+
+    def _request(self, seq: int) -> bytes:
+        if self.getstats:
+            # Only ask for the 64 bit link counters
+            body = IF_STATS_MSG.pack(socket.AF_UNSPEC, 0, 0, self.index, 1 << (IFLA_STATS_LINK_64 - 1))
+            msg_type = RTM_GETSTATS
+        else:
+            body = IFINFOMSG.pack(socket.AF_UNSPEC, 0, self.index, 0, 0)
+            msg_type = RTM_GETLINK
+        return NLMSGHDR.pack(NLMSGHDR.size + len(body), msg_type, NLM_F_REQUEST, seq, 0) + body
+
+    def read(self) -> Optional[LinkStats]:
+        with self._lock:
+            try:
+                return self._read()
+            except OSError as e:
+                if not self.getstats or e.errno not in (errno.EINVAL, errno.EOPNOTSUPP):
+                    raise
+            logger.debug("RTM_GETSTATS not supported, using RTM_GETLINK")
+            self.getstats = False
+            return self._read()
+
+    def _read(self) -> Optional[LinkStats]:
+        self._seq = (self._seq + 1) & 0xFFFFFFFF
+        seq = self._seq
+        self._socket.send(self._request(seq))
+        while True:
+            data = self._socket.recv(RECV_SIZE)
+            stats, done = self._parse(data, seq)
+            if done:
+                return stats
+
+    def _parse(self, data: bytes, seq: int) -> Tuple[Optional[LinkStats], bool]:
+        offset = 0
+        while offset + NLMSGHDR.size <= len(data):
+            length, msg_type, _flags, msg_seq, _pid = NLMSGHDR.unpack_from(data, offset)
+            if length < NLMSGHDR.size:
+                break
+            payload = offset + NLMSGHDR.size
+            end = offset + length
+            offset += (length + 3) & ~3
+            if msg_seq != seq:
+                continue
+            if msg_type == NLMSG_ERROR:
+                (error,) = NLMSGERR.unpack_from(data, payload)
+                if error == -errno.ENODEV:
+                    return None, True
+                raise OSError(-error, os.strerror(-error))
+            if msg_type == NLMSG_DONE:
+                return None, True
+            if msg_type == RTM_NEWSTATS:
+                attr, wanted = payload + IF_STATS_MSG.size, IFLA_STATS_LINK_64
+            elif msg_type == RTM_NEWLINK:
+                attr, wanted = payload + IFINFOMSG.size, IFLA_STATS64
+            else:
+                continue
+            while attr + RTATTR.size <= end:
+                attr_len, attr_type = RTATTR.unpack_from(data, attr)
+                if attr_len < RTATTR.size:
+                    break
+                if attr_type == wanted:
+                    return LinkStats(*STATS64.unpack_from(data, attr + RTATTR.size)), True
+                attr += (attr_len + 3) & ~3
+            return None, True
+        return None, False
+
+    def close(self) -> None:
+        self._socket.close()
+
+
+class SysfsReader(StatsReader):
+    """
+    Read the counters of an interface from the sysfs statistics files
+
+    The files are opened once and read with os.pread.
+    :param: iface: str: The name of the interface
+    :param: root: Path: The sysfs net directory
+    """
+
+    def __init__(self, iface: str, root: Path = LINUX_NET_FOLDER):
+        super().__init__(iface)
+        self.directory = root / iface / "statistics"
+        self._fds: Dict[str, int] = {}
+
+    def pin(self, counter: str) -> None:
+        """
+        Open the file of a counter now instead of on the first read
+        """
+        self._fd(counter)
+
+    def _fd(self, counter: str) -> int:
+        fd = self._fds.get(counter)
+        if fd is None:
+            fd = os.open(self.directory / counter, os.O_RDONLY | os.O_CLOEXEC)
+            self._fds[counter] = fd
+        return fd
+
+    def read_counter(self, counter: str) -> Optional[int]:
+        try:
+            value = os.pread(self._fd(counter), 32, 0)
+        except (FileNotFoundError, ProcessLookupError):
+            return None
+        except OSError as e:
+            # The interface was removed while the file was open
+            if e.errno == errno.ENODEV:
+                return None
+            raise
+        try:
+            return int(value)
+        except ValueError:
+            return 0
+
+    def read(self) -> Optional[LinkStats]:
+        values = []
+        for counter in COUNTERS:
+            value = self.read_counter(counter)
+            if value is None:
+                return None
+            values.append(value)
+        return LinkStats(*values)
+
+    def rx_bytes(self) -> Optional[int]:
+        return self.read_counter("rx_bytes")
+
+    def close(self) -> None:
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+
+
+def open_stats_reader(iface: str) -> Optional[StatsReader]:
+    """
+    Open a statistics reader for an interface, using netlink if possible
+    :param: iface: str: The name of the interface
+    :return: The reader or None if the interface does not exist
+    :rtype: Optional[StatsReader]
+    """
+    try:
+        return NetlinkReader(iface)
+    except OSError as e:
+        logger.debug(f"netlink statistics not available for {iface}: {e}")
+    if not (LINUX_NET_FOLDER / iface / "statistics").is_dir():
+        return None
+    return SysfsReader(iface)
+
+
+def open_rx_reader(iface: str, root: Path = LINUX_NET_FOLDER) -> Optional[StatsReader]:
+    """
+    Open a reader for the received bytes of an interface, for callbacks that only need that counter
+
+    The sysfs file is opened once so every read is a single os.pread on the pinned file descriptor,
+    which is cheaper than a netlink request. Netlink is used if the file cannot be opened.
+    :param: iface: str: The name of the interface
+    :param: root: Path: The sysfs net directory
+    :return: The reader or None if the interface does not exist
+    :rtype: Optional[StatsReader]
+    """
+    reader = SysfsReader(iface, root)
+    try:
+        reader.pin("rx_bytes")
+        return reader
+    except OSError as e:
+        logger.debug(f"cannot open the rx_bytes statistics file for {iface}: {e}")
+    if root != LINUX_NET_FOLDER:
+        return None
+    return open_stats_reader(iface)
+
+
+class StatsSampler:
+    """
+    Sample the received and transmitted bytes of the tunnel interface into ring buffers.
+
+    The totals count the bytes since the first sample. A counter that goes
+    back, e.g. because the interface was recreated, starts counting from zero
+    again. If the interface is gone the reader is closed and a reader is
+    opened again on the next sample, so the sampler follows the tunnel
+    interface when reconnecting.
+    :param: open_reader: Callable: Open a reader for the tunnel interface, returns None if there is none
+    :param: interval: float: The number of seconds between two samples
+    :param: size: int: The number of samples to keep
+    """
+
+    def __init__(
+        self,
+        open_reader: Callable[[], Optional[StatsReader]],
+        interval: float = 1.0,
+        size: int = 300,
+    ):
+        self.open_reader = open_reader
+        self.interval = interval
+        self.size = size
+        self._lock = threading.Lock()
+        self._reader: Optional[StatsReader] = None
+        self._cancel: Optional[Callable[[], None]] = None
+        # The raw counters of the last read, None until the first read of a reader
+        self._last_raw: Optional[Tuple[int, int]] = None
+        self._started = False
+        self._rx_total = 0
+        self._tx_total = 0
+        self._peak_rx = 0.0
+        self._peak_tx = 0.0
+        # Ring buffers of the sample times in nanoseconds and the totals, _count samples were taken in total
+        self._times = array("Q", bytes(8 * size))
+        self._rx = array("Q", bytes(8 * size))
+        self._tx = array("Q", bytes(8 * size))
+        self._count = 0
+
+    def start(self) -> None:
+        """
+        Start sampling in a background thread
+        """
+        if self._cancel is None:
+            self._cancel = run_periodically(self._tick, self.interval, "stats-sampler")
+
+    def stop(self) -> None:
+        """
+        Stop sampling and close the reader
+        """
+        if self._cancel is not None:
+            self._cancel()
+            self._cancel = None
+        with self._lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+    def _read(self) -> Optional[Tuple[int, int]]:
+        if self._reader is None:
+            self._reader = self.open_reader()
+            self._last_raw = None
+            if self._reader is None:
+                return None
+        stats = self._reader.read()
+        if stats is None:
+            logger.debug(f"interface {self._reader.iface} is gone, reopening the statistics reader")
+            self._reader.close()
+            self._reader = None
+            return None
+        return stats.rx_bytes, stats.tx_bytes
+
+    def _tick(self) -> None:
+        # Keep sampling when the interface cannot be read, it is reopened after a rebind
+        self.sample()
+
+    def sample(self, now: Optional[int] = None) -> bool:
+        """
+        Take a sample
+        :param: now: Optional[int]: The monotonic time of the sample in nanoseconds
+        :return: Whether the interface could be read
+        :rtype: bool
+        """
+        with self._lock:
+            raw = self._read()
+            if now is None:
+                now = time.monotonic_ns()
+            if raw is None:
+                return False
+            last = self._last_raw
+            self._last_raw = raw
+            if last is None:
+                # The first read counts from now, a new interface after a rebind counts from zero
+                last = raw if not self._started else (0, 0)
+            self._started = True
+            rx = raw[0] - last[0] if raw[0] >= last[0] else max(raw[0], 0)
+            tx = raw[1] - last[1] if raw[1] >= last[1] else max(raw[1], 0)
+            self._rx_total += rx
+            self._tx_total += tx
+
+            if self._count:
+                previous = (self._count - 1) % self.size
+                elapsed = (now - self._times[previous]) / 1e9
+                if elapsed > 0:
+                    self._peak_rx = max(self._peak_rx, rx / elapsed)
+                    self._peak_tx = max(self._peak_tx, tx / elapsed)
+            index = self._count % self.size
+            self._times[index] = now
+            self._rx[index] = self._rx_total
+            self._tx[index] = self._tx_total
+            self._count += 1
+            return True
+
+    @property
+    def samples(self) -> int:
+        """
+        The number of samples taken
+        """
+        return self._count
+
+    @property
+    def total(self) -> Tuple[int, int]:
+        """
+        The received and transmitted bytes since the first sample
+        """
+        with self._lock:
+            return self._rx_total, self._tx_total
+
+    @property
+    def peak(self) -> Tuple[float, float]:
+        """
+        The highest received and transmitted bytes per second between two samples
+        """
+        with self._lock:
+            return self._peak_rx, self._peak_tx
+
+    def rate(self, window: Optional[float] = None) -> Optional[Tuple[float, float]]:
+        """
+        Get the received and transmitted bytes per second
+        :param: window: Optional[float]: The number of seconds to average over, the last interval if None
+        :return: The rates or None if there are not enough samples
+        :rtype: Optional[Tuple[float, float]]
+        """
+        with self._lock:
+            available = min(self._count, self.size)
+            if available < 2:
+                return None
+            last = (self._count - 1) % self.size
+            if window is None:
+                steps = 1
+            else:
+                steps = max(1, min(available - 1, round(window / self.interval)))
+            first = (self._count - 1 - steps) % self.size
+            elapsed = (self._times[last] - self._times[first]) / 1e9
+            if elapsed <= 0:
+                return None
+            return (
+                (self._rx[last] - self._rx[first]) / elapsed,
+                (self._tx[last] - self._tx[first]) / elapsed,
+            )
+
+    def history(self, count: Optional[int] = None) -> List[Tuple[float, float]]:
+        """
+        Get the received and transmitted bytes per second of the last intervals, oldest first
+        :param: count: Optional[int]: The maximum number of intervals, all kept intervals if None
+        :return: The rates per interval
+        :rtype: List[Tuple[float, float]]
+        """
+        with self._lock:
+            available = min(self._count, self.size) - 1
+            if count is not None:
+                available = min(available, count)
+            rates = []
+            for i in range(self._count - available, self._count):
+                current = i % self.size
+                previous = (i - 1) % self.size
+                elapsed = (self._times[current] - self._times[previous]) / 1e9 or 1.0
+                rates.append(
+                    (
+                        (self._rx[current] - self._rx[previous]) / elapsed,
+                        (self._tx[current] - self._tx[previous]) / elapsed,
+                    )
+                )
+            return rates
@@ -1,28 +1,54 @@
 import enum
+import hashlib
 import ipaddress
 import logging
 import os
 import time
 import uuid
-from configparser import ConfigParser
-from ipaddress import ip_address, ip_interface
+from functools import lru_cache
+from ipaddress import IPv4Network, IPv6Network, ip_address
 from pathlib import Path
 from shutil import rmtree
 from socket import AF_INET, AF_INET6, IPPROTO_TCP
-from tempfile import mkdtemp
-from typing import Any, Callable, Optional, TextIO, Tuple
+from tempfile import mkdtemp, mkstemp
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 from eduvpn_common.main import Jar
 from gi.repository.Gio import Cancellable, Task  # type: ignore
 
-from eduvpn.ovpn import Ovpn
-from eduvpn.storage import get_uuid, set_uuid, write_ovpn
+from eduvpn import trace
+from eduvpn.connection import WireGuardConfig, aggregate_networks, collapse_networks
+from eduvpn.netstats import StatsReader, open_rx_reader, open_stats_reader
+from eduvpn.ovpn import Ovpn, Section, UnsupportedOVPN, nm_vpn_data
+from eduvpn.storage import get_uuid, set_uuid
 from eduvpn.utils import run_in_glib_thread
 from eduvpn.variants import ApplicationVariant
 
 _logger = logging.getLogger(__name__)
 
-LINUX_NET_FOLDER = Path("/sys/class/net")
+NM_OPENVPN_SERVICE = "org.freedesktop.NetworkManager.openvpn"
+
+# The directory the NetworkManager openvpn plugin also uses for imported certificates and keys
+NM_OPENVPN_CERT_DIR = Path("~/.cert/nm-openvpn")
+
+# The file names for the openvpn plugin data items that hold a path
+NM_OPENVPN_BLOB_NAMES = {
+    "ca": "ca.pem",
+    "cert": "cert.pem",
+    "key": "key.pem",
+    "ta": "tls-auth.pem",
+    "tls-crypt": "tls-crypt.pem",
+    "tls-crypt-v2": "tls-crypt-v2.pem",
+}
+
+# The digests of the blobs written by this process, keyed by path
+_written_blobs: Dict[Path, bytes] = {}
+
+# The default number of seconds to wait for an added connection to show up before activating it
+ACTIVATION_TIMEOUT = 5.0
+
+# The maximum number of ProxyGuard peer routing rules per address family
+MAX_PROXY_RULES = 8
 
 try:
     import gi
@@ -79,13 +105,216 @@ class ConnectionState(enum.Enum):
             raise ValueError(state)
 
 
+class ActiveConnectionSnapshot:
+    """A snapshot of an active connection with the values that are read often, see NMStateMirror
+    :param: connection: NM.ActiveConnection: The active connection
+    """
+
+    __slots__ = ("connection", "device", "iface", "ip4_config", "ip6_config")
+
+    def __init__(self, connection: "NM.ActiveConnection"):
+        self.connection = connection
+        devices = connection.get_devices()
+        # Not always a master device is configured
+        # So use the first device we have
+        self.device = devices[0] if devices else None
+        self.iface = self.device.get_iface() if self.device else None
+        self.ip4_config = connection.get_ip4_config()
+        self.ip6_config = connection.get_ip6_config()
+
+
+# The key of the device index, the UUID of an available connection and the device type description
+DeviceKey = Tuple[str, str]
+
+
+class NMStateMirror:
+    """A mirror of the active connections of a NetworkManager client, indexed by UUID
+    The mirror is updated from the client and active connection signals, so that a lookup
+    does not have to go over every active connection.
+    It also indexes the devices by the UUIDs of their available connections and their type,
+    updated from the device signals. All devices are indexed, including software devices that are not realized yet,
+    e.g. the WireGuard device of a connection that is not active.
+    The signals are emitted in the GLib thread, a snapshot and the devices of a connection are replaced as a whole
+    so that they can be read from any thread.
+    :param: client: NM.Client: The client to mirror
+    """
+
+    def __init__(self, client: "NM.Client"):
+        self.client = client
+        self._snapshots: Dict[str, ActiveConnectionSnapshot] = {}
+        self._handlers: Dict[Any, List[int]] = {}
+        self._devices: Dict[DeviceKey, Tuple["NM.Device", ...]] = {}
+        self._device_keys: Dict[Any, List[DeviceKey]] = {}
+        self._device_handlers: Dict[Any, int] = {}
+        # The number of times a snapshot or the device index was updated
+        self.updates = 0
+        for connection in client.get_active_connections():
+            self._watch(connection)
+        for device in client.get_all_devices():
+            self._watch_device(device)
+        client.connect("active-connection-added", self._on_connection_added)
+        client.connect("active-connection-removed", self._on_connection_removed)
+        client.connect("any-device-added", self._on_device_added)
+        client.connect("any-device-removed", self._on_device_removed)
+        # Realizing a device changes the devices of the active connections
+        client.connect("device-added", self._on_devices_changed)
+        client.connect("device-removed", self._on_devices_changed)
+
+    def get(self, uuid: Optional[str]) -> Optional[ActiveConnectionSnapshot]:
+        """Get the snapshot of the active connection with a UUID
+        :param: uuid: Optional[str]: The UUID of the connection
+        :return: The snapshot if the connection is active
+        :rtype: Optional[ActiveConnectionSnapshot]
+        """
+        if uuid is None:
+            return None
+        return self._snapshots.get(uuid)
+
+    def device(self, uuid: Optional[str], type_description: str) -> Optional["NM.Device"]:
+        """Get a device of a type for which a connection is available
+        :param: uuid: Optional[str]: The UUID of the connection
+        :param: type_description: str: The type description of the device, e.g. wireguard
+        :return: The first device that was indexed for the connection and type
+        :rtype: Optional[NM.Device]
+        """
+        if uuid is None:
+            return None
+        devices = self._devices.get((uuid, type_description))
+        if not devices:
+            return None
+        return devices[0]
+
+    def _index_device(self, device: "NM.Device") -> None:
+        self._unindex_device(device)
+        type_description = device.get_type_description()
+        keys = [(conn.get_uuid(), type_description) for conn in device.get_available_connections()]
+        for key in keys:
+            # The devices of a key are replaced as a whole, see device
+            self._devices[key] = self._devices.get(key, ()) + (device,)
+        self._device_keys[device] = keys
+        self.updates += 1
+
+    def _unindex_device(self, device: "NM.Device") -> None:
+        for key in self._device_keys.pop(device, []):
+            devices = tuple(d for d in self._devices.get(key, ()) if d is not device)
+            if devices:
+                self._devices[key] = devices
+            else:
+                self._devices.pop(key, None)
+
+    def _watch_device(self, device: "NM.Device") -> None:
+        if device not in self._device_handlers:
+            self._device_handlers[device] = device.connect(
+                "notify::available-connections", lambda dev, _: self._index_device(dev)
+            )
+        self._index_device(device)
+
+    def _on_device_added(self, _client: "NM.Client", device: "NM.Device") -> None:
+        self._watch_device(device)
+
+    def _on_device_removed(self, _client: "NM.Client", device: "NM.Device") -> None:
+        handler = self._device_handlers.pop(device, None)
+        if handler is not None:
+            device.disconnect(handler)
+        self._unindex_device(device)
+        self.updates += 1
+
+    def _update(self, connection: "NM.ActiveConnection") -> None:
+        self._snapshots[connection.get_uuid()] = ActiveConnectionSnapshot(connection)
+        self.updates += 1
+
+    def _watch(self, connection: "NM.ActiveConnection") -> None:
+        if connection in self._handlers:
+            return
+        self._handlers[connection] = [
+            connection.connect("state-changed", lambda con, *_: self._update(con)),
+            connection.connect("notify::devices", lambda con, _: self._update(con)),
+            connection.connect("notify::ip4-config", lambda con, _: self._update(con)),
+            connection.connect("notify::ip6-config", lambda con, _: self._update(con)),
+        ]
+        self._update(connection)
+
+    def _on_connection_added(self, _client: "NM.Client", connection: "NM.ActiveConnection") -> None:
+        self._watch(connection)
+
+    def _on_connection_removed(self, _client: "NM.Client", connection: "NM.ActiveConnection") -> None:
+        for handler in self._handlers.pop(connection, []):
+            connection.disconnect(handler)
+        uuid = connection.get_uuid()
+        snapshot = self._snapshots.get(uuid)
+        if snapshot is not None and snapshot.connection is connection:
+            del self._snapshots[uuid]
+            self.updates += 1
+
+    def _on_devices_changed(self, _client: "NM.Client", _device: "NM.Device") -> None:
+        for snapshot in list(self._snapshots.values()):
+            self._update(snapshot.connection)
+
+
+@lru_cache(maxsize=None)
+def openvpn_editor_plugin() -> "NM.VpnEditorPlugin":
+    """
+    Load the NetworkManager openvpn editor plugin, this scans all VPN plugins so it is only done once
+    """
+    vpn_infos = [i for i in NM.VpnPluginInfo.list_load() if i.get_name() == "openvpn"]
+
+    if len(vpn_infos) != 1:
+        raise Exception(f"Expected one openvpn VPN plugins, got: {len(vpn_infos)}")
+    return vpn_infos[0].load_editor_plugin()
+
+
+def write_blob(path: Path, content: str) -> bool:
+    """
+    Write a certificate or key for the openvpn plugin, only if its content changed
+    The digest of a written file is remembered, the file is only read if it was not written by this process
+    :param: path: Path: The file to write
+    :param: content: str: The content of the file
+    :return: Whether the file was written
+    :rtype: bool
+    """
+    data = content.encode()
+    digest = hashlib.sha256(data).digest()
+    if _written_blobs.get(path) == digest:
+        return False
+    try:
+        if hashlib.sha256(path.read_bytes()).digest() == digest:
+            _written_blobs[path] = digest
+            return False
+    except FileNotFoundError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+    # mkstemp creates the file with mode 0600
+    fd, tmp = mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    _written_blobs[path] = digest
+    _logger.debug(f"Wrote {path}")
+    return True
+
+
 # A manager for a manager :-)
 class NMManager:
     def __init__(self, variant: ApplicationVariant):
         self.variant = variant
         self.proxy = None
+        # The networks of the ProxyGuard peer routing rules of the last WireGuard profile
+        self.proxy_networks: List[Union[IPv4Network, IPv6Network]] = []
+        self._mirror: Optional[NMStateMirror] = None
+        # The number of seconds to wait for an added connection before activation fails
+        self.activation_timeout = ACTIVATION_TIMEOUT
+        # The last connection returned by add_connection_finish and when adding it started
+        self.added_connection: Optional["NM.RemoteConnection"] = None
+        # The digest of the settings that were last set for the connection
+        self._connection_digest: Optional[str] = None
+        self._add_started: Optional[float] = None
         try:
             self._client = NM.Client.new(None)
+            self._mirror = NMStateMirror(self._client)
             self.wg_gateway_ip: Optional[ipaddress.IPv4Address] = None
         except Exception:
             self._client = None
@@ -97,44 +326,32 @@ class NMManager:
             raise Exception("no client available")
         return self._client
 
+    @property
+    def mirror(self) -> NMStateMirror:
+        if self._mirror is None:
+            raise Exception("no client available")
+        return self._mirror
+
     @property
     def available(self) -> bool:
         return self._client is not None
 
     # TODO: Move this somewhere else?
-    def open_stats_file(self, filename: str) -> Optional[TextIO]:
+    def open_stats_reader(self) -> Optional[StatsReader]:
         """
-        Helper function to open a statistics network file
+        Open a reader for the statistics counters of the VPN interface
         """
         if not self.iface:
             return None
-        filepath = LINUX_NET_FOLDER / self.iface / "statistics" / filename  # type: ignore
-        if not filepath.is_file():
-            return None
-        return open(filepath, "r")
+        return open_stats_reader(self.iface)
 
-    # TODO: Move this somewhere else?
-    def get_stats_bytes(self, filehandler: Optional[TextIO]) -> Optional[int]:
+    def open_rx_reader(self) -> Optional[StatsReader]:
         """
-        Helper function to get a statistics file to calculate the total data transfer
+        Open a reader for the received bytes of the VPN interface, the interface is resolved once
         """
-        # If the interface is not set
-        # or the file is not present, we cannot get the stat
         if not self.iface:
-            # Warning was already shown
             return None
-        if not filehandler:
-            # Warning was already shown
-            return None
-
-        # Get the statistic from the file
-        # and go to the beginning
-        try:
-            stat = int(filehandler.readline())
-        except ValueError:
-            stat = 0
-        filehandler.seek(0)
-        return stat
+        return open_rx_reader(self.iface)
 
     @property
     def managed(self) -> bool:
@@ -173,15 +390,19 @@ class NMManager:
     def uuid(self, new_uuid):
         set_uuid(self.variant, new_uuid)
 
+    @property
+    def active_snapshot(self) -> Optional[ActiveConnectionSnapshot]:
+        """
+        Gets the snapshot of the active connection for the current uuid
+        """
+        return self.mirror.get(self.uuid)
+
     @property
     def connection_state(self) -> ConnectionState:
-        connections = [
-            connection for connection in self.client.get_active_connections() if connection.get_uuid() == self.uuid
-        ]
-        if len(connections) == 1:
-            connection = connections[0]
-        else:
+        snapshot = self.active_snapshot
+        if snapshot is None:
             return ConnectionState.DISCONNECTED
+        connection = snapshot.connection
         if isinstance(connection, NM.VpnConnection):
             return ConnectionState.from_vpn_state(connection.get_vpn_state())
         elif isinstance(connection, NM.ActiveConnection):
@@ -195,10 +416,10 @@ class NMManager:
         """
         Gets the active connection for the current uuid
         """
-        for connection in self.client.get_active_connections():
-            if connection.get_uuid() == self.uuid:
-                return connection
-        return None
+        snapshot = self.active_snapshot
+        if snapshot is None:
+            return None
+        return snapshot.connection
 
     @property
     def protocol(self) -> Optional[str]:
@@ -222,28 +443,20 @@ class NMManager:
         """
         Get the interface as a string for an openvpn or wireguard connection if there is one
         """
-        active_con = self.active_connection
-        if not active_con:
+        snapshot = self.active_snapshot
+        if snapshot is None:
             return None
-
-        devices = active_con.get_devices()
-        if not devices:
-            return None
-
-        # Not always a master device is configured
-        # So get the interface for the first device we have
-        return devices[0].get_iface()
+        return snapshot.iface
 
     @property
     def ipv4_config(self) -> Optional["NM.IPConfig"]:
         """
         Get the ipv4 config for the active VPN connection
         """
-        active_con = self.active_connection
-        if not active_con:
+        snapshot = self.active_snapshot
+        if snapshot is None:
             return None
-
-        return active_con.get_ip4_config()
+        return snapshot.ip4_config
 
     @property
     def ipv4(self) -> Optional[str]:
@@ -265,12 +478,11 @@ class NMManager:
         """
         Get the ipv6 address for an openvpn or wireguard connection as a string if there is one
         """
-        active_con = self.active_connection
-
-        if not active_con:
+        snapshot = self.active_snapshot
+        if snapshot is None:
             return None
 
-        ip6_config = active_con.get_ip6_config()
+        ip6_config = snapshot.ip6_config
 
         if not ip6_config:
             return None
@@ -323,30 +535,56 @@ class NMManager:
         """
         Use the Network Manager VPN config importer to import an OpenVPN configuration file.
         """
-        vpn_infos = [i for i in NM.VpnPluginInfo.list_load() if i.get_name() == "openvpn"]
-
-        if len(vpn_infos) != 1:
-            raise Exception(f"Expected one openvpn VPN plugins, got: {len(vpn_infos)}")
-
-        conn = vpn_infos[0].load_editor_plugin().import_(str(target))
+        conn = openvpn_editor_plugin().import_(str(target))
         conn.normalize()
         return conn
 
+    def ovpn_to_connection(self, ovpn: Ovpn) -> "NM.SimpleConnection":
+        """
+        Translate the OVPN configuration to a Network Manager connection without the VPN config importer.
+
+        The inline certificates and keys are stored in files, which are only written when they change.
+        Raises UnsupportedOVPN if the configuration cannot be translated.
+        """
+        data, blobs = nm_vpn_data(ovpn)
+        cert_dir = NM_OPENVPN_CERT_DIR.expanduser()
+        for key, content in blobs.items():
+            path = cert_dir / f"{self.variant.name}-{NM_OPENVPN_BLOB_NAMES[key]}"
+            write_blob(path, content)
+            data[key] = str(path)
+
+        connection = NM.SimpleConnection.new()
+        s_con = NM.SettingConnection.new()
+        s_con.set_property(NM.SETTING_CONNECTION_ID, self.variant.name)
+        s_con.set_property(NM.SETTING_CONNECTION_TYPE, NM.SETTING_VPN_SETTING_NAME)
+        s_con.set_property(NM.SETTING_CONNECTION_UUID, str(uuid.uuid4()))
+        s_vpn = NM.SettingVpn.new()
+        s_vpn.set_property(NM.SETTING_VPN_SERVICE_TYPE, NM_OPENVPN_SERVICE)
+        for key, value in data.items():
+            s_vpn.add_data_item(key, value)
+        connection.add_setting(s_con)
+        connection.add_setting(s_vpn)
+        connection.normalize()
+        return connection
+
     def import_ovpn_with_certificate(self, ovpn: Ovpn, private_key: str, certificate: str) -> "NM.SimpleConnection":
         """
         Import the OVPN string into Network Manager.
         """
-        target_parent = Path(mkdtemp())
-        target = target_parent / f"{self.variant.name}.ovpn"
-        write_ovpn(ovpn, private_key, certificate, target)
-        connection = self.ovpn_import(target)
-        rmtree(target_parent)
-        return connection
+        content = ovpn.content + [
+            Section("key", private_key.strip().splitlines()),
+            Section("cert", certificate.strip().splitlines()),
+        ]
+        return self.import_ovpn(Ovpn(content))
 
     def import_ovpn(self, ovpn: Ovpn) -> "NM.SimpleConnection":
         """
         Import the OVPN string into Network Manager.
         """
+        try:
+            return self.ovpn_to_connection(ovpn)
+        except UnsupportedOVPN as e:
+            _logger.debug(f"Using the VPN config importer, cannot translate the configuration: {e}")
         target_parent = Path(mkdtemp())
         target = target_parent / f"{self.variant.name}.ovpn"
         _logger.debug(f"Writing configuration to {target}")
@@ -363,13 +601,14 @@ class NMManager:
         callback: Optional[Callable] = None,
     ) -> None:
         _logger.debug("Adding new connection")
+        self._add_started = time.monotonic()
         c = self.new_cancellable()
         self.client.add_connection_async(
             connection=connection,
             save_to_disk=True,
             callback=add_connection_callback,
             cancellable=c,
-            user_data=(self, c, callback),
+            user_data=(self, c, callback, trace.begin("nm.add_connection")),
         )
 
     def set_connection(
@@ -378,17 +617,96 @@ class NMManager:
         callback: Callable,
     ):
         new_connection = self.set_setting_ensure_permissions(new_connection)
+        existing = self.client.get_connection_by_uuid(self.uuid) if self.uuid else None
+        if existing is not None:
+            self.update_connection(existing, new_connection, callback)
+        else:
+            self.replace_connection(new_connection, callback)
+
+    def replace_connection(
+        self,
+        new_connection: "NM.SimpleConnection",
+        callback: Callable,
+    ):
+        digest = self.connection_digest(new_connection)
+
+        def added(success: bool):
+            self._connection_digest = digest if success else None
+            callback(success)
+
         if self.existing_connection:
 
             def deleted(success: bool):
                 if success:
-                    self.add_connection(new_connection, callback)
+                    self.add_connection(new_connection, added)
                 else:
                     callback(False)
 
             self.delete_connection(deleted)
         else:
-            self.add_connection(new_connection, callback)
+            self.add_connection(new_connection, added)
+
+    def connection_digest(self, connection: "NM.Connection") -> str:
+        """
+        Get a digest of all the settings of a connection, including the secrets
+        """
+        settings = connection.to_dbus(NM.ConnectionSerializationFlags.ALL)
+        return hashlib.sha256(settings.print_(False).encode()).hexdigest()
+
+    @run_in_glib_thread
+    def update_connection(
+        self,
+        existing: "NM.RemoteConnection",
+        new_connection: "NM.SimpleConnection",
+        callback: Callable,
+    ):
+        """
+        Update the existing connection in memory with the settings of a new connection
+
+        The update is skipped if the settings are the same as the last ones that were set
+        and the connection was not changed by someone else since.
+        If updating fails the connection is replaced.
+        """
+        s_con = new_connection.get_setting_connection()
+        s_con.set_property(NM.SETTING_CONNECTION_UUID, existing.get_uuid())
+        digest = self.connection_digest(new_connection)
+        if digest == self._connection_digest:
+            # The secrets are not exposed by the existing connection, they are covered by the digest
+            if existing.compare(
+                new_connection, NM.SettingCompareFlags.IGNORE_SECRETS | NM.SettingCompareFlags.IGNORE_TIMESTAMP
+            ):
+                _logger.debug("Connection settings are unchanged, reusing the connection")
+                trace.instant("nm.update_connection.unchanged")
+                callback(True)
+                return
+            _logger.debug("Connection settings were changed outside of the client, updating the connection")
+            self._connection_digest = None
+
+        span = trace.begin("nm.update_connection")
+
+        def on_updated(a_con: "NM.RemoteConnection", res, user_data=None):
+            self.delete_cancellable(user_data)
+            try:
+                a_con.update2_finish(res)
+            except Exception as e:
+                trace.end(span, error=str(e))
+                _logger.warning(f"update connection error, replacing the connection: {e}")
+                self.replace_connection(new_connection, callback)
+                return
+            trace.end(span)
+            _logger.debug(f"Connection updated for uuid: {a_con.get_uuid()}")
+            self._connection_digest = digest
+            callback(True)
+
+        c = self.new_cancellable()
+        existing.update2(
+            settings=new_connection.to_dbus(NM.ConnectionSerializationFlags.ALL),
+            flags=NM.SettingsUpdate2Flags.IN_MEMORY,
+            args=None,
+            cancellable=c,
+            callback=on_updated,
+            user_data=c,
+        )
 
     def set_setting_ensure_permissions(self, con: "NM.SimpleConnection") -> "NM.SimpleConnection":
         s_con = con.get_setting_connection()
@@ -419,6 +737,7 @@ class NMManager:
         new_con.add_setting(s_ip6)
 
         self.proxy = None
+        self.proxy_networks = []
         self.set_connection(new_con, callback)  # type: ignore
 
     def get_priorities(self, has_proxy: bool, has_lan: bool):
@@ -436,7 +755,7 @@ class NMManager:
 
     def start_wireguard_connection(  # noqa: C901
         self,
-        config: ConfigParser,
+        config: WireGuardConfig,
         default_gateway,
         *,
         allow_wg_lan=False,
@@ -448,8 +767,7 @@ class NMManager:
         ipv4s = []
         ipv6s = []
         self.wg_gateway_ip = None
-        for ip in config["Interface"]["Address"].split(","):
-            addr = ip_interface(ip.strip())
+        for addr in config.interface.addresses:
             if addr.version == 4:
                 if not self.wg_gateway_ip:
                     self.wg_gateway_ip = addr.network[1]
@@ -457,26 +775,10 @@ class NMManager:
             elif addr.version == 6:
                 ipv6s.append(NM.IPAddress(AF_INET6, str(addr.ip), addr.network.prefixlen))
 
-        dns4 = []
-        dns6 = []
-        dns_hostnames = []
-
         # DNS entries are not required
-        dns_entries = config["Interface"].get("DNS")
-        if dns_entries:
-            for dns_entry in dns_entries.split(","):
-                stripped_entry = dns_entry.strip()
-                try:
-                    address = ip_address(stripped_entry)
-                # The entry is not an ip but a hostname
-                # They need to be added to dns search domains
-                except ValueError:
-                    dns_hostnames.append(stripped_entry)
-                else:
-                    if address.version == 4:
-                        dns4.append(str(address))
-                    elif address.version == 6:
-                        dns6.append(str(address))
+        dns4 = [str(address) for address in config.interface.dns if address.version == 4]
+        dns6 = [str(address) for address in config.interface.dns if address.version == 6]
+        dns_hostnames = config.interface.dns_search
 
         profile = NM.SimpleConnection.new()
         s_con = NM.SettingConnection.new()
@@ -487,22 +789,26 @@ class NMManager:
         s_con.set_property(NM.SETTING_CONNECTION_INTERFACE_NAME, self.variant.translation_domain)
 
         # https://lazka.github.io/pgi-docs/NM-1.0/classes/WireGuardPeer.html#NM.WireGuardPeer
-        peer = NM.WireGuardPeer.new()
-        wg_endpoint = config["Peer"]["Endpoint"]
-        peer.set_endpoint(wg_endpoint, allow_invalid=False)
-
-        peer.set_public_key(config["Peer"]["PublicKey"], accept_invalid=False)
-        for ip in config["Peer"]["AllowedIPs"].split(","):
-            peer.append_allowed_ip(ip.strip(), accept_invalid=False)
-
-        try:
-            keepalivestr = config["Peer"].get("PersistentKeepalive", "0")
-            keepalive = int(keepalivestr)
-            if keepalive > 0:
-                _logger.debug(f"setting persistent keepalive: {keepalive}")
-                peer.set_persistent_keepalive(keepalive)
-        except ValueError:
-            _logger.warning(f"failed to parse persistent keepalive as integer: {keepalivestr}")
+        peers = []
+        for wg_peer in config.peers:
+            peer = NM.WireGuardPeer.new()
+            peer.set_endpoint(wg_peer.endpoint, allow_invalid=False)
+            peer.set_public_key(wg_peer.public_key, accept_invalid=False)
+            allowed_ips = wg_peer.allowed_ips
+            # With multiple peers the most specific allowed ip selects the peer,
+            # merging the networks of one peer could then move addresses to another
+            if len(config.peers) == 1 and allowed_ips:
+                allowed_ips = collapse_networks(allowed_ips)
+                _logger.debug(
+                    f"collapsed {len(wg_peer.allowed_ips)} allowed ips into {len(allowed_ips)} "
+                    f"({len(allowed_ips) / len(wg_peer.allowed_ips):.0%})"
+                )
+            for network in allowed_ips:
+                peer.append_allowed_ip(str(network), accept_invalid=False)
+            if wg_peer.persistent_keepalive > 0:
+                _logger.debug(f"setting persistent keepalive: {wg_peer.persistent_keepalive}")
+                peer.set_persistent_keepalive(wg_peer.persistent_keepalive)
+            peers.append(peer)
 
         s_ip4 = NM.SettingIP4Config.new()
         s_ip6 = NM.SettingIP6Config.new()
@@ -556,11 +862,17 @@ class NMManager:
         # We want to make this configurable
         # Additionally, the overlap case with split tunnel doesn't work: https://codeberg.org/eduvpn/linux-app/issues/551
 
-        rules = [(4, AF_INET, s_ip4, 32), (6, AF_INET6, s_ip6, 128)]
+        rules = [(4, AF_INET, s_ip4), (6, AF_INET6, s_ip6)]
         # priority 1 not fwmark fwmarknum table fwmarknum
 
         prios = self.get_priorities(proxy is not None, allow_wg_lan)
-        for ipver, family, setting, subnet in rules:
+        self.proxy_networks = []
+        if proxy:
+            # The proxy rules only match TCP from the proxy source port to the peer port,
+            # so covering more addresses than the peer IPs does not route other traffic
+            self.proxy_networks = aggregate_networks(proxy_peer_ips, MAX_PROXY_RULES)
+            _logger.debug(f"aggregated {len(proxy_peer_ips)} proxy peer ips into {len(self.proxy_networks)} rules")
+        for ipver, family, setting in rules:
             rule = NM.IPRoutingRule.new(family)
             rule.set_priority(prios[0])
             rule.set_invert(True)
@@ -571,15 +883,14 @@ class NMManager:
 
             if proxy:
                 dport_proxy = proxy.peer_port
-                for proxy_peer_ip in proxy_peer_ips:
-                    address = ip_address(proxy_peer_ip)
-                    if address.version != ipver:
+                sport = int(proxy.source_port)
+                for network in self.proxy_networks:
+                    if network.version != ipver:
                         continue
                     proxy_rule = NM.IPRoutingRule.new(family)
                     proxy_rule.set_priority(prios[1])
-                    sport = int(proxy.source_port)
                     proxy_rule.set_source_port(sport, sport)
-                    proxy_rule.set_to(proxy_peer_ip, subnet)
+                    proxy_rule.set_to(str(network.network_address), network.prefixlen)
                     proxy_rule.set_destination_port(dport_proxy, dport_proxy)
                     proxy_rule.set_ipproto(IPPROTO_TCP)
                     setting.add_routing_rule(proxy_rule)
@@ -593,17 +904,13 @@ class NMManager:
                 lan_rule.set_suppress_prefixlength(0)
                 setting.add_routing_rule(lan_rule)
 
-        w_con.append_peer(peer)
-        private_key = config["Interface"]["PrivateKey"]
-        w_con.set_property(NM.SETTING_WIREGUARD_PRIVATE_KEY, private_key)
+        for peer in peers:
+            w_con.append_peer(peer)
+        w_con.set_property(NM.SETTING_WIREGUARD_PRIVATE_KEY, config.interface.private_key)
 
         # set MTU if available in the config
-        mtu = config["Interface"].get("MTU")
-        if mtu:
-            try:
-                w_con.set_property(NM.SETTING_WIREGUARD_MTU, int(mtu))
-            except ValueError:
-                _logger.warning(f"got invalid WireGuard MTU value: {mtu}")
+        if config.interface.mtu:
+            w_con.set_property(NM.SETTING_WIREGUARD_MTU, config.interface.mtu)
 
         profile.add_setting(s_ip4)
         profile.add_setting(s_ip6)
@@ -641,18 +948,78 @@ class NMManager:
         except ValueError:
             pass
 
+    def find_connection(self, uuid: str) -> Optional["NM.RemoteConnection"]:
+        """
+        Find the connection for a uuid, also when it was added but the client did not announce it yet
+        """
+        con = self.client.get_connection_by_uuid(uuid)
+        if con is None and self.added_connection is not None and self.added_connection.get_uuid() == uuid:
+            con = self.added_connection
+        return con
+
+    def wait_for_connection(self, uuid: str, callback: Callable[[Optional["NM.RemoteConnection"]], None]) -> None:
+        """
+        Wait for the connection with a uuid to be added to the client
+
+        The callback is called with the connection when the client emits connection-added for it,
+        or with None when it is not added within the activation timeout.
+        """
+        handlers: List[int] = []
+
+        def done(con: Optional["NM.RemoteConnection"]):
+            if not handlers:
+                return
+            signal, timeout = handlers
+            handlers.clear()
+            self.client.disconnect(signal)
+            GLib.source_remove(timeout)
+            callback(con)
+
+        def on_added(_client: "NM.Client", con: "NM.RemoteConnection"):
+            if con.get_uuid() == uuid:
+                done(con)
+
+        def on_timeout():
+            _logger.error(f"connection with uuid {uuid} was not added within {self.activation_timeout} seconds")
+            done(None)
+            return False
+
+        handlers.append(self.client.connect("connection-added", on_added))
+        handlers.append(GLib.timeout_add(int(self.activation_timeout * 1000), on_timeout))
+
     @run_in_glib_thread
     def activate_connection(self, callback: Optional[Callable] = None) -> None:
-        con = self.client.get_connection_by_uuid(self.uuid)
+        uuid = self.uuid
+        con = self.find_connection(uuid) if uuid else None
         _logger.debug(f"activate_connection: {con}")
-        if con is None:
-            # Temporary workaround, connection is sometimes created too
-            # late while according to the logging the connection is already
-            # created. Need to find the correct event to sync on.
-            time.sleep(0.1)
-            GLib.idle_add(lambda: self.activate_connection(callback))
+        if con is not None:
+            self.activate(con, callback)
+            return
+        if not uuid:
+            _logger.error("no connection to activate")
+            if callback:
+                callback(False)
             return
 
+        def found(con: Optional["NM.RemoteConnection"]):
+            if con is None:
+                if callback:
+                    callback(False)
+                return
+            self.activate(con, callback)
+
+        # The connection is sometimes not yet known by the client
+        # Wait for it to be added instead of polling
+        self.wait_for_connection(uuid, found)
+
+    def activate(self, con: "NM.RemoteConnection", callback: Optional[Callable] = None) -> None:
+        if self._add_started is not None:
+            latency = time.monotonic() - self._add_started
+            self._add_started = None
+            _logger.debug(f"activating connection {latency * 1000:.1f} ms after adding it")
+
+        span = trace.begin("nm.activate_connection")
+
         def activate_connection_callback(a_client, res, user_data=None):
             callback = None
             c = None
@@ -662,17 +1029,26 @@ class NMManager:
             try:
                 result = a_client.activate_connection_finish(res)
             except Exception as e:
+                trace.end(span, error=str(e))
                 _logger.error(e)
                 if c:
                     self.delete_cancellable(c)
                 if callback:
                     callback(False)
             else:
+                trace.end(span)
                 _logger.debug(f"activate_connection_async result: {result}")
                 signal = None
+                # From the activation request to the connection being activated
+                activating = trace.begin("nm.activating")
 
                 def changed_state(active: "NM.ActiveConnection", state_code: int, _reason_code: int):
                     state = NM.ActiveConnectionState(state_code)
+                    if ConnectionState.from_active_state(state) in (
+                        ConnectionState.CONNECTED,
+                        ConnectionState.DISCONNECTED,
+                    ):
+                        trace.end(activating, state=state.value_nick)
                     if ConnectionState.from_active_state(state) == ConnectionState.CONNECTED:
                         if c:
                             self.delete_cancellable(c)
@@ -690,7 +1066,8 @@ class NMManager:
                         if callback:
                             callback(False)
 
-                signal = self.active_connection.connect("state-changed", changed_state)
+                active = result if result is not None else self.active_connection
+                signal = active.connect("state-changed", changed_state)
 
         c = self.new_connect_cancellable()
         self.client.activate_connection_async(
@@ -700,7 +1077,12 @@ class NMManager:
             user_data=(c, callback),
         )
 
-    def deactivate_connection(self, callback: Optional[Callable] = None) -> None:
+    def deactivate_connection(self, callback: Optional[Callable] = None, delete: bool = True) -> None:
+        """
+        Deactivate the connection
+        :param: callback: Optional[Callable]: Called with whether or not deactivating succeeded
+        :param: delete: bool: Whether or not to delete the connection, it is kept to update it when reconnecting
+        """
         connection = self.active_connection
         if connection is None:
             _logger.warning(f"no connection to deactivate of uuid {uuid}")
@@ -709,16 +1091,16 @@ class NMManager:
             return
         type = connection.get_connection_type()
         if type == "vpn":
-            self.deactivate_connection_vpn(callback)
+            self.deactivate_connection_vpn(callback, delete)
         elif type == "wireguard":
-            self.deactivate_connection_wg(callback)
+            self.deactivate_connection_wg(callback, delete)
         else:
             _logger.warning(f"unexpected connection type {type}")
             if callback:
                 callback(False)
 
     @run_in_glib_thread
-    def deactivate_connection_vpn(self, callback: Optional[Callable] = None) -> None:
+    def deactivate_connection_vpn(self, callback: Optional[Callable] = None, delete: bool = True) -> None:
         con = self.active_connection
         _logger.debug(f"deactivate_connection uuid: {uuid} connection: {con}")
         if con:
@@ -745,7 +1127,10 @@ class NMManager:
                             # Whether or not deletion was a success, we return true
                             callback(success)
 
-                    self.delete_connection(on_deleted)
+                    if delete:
+                        self.delete_connection(on_deleted)
+                    else:
+                        on_deleted(True)
 
             c = self.new_cancellable()
             self.client.deactivate_connection_async(
@@ -759,6 +1144,8 @@ class NMManager:
 
     @run_in_glib_thread
     def delete_connection(self, callback: Callable) -> None:
+        # The settings have to be set again for a new connection
+        self._connection_digest = None
         # We run the disconnected callback early if a delete fail happens
         if self.uuid is None:
             _logger.debug("No uuid found for deleting the connection")
@@ -796,19 +1183,10 @@ class NMManager:
 
     @property
     def wireguard_device(self) -> Optional["NM.DeviceWireGuard"]:
-        devices = [
-            device
-            for device in self.client.get_all_devices()
-            if device.get_type_description() == "wireguard"
-            and self.uuid in {conn.get_uuid() for conn in device.get_available_connections()}
-        ]
-        if not devices:
-            return None
-
-        return devices[0]
+        return self.mirror.device(self.uuid, "wireguard")
 
     @run_in_glib_thread
-    def deactivate_connection_wg(self, callback: Optional[Callable] = None) -> None:
+    def deactivate_connection_wg(self, callback: Optional[Callable] = None, delete: bool = True) -> None:
         def on_disconnect(a_device: "NM.DeviceWireGuard", res, user_data=None):
             callback = None
             c = None
@@ -830,7 +1208,10 @@ class NMManager:
                     if callback:
                         callback(success)
 
-                self.delete_connection(on_deleted)
+                if delete:
+                    self.delete_connection(on_deleted)
+                else:
+                    on_deleted(True)
 
         _logger.debug(f"disconnect uuid: {uuid}")
         device = self.wireguard_device
@@ -909,16 +1290,19 @@ def action_with_mainloop(action: Callable):
 
 
 def add_connection_callback(client: NM.Client, result: Task, user_data) -> None:
-    object, c, callback = user_data
+    object, c, callback, span = user_data
     try:
         new_con = client.add_connection_finish(result)
     except Exception as e:
+        trace.end(span, error=str(e))
         object.delete_cancellable(c)
         _logger.error(f"add connection error: {e}")
         if callback is not None:
             callback(False)
     else:
+        trace.end(span)
         object.delete_cancellable(c)
+        object.added_connection = new_con
         object.uuid = new_con.get_uuid()
         _logger.debug(f"Connection added for uuid: {object.uuid}")
         if callback is not None:
@@ -1,5 +1,5 @@
 from io import StringIO, TextIOWrapper
-from typing import Iterable, List
+from typing import Dict, Iterable, List, Tuple
 
 
 class Item:
@@ -57,6 +57,108 @@ class InvalidOVPN(Exception):
     pass
 
 
+class UnsupportedOVPN(Exception):
+    """
+    The configuration uses an option that is not translated to NetworkManager settings
+    """
+
+
+# OpenVPN options with one argument that map to a NetworkManager openvpn plugin data item
+NM_OPTIONS = {
+    "auth": "auth",
+    "cipher": "cipher",
+    "connect-timeout": "connect-timeout",
+    "data-ciphers": "data-ciphers",
+    "data-ciphers-fallback": "data-ciphers-fallback",
+    "dev": "dev",
+    "dev-type": "dev-type",
+    "ping": "ping",
+    "ping-exit": "ping-exit",
+    "ping-restart": "ping-restart",
+    "reneg-sec": "reneg-seconds",
+    "remote-cert-tls": "remote-cert-tls",
+    "server-poll-timeout": "connect-timeout",
+    "tls-cipher": "tls-cipher",
+    "tls-version-max": "tls-version-max",
+    "tls-version-min": "tls-version-min",
+    "tun-mtu": "tunnel-mtu",
+    "verb": "verb",
+}
+
+# OpenVPN options that are implied by the NetworkManager openvpn plugin
+NM_IMPLIED_OPTIONS = {"client", "nobind"}
+
+# Inline sections and the plugin data item that holds the path to their content
+NM_SECTIONS = {
+    "ca": "ca",
+    "cert": "cert",
+    "key": "key",
+    "tls-auth": "ta",
+    "tls-crypt": "tls-crypt",
+    "tls-crypt-v2": "tls-crypt-v2",
+}
+
+
+def nm_vpn_data(ovpn: "Ovpn") -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Translate an OpenVPN configuration to NetworkManager openvpn plugin data items
+
+    The inline sections are returned separately as the plugin expects paths to files for them.
+    :param: ovpn: Ovpn: The parsed configuration
+    :return: The data items and the content of the sections keyed by their data item
+    :rtype: Tuple[Dict[str, str], Dict[str, str]]
+    """
+    data: Dict[str, str] = {}
+    blobs: Dict[str, str] = {}
+    remotes = []
+    key_direction = None
+    for item in ovpn.content:
+        if isinstance(item, (Comment, Empty)):
+            continue
+        if isinstance(item, Section):
+            if item.tag not in NM_SECTIONS:
+                raise UnsupportedOVPN(f"section <{item.tag}>")
+            blobs[NM_SECTIONS[item.tag]] = "\n".join(item.content) + "\n"
+            continue
+        if not isinstance(item, Field):
+            raise UnsupportedOVPN(repr(item))
+        name, args = item.name, item.arguments
+        if name in NM_IMPLIED_OPTIONS and not args:
+            continue
+        if name in NM_OPTIONS and len(args) == 1:
+            data[NM_OPTIONS[name]] = args[0]
+        elif name == "remote" and 1 <= len(args) <= 3:
+            remotes.append(":".join(args))
+        elif name == "remote-random" and not args:
+            data["remote-random"] = "yes"
+        elif name == "proto" and len(args) == 1:
+            if args[0].startswith("tcp"):
+                data["proto-tcp"] = "yes"
+        elif name == "comp-lzo" and len(args) <= 1:
+            # Mapped the same way as by the NetworkManager importer
+            if not args:
+                data["comp-lzo"] = "adaptive"
+            elif args[0] == "no":
+                data["comp-lzo"] = "no-by-default"
+            else:
+                data["comp-lzo"] = args[0]
+        elif name == "compress" and len(args) <= 1:
+            data["compress"] = args[0] if args else "yes"
+        elif name == "key-direction" and len(args) == 1:
+            key_direction = args[0]
+        else:
+            raise UnsupportedOVPN(f"option {name}")
+    if not remotes:
+        raise UnsupportedOVPN("no remote")
+    if "cert" not in blobs or "key" not in blobs:
+        raise UnsupportedOVPN("no inline certificate and key")
+    data["remote"] = ", ".join(remotes)
+    data["connection-type"] = "tls"
+    if key_direction is not None and "ta" in blobs:
+        data["ta-dir"] = key_direction
+    return data, blobs
+
+
 def parse_ovpn(lines: Iterable[str]) -> Iterable[Item]:
     current_section = None
     for _lineno, line in enumerate(lines):
@@ -1,21 +1,38 @@
 import enum
+import hashlib
 import json
+import locale
 import logging
-from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple, Union
 
 from eduvpn_common.main import ServerType
+from eduvpn_common.state import State, StateType
 
 from eduvpn.discovery import (
     DiscoOrganization,
     DiscoServer,
+    SearchIndex,
+    SharedTranslations,
+    SnapshotError,
+    dump_snapshot,
+    load_snapshot,
+    normalize,
     parse_disco_organizations,
     parse_disco_servers,
+    shared_display_names,
 )
-from eduvpn.i18n import extract_translation
-from eduvpn.settings import IMAGE_PREFIX
+from eduvpn.i18n import extract_translation, fallbacks
+from eduvpn.settings import CONFIG_DIR_MODE, IMAGE_PREFIX
 
 logger = logging.getLogger(__name__)
 TranslatedStr = Union[str, Dict[str, str]]
+# Profiles with the same identifier commonly have the same display name
+_profile_names = SharedTranslations()
 
 
 class Profile:
@@ -25,11 +42,25 @@ class Profile:
     :param: default_gateway: str: Whether or not this profile should have the default gateway set
     """
 
+    __slots__ = ("identifier", "display_name", "default_gateway")
+
     def __init__(self, identifier: str, display_name: Dict[str, str], default_gateway: bool):
-        self.identifier = identifier
-        self.display_name = display_name
+        self.identifier = sys.intern(identifier)
+        self.display_name = _profile_names.share(self.identifier, display_name)
         self.default_gateway = default_gateway
 
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Profile):
+            return NotImplemented
+        return (self.identifier, self.display_name, self.default_gateway) == (
+            other.identifier,
+            other.display_name,
+            other.default_gateway,
+        )
+
+    def __hash__(self) -> int:
+        return hash(self.identifier)
+
     def __str__(self):
         return extract_translation(self.display_name)
 
@@ -40,9 +71,11 @@ class Profiles:
     :param: current: int: The current profile index
     """
 
+    __slots__ = ("profiles", "current_id")
+
     def __init__(self, profiles: Dict[str, Profile], current: str):
         self.profiles = profiles
-        self.current_id = current
+        self.current_id = sys.intern(current)
 
     @property
     def current(self) -> Optional[Profile]:
@@ -60,8 +93,11 @@ class Server:
     :param: url: str: The base URL of the server. In case of secure internet (supertype) this is the organisation ID URL
     :param: display_name: str: The display name of the server
     :param: profiles: Optional[Profiles]: The profiles if there are any already obtained, defaults to None
+    Servers are equal and hash the same if they have the same category and identifier
     """
 
+    __slots__ = ("url", "display_name", "profiles", "delisted")
+
     def __init__(
         self,
         url: str,
@@ -69,14 +105,27 @@ class Server:
         profiles: Optional[Profiles] = None,
         delisted: bool = False,
     ):
-        self.url = url
-        self.display_name = display_name
+        self.url = sys.intern(url)
+        self.display_name = shared_display_names.share(self.url, display_name)
         self.profiles = profiles
         self.delisted = delisted
 
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Server):
+            return NotImplemented
+        return self.category_id == other.category_id and self.identifier == other.identifier
+
+    def __hash__(self) -> int:
+        return hash((self.category_id, self.identifier))
+
     def __str__(self) -> str:
         return extract_translation(self.display_name)
 
+    @property
+    def sort_key(self) -> str:
+        "The normalized display name in the current language"
+        return normalize(str(self))
+
     @property
     def identifier(self) -> str:
         return self.url
@@ -102,6 +151,8 @@ class InstituteServer(Server):
     :param: profiles: Profiles: The profiles of the server
     """
 
+    __slots__ = ("support_contact",)
+
     def __init__(
         self,
         url: str,
@@ -137,6 +188,8 @@ class SecureInternetServer(Server):
     :param: locations: List[str]: The list of secure internet locations
     """
 
+    __slots__ = ("org_id", "support_contact", "country_code", "locations")
+
     def __init__(
         self,
         org_id: str,
@@ -148,7 +201,7 @@ class SecureInternetServer(Server):
         delisted: bool = False,
     ):
         super().__init__(org_id, display_name, profiles, delisted)
-        self.org_id = org_id
+        self.org_id = self.url
         self.support_contact = support_contact
         self.country_code = country_code
         self.locations = locations
@@ -259,11 +312,165 @@ class StatusImage(enum.Enum):
         return IMAGE_PREFIX + self.value
 
 
+ServerKey = Tuple[ServerType, str]
+
+
+def server_key(server) -> ServerKey:
+    """Get the key that uniquely identifies a server, this is the same key eduvpn-common uses
+    :param: server: The server or discovery entry to get the key for
+    :return: The tuple of the category and identifier
+    :rtype: ServerKey
+    """
+    return (server.category_id, server.identifier)
+
+
+def index_servers(servers: Iterable[Any]) -> Dict[ServerKey, Any]:
+    return {server_key(server): server for server in servers}
+
+
 class ServerDatabase:
-    def __init__(self, wrapper, enable_discovery=True) -> None:
+    def __init__(self, wrapper, enable_discovery=True, snapshot_path: Optional[Path] = None) -> None:
         self.wrapper = wrapper
         self.enable_discovery = enable_discovery
-        self.cached: List[Union[DiscoServer, DiscoOrganization]] = []
+        self._cached: List[Union[DiscoServer, DiscoOrganization]] = []
+        self._disco_index: Dict[ServerKey, Union[DiscoServer, DiscoOrganization]] = {}
+        # The search index is built with the cached list, before it is published
+        self._search_index = SearchIndex([])
+        # Incremented every time a new discovery list is published
+        self.disco_generation = 0
+
+        # The last discovery list is persisted so that it is available on startup
+        self.snapshot_path = snapshot_path
+        self._snapshot_digest = b""
+        # Saving happens from the search and the refresh threads
+        self._snapshot_lock = threading.Lock()
+
+        # The configured servers are cached as an immutable snapshot
+        # The snapshot is valid as long as the generation did not change
+        # The index and secure internet server are derived from the snapshot
+        self._lock = threading.Lock()
+        self.generation = 0
+        self._configured: Tuple[Server, ...] = ()
+        self._configured_index: Dict[ServerKey, Server] = {}
+        self._secure_internet: Optional[SecureInternetServer] = None
+        self._configured_generation = -1
+        self.configured_hits = 0
+        self.configured_misses = 0
+
+        # The current server is cached per state transition, see track_transitions
+        # It is also invalidated when the generation changes
+        self.transitions = 0
+        self._tracking = False
+        self._current: Optional[Server] = None
+        self._current_key: Optional[Tuple[int, int]] = None
+        self.current_calls = 0
+        self.current_hits = 0
+
+    def track_transitions(self, event_handler) -> None:
+        """Count the state transitions to cache the current server per transition
+        This must be called before any other callbacks are registered,
+        so that the count is updated before the other callbacks of a transition run
+        :param: event_handler: The eduvpn-common event handler
+        """
+        for state in State:
+            event_handler.add_event(state, StateType.LEAVE, self._on_transition)
+        self._tracking = True
+
+    def _on_transition(self, other_state: State, data: Any) -> None:
+        with self._lock:
+            self.transitions += 1
+
+    def invalidate(self) -> None:
+        """Invalidate the configured servers snapshot.
+        This must be called whenever the servers could have been changed in eduvpn-common
+        """
+        with self._lock:
+            self.generation += 1
+
+    @property
+    def cached(self) -> List[Union[DiscoServer, DiscoOrganization]]:
+        return self._cached
+
+    @cached.setter
+    def cached(self, servers: List[Union[DiscoServer, DiscoOrganization]]) -> None:
+        self._publish(servers)
+
+    def _publish(
+        self,
+        servers: List[Union[DiscoServer, DiscoOrganization]],
+        generation: Optional[int] = None,
+        search_index: Optional[SearchIndex] = None,
+    ) -> bool:
+        """Publish a discovery list together with its indexes
+        The indexes are built in the calling thread, e.g. the thread that loads or refreshes discovery
+        :param: servers: The discovery list
+        :param: generation: Optional[int]: Only publish if no other list was published since this generation
+        :param: search_index: Optional[SearchIndex]: The search index of the list, built if not given
+        :return: Whether or not the list was published
+        :rtype: bool
+        """
+        disco_index = index_servers(servers)
+        if search_index is None:
+            search_index = SearchIndex(servers)
+        with self._lock:
+            if generation is not None and generation != self.disco_generation:
+                return False
+            self._disco_index = disco_index
+            self._search_index = search_index
+            self._cached = servers
+            self.disco_generation += 1
+        return True
+
+    def load_snapshot(self) -> bool:
+        """Load the discovery list from the snapshot on disk
+        :return: Whether or not the snapshot was loaded
+        :rtype: bool
+        """
+        if not self.enable_discovery or self.snapshot_path is None:
+            return False
+        generation = self.disco_generation
+        try:
+            data = self.snapshot_path.read_bytes()
+            servers, postings = load_snapshot(data)
+            self._snapshot_digest = hashlib.sha256(data).digest()
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, SnapshotError) as e:
+            logger.warning(f"Failed to load the discovery snapshot {self.snapshot_path}: {e}")
+            return False
+        # Do not replace a list that was fetched while the snapshot was loading
+        if not self._publish(servers, generation, SearchIndex(servers, postings)):
+            logger.debug("Discovery was fetched while loading the snapshot, ignoring the snapshot")
+            return False
+        logger.debug(f"Loaded {len(servers)} discovery entries from the snapshot")
+        return True
+
+    def save_snapshot(self) -> None:
+        "Save the cached discovery list to the snapshot on disk if it changed."
+        if self.snapshot_path is None:
+            return
+        with self._snapshot_lock:
+            try:
+                with self._lock:
+                    servers, search_index = self._cached, self._search_index
+                data = dump_snapshot(servers, search_index.postings)
+                digest = hashlib.sha256(data).digest()
+                if digest == self._snapshot_digest:
+                    return
+                self.snapshot_path.parent.mkdir(parents=True, exist_ok=True, mode=CONFIG_DIR_MODE)
+                fd, tmp = tempfile.mkstemp(dir=self.snapshot_path.parent, prefix=f".{self.snapshot_path.name}.")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(data)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp, self.snapshot_path)
+                except BaseException:
+                    os.unlink(tmp)
+                    raise
+                self._snapshot_digest = digest
+            except (OSError, SnapshotError) as e:
+                logger.warning(f"Failed to save the discovery snapshot {self.snapshot_path}: {e}")
 
     @property
     def disco(self):
@@ -282,41 +489,139 @@ class ServerDatabase:
         ret_servers.extend(disco_servers)
         if search == "":
             self.cached = ret_servers
+            self.save_snapshot()
         return ret_servers
 
+    def get(self, category_id: ServerType, identifier: str) -> Optional[Server]:
+        "Return the configured server with the category and identifier."
+        return self._snapshot()[1].get((category_id, identifier))
+
+    def get_disco(self, category_id: ServerType, identifier: str) -> Optional[Union[DiscoServer, DiscoOrganization]]:
+        "Return the cached discovery entry with the category and identifier."
+        return self._disco_index.get((category_id, identifier))
+
     def has(self, server) -> Optional[Server]:
-        # The url attribute is always used as an identifier
-        for s in self.configured:
-            if server.identifier == s.identifier:
-                return s
-        return None
+        return self.get(server.category_id, server.identifier)
 
     @property
     def secure_internet(self) -> Optional[SecureInternetServer]:
-        for server in self.configured:
-            if isinstance(server, SecureInternetServer):
-                return server
-        return None
+        return self._snapshot()[2]
 
     @property
-    def current(self):
+    def current(self) -> Optional[Server]:
+        "The current server, this is cached until the next state transition if transitions are tracked."
+        with self._lock:
+            key = (self.transitions, self.generation)
+            if self._tracking and key == self._current_key:
+                self.current_hits += 1
+                return self._current
+            self.current_calls += 1
         try:
-            return parse_current_server(self.wrapper.get_current_server())
+            current = parse_current_server(self.wrapper.get_current_server())
         except Exception as e:
             logger.debug(f"failed to get current server: {str(e)}")
             return None
+        with self._lock:
+            # Only cache if there was no transition in the meantime
+            if key == (self.transitions, self.generation):
+                self._current = current
+                self._current_key = key
+        return current
 
     @property
-    def configured(self):
-        return parse_servers(self.wrapper.get_servers())
+    def configured(self) -> Tuple[Server, ...]:
+        """Get the configured servers, only going to eduvpn-common if the snapshot is stale
+        :return: The configured servers
+        :rtype: Tuple[Server, ...]
+        """
+        return self._snapshot()[0]
+
+    @property
+    def last_configured(self) -> Tuple[Server, ...]:
+        """Get the configured servers of the last snapshot without going to eduvpn-common
+        These can be outdated, they are the servers that were last shown
+        :return: The configured servers
+        :rtype: Tuple[Server, ...]
+        """
+        with self._lock:
+            return self._configured
+
+    def _snapshot(
+        self,
+    ) -> Tuple[Tuple[Server, ...], Dict[ServerKey, Server], Optional[SecureInternetServer], int]:
+        with self._lock:
+            if self._configured_generation == self.generation:
+                self.configured_hits += 1
+                return self._configured, self._configured_index, self._secure_internet, self.generation
+            self.configured_misses += 1
+            generation = self.generation
+        servers = tuple(parse_servers(self.wrapper.get_servers()))
+        index = index_servers(servers)
+        secure_internet = None
+        for server in servers:
+            if isinstance(server, SecureInternetServer):
+                secure_internet = server
+                break
+        with self._lock:
+            # Do not store the snapshot if it was invalidated while we were getting the servers
+            if generation == self.generation:
+                self._configured = servers
+                self._configured_index = index
+                self._secure_internet = secure_internet
+                self._configured_generation = generation
+        return servers, index, secure_internet, generation
 
     def all(self):
         "Return all servers."
         return self.cached
 
+    def configured_view(self, sort: bool = True) -> "ServerView":
+        "The grouped and sorted view of the configured servers, cached per snapshot generation."
+        servers, _, _, generation = self._snapshot()
+        return server_view(servers, sort, ("configured", generation))
+
+    def disco_view(self, sort: bool = True) -> "ServerView":
+        "The grouped and sorted view of the cached discovery list, cached per published list."
+        if not self.enable_discovery:
+            return ServerView([], sort)
+        with self._lock:
+            servers, generation = self._cached, self.disco_generation
+        return server_view(servers, sort, ("disco", generation))
+
+    def _search(self, query: str) -> Tuple[Optional[List[Any]], Optional[Tuple[Any, ...]]]:
+        """Search the discovery list
+        :param: query: str: The search query
+        :return: The results and the key that identifies them if they only depend on the published list
+        """
+        if not self.enable_discovery:
+            return None, None
+        with self._lock:
+            search_index, generation = self._search_index, self.disco_generation
+        secure_internet = self.secure_internet
+        # Nothing is cached yet or the organizations were not cached
+        # because a secure internet server was configured, let eduvpn-common search
+        if len(search_index) == 0 or (secure_internet is None and not search_index.organizations):
+            return self.disco_update(query), None
+        results = search_index.search(query)
+        if secure_internet is not None:
+            results = [r for r in results if not isinstance(r, DiscoOrganization)]
+        return results, ("search", generation, query, secure_internet is None)
+
     def search_predefined(self, query: str):
         "Return all servers that match the search query."
-        return self.disco_update(query)
+        return self._search(query)[0]
+
+    def search_view(self, query: str) -> Optional["ServerView"]:
+        """Get the view of the servers that match the search query
+        The full list is sorted by display name, search results are kept in the order in which they are ranked
+        :param: query: str: The search query
+        :return: The view, None if discovery is disabled
+        :rtype: Optional[ServerView]
+        """
+        results, key = self._search(query)
+        if results is None:
+            return None
+        return server_view(results, query == "", key)
 
     def search_custom(self, query: str) -> Iterable[Server]:
         yield Server(query, query)  # type: ignore[arg-type]
@@ -328,24 +633,162 @@ class ServerGroup(enum.Enum):
     OTHER = enum.auto()
 
 
-def group_servers(servers):
+def server_group(server) -> Optional[ServerGroup]:
+    "Get the group of a configured server or discovery entry."
+    if isinstance(server, InstituteServer) or (
+        isinstance(server, DiscoServer) and server.server_type == "institute_access"
+    ):
+        return ServerGroup.INSTITUTE_ACCESS
+    if isinstance(server, SecureInternetServer) or isinstance(server, DiscoOrganization):
+        return ServerGroup.SECURE_INTERNET
+    if isinstance(server, Server):
+        return ServerGroup.OTHER
+    return None
+
+
+def collation_key(server) -> str:
+    "Get the key to sort a server by display name in the current locale."
+    try:
+        return locale.strxfrm(server.sort_key)
+    except (ValueError, locale.Error):
+        return server.sort_key
+
+
+class ServerView:
+    """The servers separated into groups, in the order in which they are shown and numbered
+    The institute access servers first, then the secure internet servers and then the other servers
+    :param: servers: Iterable: The servers and/or discovery entries
+    :param: sort: bool: Whether or not to sort every group by display name, otherwise the order is kept
+    """
+
+    def __init__(self, servers: Iterable[Any], sort: bool = True):
+        groups: Dict[ServerGroup, List[Any]] = {group: [] for group in ServerGroup}
+        for server in servers:
+            group = server_group(server)
+            if group is not None:
+                groups[group].append(server)
+        if sort:
+            for group_servers in groups.values():
+                group_servers.sort(key=collation_key)
+        self.sort = sort
+        self.groups: Dict[ServerGroup, Tuple[Any, ...]] = {group: tuple(groups[group]) for group in ServerGroup}
+        self.ordered: Tuple[Any, ...] = tuple(server for group in ServerGroup for server in self.groups[group])
+
+    def __len__(self) -> int:
+        return len(self.ordered)
+
+    def __iter__(self):
+        return iter(self.ordered)
+
+    def get(self, index: int) -> Optional[Any]:
+        """Get a server by its index in the order in which they are shown
+        :param: index: int: The index, starting at zero
+        :return: The server if the index is valid
+        :rtype: Optional[Any]
+        """
+        if index < 0 or index >= len(self.ordered):
+            return None
+        return self.ordered[index]
+
+
+def collation() -> Tuple[str, Tuple[str, ...]]:
+    "Get the locale settings that the sort order depends on, the collation locale and the translation languages."
+    try:
+        collate = locale.setlocale(locale.LC_COLLATE)
+    except locale.Error:
+        collate = ""
+    return collate, fallbacks()
+
+
+# The last computed views by generation of the server list, sort and collation, see server_view
+_views: Dict[Tuple[Hashable, bool, Tuple[str, Tuple[str, ...]]], ServerView] = {}
+# The maximum number of cached views
+MAX_VIEWS = 8
+
+
+def server_view(servers, sort: bool = True, generation: Optional[Hashable] = None) -> ServerView:
+    """Get the grouped and sorted view of a server list
+    The view is cached if the generation of the server list is given, e.g. the generation of the configured
+    servers or of the discovery list. A generation must identify the contents of exactly one server list
+    :param: servers: The servers and/or discovery entries
+    :param: sort: bool: Whether or not to sort every group by display name
+    :param: generation: Optional[Hashable]: The generation of the server list, the view is not cached if None
+    :return: The view
+    :rtype: ServerView
+    """
+    if generation is None:
+        return ServerView(servers, sort)
+    key = (generation, sort, collation())
+    view = _views.get(key)
+    if view is None:
+        view = ServerView(servers, sort)
+        if len(_views) >= MAX_VIEWS:
+            _views.clear()
+        _views[key] = view
+    return view
+
+
+def server_state(server) -> Tuple[Any, ...]:
+    """Get the state of a server that is shown to the user
+    Two servers with the same key and state are shown the same
+    :param: server: The server
+    :return: The display name, whether or not it is delisted, the profiles, the country code and the locations
+    :rtype: Tuple[Any, ...]
+    """
+    display_name = server.display_name
+    if isinstance(display_name, dict):
+        display_name = tuple(sorted(display_name.items()))
+    profiles = getattr(server, "profiles", None)
+    profiles_state = None
+    if profiles is not None:
+        profiles_state = (
+            tuple(sorted((k, str(p)) for k, p in profiles.profiles.items())),
+            profiles.current_id,
+        )
+    return (
+        display_name,
+        getattr(server, "delisted", False),
+        profiles_state,
+        getattr(server, "country_code", None),
+        tuple(getattr(server, "locations", ())),
+    )
+
+
+class ServerListDelta:
+    """The difference between two server lists, the servers are matched by category and identifier
+    :param: servers: Sequence: The new server list
+    :param: added: List: The servers that are only in the new list
+    :param: removed: List: The servers that are only in the old list
+    :param: changed: List: The servers from the new list whose state changed, see server_state
     """
-    Separate the servers into three groups.
+
+    def __init__(self, servers, added: List[Any], removed: List[Any], changed: List[Any]):
+        self.servers = servers
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def __repr__(self) -> str:
+        return f"ServerListDelta(added={len(self.added)}, removed={len(self.removed)}, changed={len(self.changed)})"
+
+
+def diff_servers(old, new) -> ServerListDelta:
+    """Compute the difference between two server lists
+    :param: old: The old server list
+    :param: new: The new server list
+    :return: The difference
+    :rtype: ServerListDelta
     """
-    groups: Dict[ServerGroup, List[Server]] = {  # type: ignore
-        ServerGroup.INSTITUTE_ACCESS: [],
-        ServerGroup.SECURE_INTERNET: [],
-        ServerGroup.OTHER: [],
-    }
-    for server in servers:
-        if isinstance(server, InstituteServer) or (
-            isinstance(server, DiscoServer) and server.server_type == "institute_access"
-        ):
-            groups[ServerGroup.INSTITUTE_ACCESS].append(server)
-        elif isinstance(server, SecureInternetServer) or isinstance(server, DiscoOrganization):
-            groups[ServerGroup.SECURE_INTERNET].append(server)
-        elif isinstance(server, Server):
-            groups[ServerGroup.OTHER].append(server)
-        else:
-            continue
-    return groups
+    old_index = index_servers(old)
+    new_index = index_servers(new)
+    added = [server for key, server in new_index.items() if key not in old_index]
+    removed = [server for key, server in old_index.items() if key not in new_index]
+    changed = [
+        server
+        for key, server in new_index.items()
+        if key in old_index and server_state(server) != server_state(old_index[key])
+    ]
+    return ServerListDelta(new, added, removed, changed)
@@ -7,6 +7,7 @@ prefix = get_prefix()
 CONFIG_PREFIX = (Path(get_config_dir()).expanduser() / "eduvpn").resolve()
 LETSCONNECT_CONFIG_PREFIX = (Path(get_config_dir()).expanduser() / "letsconnect").resolve()
 CONFIG_DIR_MODE = 0o700  # Same as the Go library
+DISCOVERY_SNAPSHOT_FILENAME = "discovery.snapshot"
 
 CLIENT_ID = "org.eduvpn.app.linux"
 LETSCONNECT_CLIENT_ID = "org.letsconnect-vpn.app.linux"
@@ -2,22 +2,124 @@
 This module contains code to maintain a simple metadata storage in ~/.config/eduvpn/
 """
 
-from os import PathLike
-from typing import Optional
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
 
-from eduvpn.ovpn import Ovpn
 from eduvpn.settings import CONFIG_DIR_MODE, CONFIG_PREFIX
 from eduvpn.utils import get_logger
 
 logger = get_logger(__name__)
 
 
+# The identity of a settings file, changes when the file is replaced or written
+FileStamp = Tuple[int, int, int]
+
+
+class SettingsStore:
+    """
+    A cache for the settings files in the config directory.
+
+    A setting is read from disk only when its file changed, which is checked by
+    comparing the inode, modification time and size. This check is done at most
+    once every `check_interval` seconds per setting, so that the CLI and GUI see
+    each other's changes without a filesystem access on every read.
+    Settings are written atomically by writing a temporary file, syncing it and renaming it.
+    :param: check_interval: float: The minimum number of seconds between two checks of a file
+    """
+
+    def __init__(self, check_interval: float = 1.0):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        # (prefix, name) -> (stamp, value, monotonic time of the last check)
+        self._cache: Dict[Tuple[Path, str], Tuple[Optional[FileStamp], Optional[str], float]] = {}
+        # The number of times a settings file was read from disk
+        self.reads = 0
+
+    @staticmethod
+    def path(variant, what: str) -> Path:
+        return (variant.config_prefix / what).expanduser()
+
+    @staticmethod
+    def _stamp(path: Path) -> Optional[FileStamp]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def get(self, variant, what: str) -> Optional[str]:
+        """
+        Get a setting
+        :param: variant: The application variant which determines the config directory
+        :param: what: str: The name of the setting
+        :return: The value of the setting or None if it is not set
+        :rtype: Optional[str]
+        """
+        key = (variant.config_prefix, what)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached is not None and now - cached[2] < self.check_interval:
+            return cached[1]
+
+        p = self.path(variant, what)
+        stamp = self._stamp(p)
+        if cached is not None and cached[0] == stamp:
+            value = cached[1]
+        elif stamp is None:
+            value = None
+        else:
+            try:
+                with open(p, "r") as f:
+                    value = f.read().strip()
+            except FileNotFoundError:
+                stamp, value = None, None
+            self.reads += 1
+        with self._lock:
+            self._cache[key] = (stamp, value, now)
+        return value
+
+    def set(self, variant, what: str, value: str):
+        """
+        Set a setting, the file is replaced atomically
+        :param: variant: The application variant which determines the config directory
+        :param: what: str: The name of the setting
+        :param: value: str: The value to write
+        """
+        p = self.path(variant, what)
+        ensure_config_dir_exists()
+        p.parent.mkdir(parents=True, exist_ok=True, mode=CONFIG_DIR_MODE)
+        fd, tmp = tempfile.mkstemp(dir=p.parent, prefix=f".{p.name}.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(value)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, p)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        stamp = self._stamp(p)
+        with self._lock:
+            self._cache[(variant.config_prefix, what)] = (stamp, value.strip(), time.monotonic())
+
+    def invalidate(self):
+        """
+        Forget all cached settings so that they are read from disk again
+        """
+        with self._lock:
+            self._cache.clear()
+
+
+settings = SettingsStore()
+
+
 def get_setting(variant, what: str) -> Optional[str]:
-    p = (variant.config_prefix / what).expanduser()
-    if p.exists():
-        return open(p, "r").read().strip()
-    else:
-        return None
+    return settings.get(variant, what)
 
 
 def is_config_dir_permissions_correct() -> bool:
@@ -40,21 +142,7 @@ def ensure_config_dir_exists():
 
 
 def set_setting(variant, what: str, value: str):
-    p = (variant.config_prefix / what).expanduser()
-    ensure_config_dir_exists()
-    with open(p, "w") as f:
-        f.write(value)
-
-
-def write_ovpn(ovpn: Ovpn, private_key: str, certificate: str, target: PathLike):
-    """
-    Write the OVPN configuration file to target.
-    """
-    logger.info(f"Writing configuration to {target}")
-    with open(target, mode="w+t") as f:
-        ovpn.write(f)
-        f.writelines(f"\n<key>\n{private_key}\n</key>\n")
-        f.writelines(f"\n<cert>\n{certificate}\n</cert>\n")
+    settings.set(variant, what, value)
 
 
 def get_uuid(variant) -> Optional[str]:
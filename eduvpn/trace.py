@@ -0,0 +1,235 @@
+"""
+Trace the stages of connecting as spans and export them as Chrome trace events.
+
+Tracing is enabled by setting EDUVPN_TRACE to the path of the trace file,
+or to 1 to write it to the eduvpn directory in the user's cache directory. The file can be opened in
+chrome://tracing or https://ui.perfetto.dev. When tracing is disabled
+begin returns None and end returns immediately, so spans cost about a
+function call.
+"""
+
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACE_ENV = "EDUVPN_TRACE"
+DEFAULT_TRACE_FILENAME = "eduvpn-trace.json"
+
+# Returned by span when tracing is disabled, reusable as it does nothing
+_NO_SPAN: AbstractContextManager = nullcontext()
+
+
+class Span:
+    """
+    A span that has begun but not yet ended
+    :param: name: str: The name of the span
+    :param: category: str: The category of the span
+    :param: start: float: The monotonic time the span began
+    :param: thread: int: The identifier of the thread that began the span
+    :param: args: Dict[str, Any]: Extra values shown with the span
+    """
+
+    __slots__ = ("name", "category", "start", "thread", "args")
+
+    def __init__(self, name: str, category: str, start: float, thread: int, args: Dict[str, Any]):
+        self.name = name
+        self.category = category
+        self.start = start
+        self.thread = thread
+        self.args = args
+
+
+class Tracer:
+    """
+    Record spans with monotonic timestamps per thread
+    :param: path: Optional[Path]: The file to dump the trace to, tracing is disabled if None
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self.enabled = path is not None
+        self.started = time.monotonic()
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._events: List[Dict[str, Any]] = []
+        # thread identifier -> thread name
+        self._threads: Dict[int, str] = {}
+
+    def _thread(self) -> int:
+        thread = threading.current_thread()
+        ident = thread.ident or 0
+        if ident not in self._threads:
+            with self._lock:
+                self._threads[ident] = thread.name
+        return ident
+
+    def _timestamp(self, monotonic: float) -> float:
+        # Chrome trace events are in microseconds
+        return (monotonic - self.started) * 1e6
+
+    def begin(self, name: str, category: str = "connect", **args) -> Optional[Span]:
+        """
+        Begin a span, it can be ended from any thread
+        :param: name: str: The name of the span
+        :param: category: str: The category of the span
+        :return: The span, None if tracing is disabled
+        :rtype: Optional[Span]
+        """
+        if not self.enabled:
+            return None
+        return Span(name, category, time.monotonic(), self._thread(), args)
+
+    def end(self, span: Optional[Span], **args) -> None:
+        """
+        End a span, the extra arguments are added to the values of the span
+        :param: span: Optional[Span]: The span returned by begin
+        """
+        if span is None:
+            return
+        end = time.monotonic()
+        span.args.update(args)
+        thread = self._thread()
+        if thread != span.thread:
+            span.args["end_thread"] = self._threads[thread]
+        event = {
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",
+            "ts": self._timestamp(span.start),
+            "dur": (end - span.start) * 1e6,
+            "pid": self.pid,
+            "tid": span.thread,
+        }
+        if span.args:
+            event["args"] = span.args
+        with self._lock:
+            self._events.append(event)
+
+    def span(self, name: str, category: str = "connect", **args) -> AbstractContextManager:
+        """
+        Trace the block of a with statement as a span
+        :param: name: str: The name of the span
+        :param: category: str: The category of the span
+        """
+        if not self.enabled:
+            return _NO_SPAN
+        return self._span(name, category, args)
+
+    @contextmanager
+    def _span(self, name: str, category: str, args: Dict[str, Any]) -> Iterator[Optional[Span]]:
+        span = self.begin(name, category, **args)
+        try:
+            yield span
+        finally:
+            self.end(span)
+
+    def instant(self, name: str, category: str = "connect", **args) -> None:
+        """
+        Record an event without a duration
+        :param: name: str: The name of the event
+        :param: category: str: The category of the event
+        """
+        if not self.enabled:
+            return
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "i",
+            "s": "t",
+            "ts": self._timestamp(time.monotonic()),
+            "pid": self.pid,
+            "tid": self._thread(),
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self._events.append(event)
+
+    def trace_events(self) -> List[Dict[str, Any]]:
+        """
+        Get the recorded events preceded by the thread name metadata events
+        :return: The events in the Chrome trace event format
+        :rtype: List[Dict[str, Any]]
+        """
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        metadata: List[Dict[str, Any]] = [
+            {"name": "process_name", "ph": "M", "pid": self.pid, "tid": 0, "args": {"name": "eduvpn"}}
+        ]
+        for ident, name in threads.items():
+            metadata.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": ident, "args": {"name": name}})
+        return metadata + events
+
+    def dump(self, path: Optional[Path] = None) -> None:
+        """
+        Write the trace as Chrome trace event JSON, the file is replaced atomically
+        :param: path: Optional[Path]: The file to write, the path of the tracer if None
+        """
+        path = path or self.path
+        if path is None:
+            return
+        trace = {"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+            fd, temporary = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(trace, f, default=str)
+                os.replace(temporary, path)
+            except BaseException:
+                os.unlink(temporary)
+                raise
+        except OSError as e:
+            logger.warning(f"failed to write trace to {path}: {e}")
+            return
+        logger.debug(f"wrote {len(trace['traceEvents'])} trace events to {path}")
+
+
+def trace_path(value: Optional[str]) -> Optional[Path]:
+    """
+    Get the trace file from the value of the EDUVPN_TRACE environment variable
+    :param: value: Optional[str]: The value of the environment variable
+    :return: The path of the trace file, None if tracing is disabled
+    :rtype: Optional[Path]
+    """
+    if not value or value == "0":
+        return None
+    if value == "1":
+        cache_dir = Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")).expanduser()
+        return cache_dir / "eduvpn" / DEFAULT_TRACE_FILENAME
+    return Path(value).expanduser()
+
+
+tracer = Tracer(trace_path(os.environ.get(TRACE_ENV)))
+if tracer.enabled:
+    atexit.register(tracer.dump)
+
+
+def begin(name: str, category: str = "connect", **args) -> Optional[Span]:
+    return tracer.begin(name, category, **args)
+
+
+def end(span: Optional[Span], **args) -> None:
+    tracer.end(span, **args)
+
+
+def span(name: str, category: str = "connect", **args) -> AbstractContextManager:
+    return tracer.span(name, category, **args)
+
+
+def instant(name: str, category: str = "connect", **args) -> None:
+    tracer.instant(name, category, **args)
+
+
+def dump() -> None:
+    tracer.dump()
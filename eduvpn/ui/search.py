@@ -2,7 +2,7 @@ from gi.overrides.Gtk import ListStore  # type: ignore
 from gi.repository import GLib
 
 from eduvpn.i18n import retrieve_country_name
-from eduvpn.server import SecureInternetServer, ServerGroup, group_servers
+from eduvpn.server import SecureInternetServer, ServerGroup, ServerListDelta, ServerView, server_key, server_view
 from eduvpn.ui.utils import show_ui_component
 from eduvpn.utils import run_in_background_thread, run_in_glib_thread
 
@@ -119,13 +119,12 @@ def update_search_results_for_type(
     window: "EduVpnGtkWindow",  # type: ignore[name-defined] # noqa: F821
     group: ServerGroup,
     servers,  # type: ignore  # noqa: F821
-    enable_sorting: bool,
 ) -> None:
     """
     Update the UI with the search results
     for a single type of server.
+    The servers are shown in the given order.
     """
-    from gi.repository import Gtk
 
     @run_in_background_thread("search-convert-model")
     def convert(servers, callback):
@@ -133,12 +132,7 @@ def update_search_results_for_type(
         # Remove the old search results.
         for server in servers:
             model.append(server_to_model_data(server))
-        if enable_sorting:
-            sorted_model = Gtk.TreeModelSort(model=model)  # type: ignore
-            sorted_model.set_sort_column_id(0, Gtk.SortType.ASCENDING)  # type: ignore
-            callback(sorted_model)
-        else:
-            callback(model)
+        callback(model)
 
     @run_in_glib_thread
     def callback(model):
@@ -154,16 +148,62 @@ def update_search_results_for_type(
 def update_results(window: "EduVpnGtkWindow", servers, search: str = "") -> None:  # type: ignore  # noqa: F821
     """
     Update the UI with the search results.
+    The servers are either a server list or a view that is already grouped and sorted.
     """
     if servers is None:
         show_search_results(window, False)
         return
-    server_map = group_servers(servers)
+    if isinstance(servers, ServerView):
+        view = servers
+    else:
+        # Only the full list is sorted, search results are ranked
+        view = server_view(servers, search == "")
     for group in group_scroll_component:
         update_search_results_for_type(
             window,
             group,
-            server_map.get(group, []),
-            search == "",
+            view.groups[group],
         )
     show_search_results(window, True)
+
+
+def apply_delta(window: "EduVpnGtkWindow", delta: ServerListDelta) -> None:  # type: ignore  # noqa: F821
+    """
+    Update the UI with the changes to the server list.
+    Only the rows of the changed servers are updated, the other rows are kept.
+    This must be called in the GLib thread.
+    """
+    from gi.repository import Gtk
+
+    view = server_view(delta.servers)
+    removed = {server_key(server) for server in delta.removed}
+    changed = {server_key(server): server for server in delta.changed}
+    added = {server_key(server) for server in delta.added}
+
+    models = {}
+    for group in group_scroll_component:
+        tree_view = getattr(window, group_tree_component[group])
+        model = tree_view.get_model()
+        if not isinstance(model, Gtk.ListStore):
+            update_results(window, delta.servers)
+            return
+        # The kept rows must match the view without the added servers, otherwise render everything
+        shown = [server_key(row[1]) for row in model if server_key(row[1]) not in removed]
+        if shown != [server_key(server) for server in view.groups[group] if server_key(server) not in added]:
+            update_results(window, delta.servers)
+            return
+        models[group] = model
+
+    for group, model in models.items():
+        # Remove in descending position so that the other positions are not affected
+        for position in reversed(range(len(model))):
+            key = server_key(model[position][1])
+            if key in removed:
+                del model[position]
+            elif key in changed:
+                model[position] = server_to_model_data(changed[key])
+        # Insert in ascending position so that every position is final
+        for position, server in enumerate(view.groups[group]):
+            if server_key(server) in added:
+                model.insert(position, server_to_model_data(server))
+        show_group_tree(window, group, show=len(model) > 0)
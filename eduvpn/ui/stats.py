@@ -1,7 +1,8 @@
 import functools
 import logging
-from typing import Optional, TextIO
+from typing import Optional
 
+from eduvpn.netstats import StatsSampler
 from eduvpn.utils import get_human_readable_bytes, translated_property
 
 logger = logging.getLogger(__name__)
@@ -28,8 +29,9 @@ def cached_stats_property(f):
 
 
 class NetworkStats:
-    def __init__(self, manager):
+    def __init__(self, manager, interval: float = 1.0):
         self.manager = manager
+        self.sampler = StatsSampler(manager.open_stats_reader, interval)
 
     default_text = translated_property("N/A")
 
@@ -56,51 +58,55 @@ class NetworkStats:
             _protocol = self.default_text
         return _protocol
 
-    @cached_stats_property
-    def upload_file(self) -> Optional[TextIO]:
-        return self.manager.open_stats_file("tx_bytes")
-
-    @cached_stats_property
-    def download_file(self) -> Optional[TextIO]:
-        return self.manager.open_stats_file("rx_bytes")
+    def start(self) -> None:
+        """
+        Start sampling the counters of the interface in the background
+        """
+        self.sampler.start()
 
-    @cached_stats_property
-    def start_bytes_upload(self) -> Optional[int]:
-        return self.manager.get_stats_bytes(self.upload_file)  # type: ignore
+    def transferred(self, index: int) -> str:
+        """
+        Get the bytes transferred since the start as a human readable string
+        :param: index: int: 0 for received and 1 for transmitted bytes
+        """
+        if not self.sampler.samples:
+            return self.default_text
+        return get_human_readable_bytes(self.sampler.total[index])
 
-    @cached_stats_property
-    def start_bytes_download(self) -> Optional[int]:
-        return self.manager.get_stats_bytes(self.download_file)  # type: ignore
+    def transfer_rate(self, index: int) -> Optional[str]:
+        """
+        Get the bytes per second of the last interval as a human readable string
+        :param: index: int: 0 for received and 1 for transmitted bytes
+        """
+        rate = self.sampler.rate()
+        if rate is None:
+            return None
+        return f"{get_human_readable_bytes(int(rate[index]))}/s"
 
     @property
     def download(self) -> str:
         """
         Get the download as a human readable string
         """
-        file_bytes_download = self.manager.get_stats_bytes(self.download_file)  # type: ignore
-        if file_bytes_download is None:
-            return self.default_text
-        if file_bytes_download <= self.start_bytes_download:  # type: ignore
-            return get_human_readable_bytes(0)
-        return get_human_readable_bytes(file_bytes_download - self.start_bytes_download)  # type: ignore
+        return self.transferred(0)
 
     @property
     def upload(self) -> str:
         """
         Get the upload as a human readable string
         """
-        file_bytes_upload = self.manager.get_stats_bytes(self.upload_file)  # type: ignore
-        if file_bytes_upload is None:
-            return self.default_text
-        if file_bytes_upload <= self.start_bytes_upload:  # type: ignore
-            return get_human_readable_bytes(0)
-        return get_human_readable_bytes(file_bytes_upload - self.start_bytes_upload)  # type:ignore
+        return self.transferred(1)
+
+    @property
+    def download_rate(self) -> Optional[str]:
+        return self.transfer_rate(0)
+
+    @property
+    def upload_rate(self) -> Optional[str]:
+        return self.transfer_rate(1)
 
     def cleanup(self) -> None:
         """
-        Cleanup the network stats by closing the files
+        Cleanup the network stats by stopping the sampler
         """
-        if self.download_file:
-            self.download_file.close()
-        if self.upload_file:
-            self.upload_file.close()
+        self.sampler.stop()
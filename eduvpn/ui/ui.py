@@ -792,7 +792,7 @@ For detailed information, see the log file located at:
         self.find_server_search_input.grab_focus()
         search.show_result_components(self, True)
         search.show_search_components(self, True)
-        search.update_results(self, self.app.model.server_db.disco)
+        search.update_results(self, self.app.model.server_db.disco_view())
         search.init_server_search(self)
 
         # asynchronously update the search results
@@ -1093,12 +1093,12 @@ For detailed information, see the log file located at:
         self.info_dialog.hide()
 
     @ui_transition(SERVER_LIST_REFRESH_STATE, StateType.ENTER)  # type: ignore
-    def enter_server_list_refresh(self, old_state, servers) -> None:
-        logger.debug("server list refresh")
+    def enter_server_list_refresh(self, old_state, delta) -> None:
+        logger.debug(f"server list refresh: {delta!r}")
         if self.is_searching_server:
             return
 
-        search.update_results(self, servers)
+        search.apply_delta(self, delta)
 
     def on_settings_button(self, widget: EventBox, event: EventButton) -> None:
         logger.debug("clicked settings button")
@@ -1236,7 +1236,7 @@ For detailed information, see the log file located at:
     def on_search_changed(self, _: Optional[SearchEntry] = None) -> None:
         query = self.find_server_search_input.get_text()
         if self.app.variant.use_predefined_servers and query.count(".") < 2:
-            results = self.app.model.search_predefined(query)
+            results = self.app.model.search_view(query)
             search.update_results(self, results, query)
         else:
             # Anything with two periods is interpreted
@@ -1326,6 +1326,12 @@ For detailed information, see the log file located at:
             try:
                 download = self.connection_info_stats.download
                 upload = self.connection_info_stats.upload
+                download_rate = self.connection_info_stats.download_rate
+                upload_rate = self.connection_info_stats.upload_rate
+                if download_rate:
+                    download = f"{download} ({download_rate})"
+                if upload_rate:
+                    upload = f"{upload} ({upload_rate})"
                 protocol = self.connection_info_stats.protocol
                 ipv4 = self.connection_info_stats.ipv4
                 ipv6 = self.connection_info_stats.ipv6
@@ -1346,6 +1352,7 @@ For detailed information, see the log file located at:
 
         if not self.connection_info_stats:
             self.connection_info_stats = NetworkStats(self.app.nm_manager)
+            self.connection_info_stats.start()
 
         if not self.connection_info_thread_cancel:
             # Run every second in the background
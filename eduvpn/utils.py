@@ -2,17 +2,20 @@ import logging
 import os
 import sys
 import threading
+import time
 import traceback
 from functools import lru_cache, partial, wraps
 from gettext import gettext
 from os import environ, path
 from sys import prefix
-from typing import Callable, Optional, Union
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 from eduvpn_common.event import class_state_transition
 from eduvpn_common.main import WrappedError
 from eduvpn_common.state import State, StateType
 
+from eduvpn import trace
+
 logger = logging.getLogger(__file__)
 
 
@@ -240,6 +243,68 @@ def run_periodically(
     return event.set
 
 
+class StageTimings:
+    """
+    Record when the stages of a pipeline start and end, stages may overlap.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        # stage -> (start, end) in seconds since the pipeline started, end is None while running
+        self.stages: Dict[str, Tuple[float, Optional[float]]] = {}
+        # stage -> trace span while running
+        self._spans: Dict[str, Optional[trace.Span]] = {}
+
+    def begin(self, stage: str) -> None:
+        span = trace.begin(f"{self.name}.{stage}")
+        with self._lock:
+            self.stages[stage] = (time.monotonic() - self.started, None)
+            self._spans[stage] = span
+
+    def end(self, stage: str) -> None:
+        with self._lock:
+            start, _ = self.stages.get(stage, (0.0, None))
+            self.stages[stage] = (start, time.monotonic() - self.started)
+            span = self._spans.pop(stage, None)
+        trace.end(span)
+
+    def summary(self) -> str:
+        with self._lock:
+            stages = sorted(self.stages.items(), key=lambda item: item[1][0])
+        parts: List[str] = []
+        for stage, (start, end) in stages:
+            if end is None:
+                parts.append(f"{stage} +{start * 1000:.0f}ms (running)")
+            else:
+                parts.append(f"{stage} +{start * 1000:.0f}ms {(end - start) * 1000:.1f}ms")
+        total = (time.monotonic() - self.started) * 1000
+        return f"{self.name} {total:.1f}ms: " + ", ".join(parts)
+
+
+def when_all(count: int, callback: Callable[[bool], None]) -> Callable[[bool], None]:
+    """
+    Join `count` asynchronous results.
+
+    The returned function has to be called `count` times with whether a result succeeded,
+    the callback is called once with True after all succeeded or with False on the first failure.
+    """
+    lock = threading.Lock()
+    remaining = [count]
+
+    def done(success: bool):
+        with lock:
+            if remaining[0] <= 0:
+                return
+            remaining[0] = remaining[0] - 1 if success else 0
+            finished = remaining[0] == 0
+        if finished:
+            callback(success)
+
+    return done
+
+
 def get_human_readable_bytes(total_bytes: int) -> str:
     """
     Helper function to calculate the human readable bytes.
@@ -0,0 +1,78 @@
+"""
+Fakes of the NetworkManager client objects that NMStateMirror uses, shared by the tests and the benchmarks.
+"""
+
+
+class FakeSignals:
+    def __init__(self):
+        self.handlers = {}
+        self.next_id = 0
+
+    def connect(self, signal, handler):
+        self.next_id += 1
+        self.handlers[self.next_id] = (signal, handler)
+        return self.next_id
+
+    def disconnect(self, handler_id):
+        del self.handlers[handler_id]
+
+
+class FakeRemoteConnection:
+    def __init__(self, uuid: str):
+        self.uuid = uuid
+
+    def get_uuid(self) -> str:
+        return self.uuid
+
+
+class FakeDevice(FakeSignals):
+    def __init__(self, iface: str, type_description: str = "tun", uuids=(), realized: bool = True):
+        super().__init__()
+        self.iface = iface
+        self.type_description = type_description
+        self.available = [FakeRemoteConnection(uuid) for uuid in uuids]
+        self.realized = realized
+
+    def get_iface(self) -> str:
+        return self.iface
+
+    def get_type_description(self) -> str:
+        return self.type_description
+
+    def get_available_connections(self):
+        return self.available
+
+
+class FakeActiveConnection(FakeSignals):
+    def __init__(self, i: int):
+        super().__init__()
+        self.uuid = f"00000000-0000-0000-0000-{i:012d}"
+        self.devices = [FakeDevice(f"tun{i}")]
+
+    def get_uuid(self) -> str:
+        return self.uuid
+
+    def get_devices(self):
+        return self.devices
+
+    def get_ip4_config(self):
+        return None
+
+    def get_ip6_config(self):
+        return None
+
+
+class FakeClient(FakeSignals):
+    def __init__(self, count: int, devices=()):
+        super().__init__()
+        self.connections = [FakeActiveConnection(i) for i in range(count)]
+        self.devices = list(devices)
+
+    def get_active_connections(self):
+        return list(self.connections)
+
+    def get_devices(self):
+        return [device for device in self.devices if device.realized]
+
+    def get_all_devices(self):
+        return list(self.devices)
@@ -0,0 +1,130 @@
+from ipaddress import ip_address, ip_interface, ip_network
+from unittest import TestCase
+
+from eduvpn.connection import (
+    Connection,
+    InvalidWireGuardConfig,
+    WireGuardConnection,
+    aggregate_networks,
+    collapse_networks,
+    parse_wireguard,
+)
+
+WIREGUARD_CONFIG = """[Interface]
+# A comment
+PrivateKey = aGVsbG8gd29ybGQgaGVsbG8gd29ybGQgaGVsbG8gd28=
+Address = 10.10.10.2/24, fd00:4242:4242:4242::2/64
+DNS = 9.9.9.9, 2620:fe::fe, example.org
+MTU = 1392
+
+[Peer]
+PublicKey = d29ybGQgaGVsbG8gd29ybGQgaGVsbG8gd29ybGQgaGU=
+AllowedIPs = 0.0.0.0/0, ::/0
+Endpoint = vpn.example.org:51820
+"""
+
+
+class TestParseWireGuard(TestCase):
+    def test_parse(self):
+        config = parse_wireguard(WIREGUARD_CONFIG)
+        interface = config.interface
+        self.assertEqual(interface.private_key, "aGVsbG8gd29ybGQgaGVsbG8gd29ybGQgaGVsbG8gd28=")
+        self.assertEqual(
+            interface.addresses, [ip_interface("10.10.10.2/24"), ip_interface("fd00:4242:4242:4242::2/64")]
+        )
+        self.assertEqual(interface.dns, [ip_address("9.9.9.9"), ip_address("2620:fe::fe")])
+        self.assertEqual(interface.dns_search, ["example.org"])
+        self.assertEqual(interface.mtu, 1392)
+        (peer,) = config.peers
+        self.assertEqual(peer.endpoint, "vpn.example.org:51820")
+        self.assertEqual(peer.allowed_ips, [ip_network("0.0.0.0/0"), ip_network("::/0")])
+        self.assertEqual(peer.persistent_keepalive, 0)
+
+    def test_multiple_peers(self):
+        config = parse_wireguard(
+            WIREGUARD_CONFIG
+            + """
+[Peer]
+publickey = cGVlcg==
+allowedips = 192.168.1.0/24
+AllowedIPs = 192.168.2.1/24
+Endpoint = 192.0.2.1:51820
+PersistentKeepalive = 25
+"""
+        )
+        self.assertEqual(len(config.peers), 2)
+        peer = config.peers[1]
+        self.assertEqual(peer.public_key, "cGVlcg==")
+        self.assertEqual(peer.allowed_ips, [ip_network("192.168.1.0/24"), ip_network("192.168.2.0/24")])
+        self.assertEqual(peer.persistent_keepalive, 25)
+
+    def test_comments(self):
+        config = parse_wireguard(
+            WIREGUARD_CONFIG.replace("[Peer]\n", "[Peer]\n; Another comment\n    # An indented comment\n")
+        )
+        self.assertEqual(config.peers[0].endpoint, "vpn.example.org:51820")
+
+    def test_value_with_hash(self):
+        config = parse_wireguard(WIREGUARD_CONFIG.replace("vpn.example.org", "vpn#1.example.org"))
+        self.assertEqual(config.peers[0].endpoint, "vpn#1.example.org:51820")
+
+    def test_invalid(self):
+        with self.assertRaises(InvalidWireGuardConfig):
+            parse_wireguard(WIREGUARD_CONFIG.replace("Address", "Addresses"))
+        with self.assertRaises(InvalidWireGuardConfig):
+            parse_wireguard(WIREGUARD_CONFIG.replace("10.10.10.2/24", "10.10.10.256/24"))
+        with self.assertRaises(InvalidWireGuardConfig):
+            parse_wireguard(WIREGUARD_CONFIG.split("[Peer]")[0])
+
+    def test_invalid_mtu(self):
+        with self.assertLogs("eduvpn.connection", "WARNING"):
+            config = parse_wireguard(WIREGUARD_CONFIG.replace("1392", "large"))
+        self.assertIsNone(config.interface.mtu)
+
+    def test_connection(self):
+        self.assertIsInstance(WireGuardConnection.parse(WIREGUARD_CONFIG), Connection)
+
+
+class TestCollapseNetworks(TestCase):
+    def test_collapse(self):
+        networks = [
+            ip_network("10.0.1.0/24"),
+            ip_network("fd00::/64"),
+            ip_network("10.0.0.0/24"),
+            ip_network("10.0.0.0/25"),
+            ip_network("10.0.1.0/24"),
+            ip_network("fd00:0:0:1::/64"),
+            ip_network("192.168.0.0/24"),
+        ]
+        self.assertEqual(
+            collapse_networks(networks),
+            [ip_network("10.0.0.0/23"), ip_network("192.168.0.0/24"), ip_network("fd00::/63")],
+        )
+
+    def test_default_routes(self):
+        networks = [ip_network("0.0.0.0/0"), ip_network("10.0.0.0/8"), ip_network("::/0")]
+        self.assertEqual(collapse_networks(networks), [ip_network("0.0.0.0/0"), ip_network("::/0")])
+        self.assertEqual(collapse_networks([]), [])
+
+
+class TestAggregateNetworks(TestCase):
+    def test_within_limit(self):
+        addresses = ["192.0.2.1", "192.0.2.0", "192.0.2.1", "2001:db8::1"]
+        self.assertEqual(
+            aggregate_networks(addresses, 2),
+            [ip_network("192.0.2.0/31"), ip_network("2001:db8::1/128")],
+        )
+
+    def test_limit(self):
+        addresses = [f"198.51.{i}.{j}" for i in range(10) for j in range(5)]
+        networks = aggregate_networks(addresses, 8)
+        self.assertLessEqual(len(networks), 8)
+        for address in addresses:
+            self.assertTrue(any(ip_address(address) in network for network in networks))
+        # The longest prefix length that fits is used
+        self.assertEqual(networks, [ip_network("198.51.0.0/21"), ip_network("198.51.8.0/23")])
+
+    def test_limit_per_family(self):
+        addresses = ["192.0.2.1", "198.51.100.1", "2001:db8::1", "2001:db8:1::1"]
+        networks = aggregate_networks(addresses, 1)
+        self.assertEqual(networks, [ip_network("192.0.0.0/5"), ip_network("2001:db8::/47")])
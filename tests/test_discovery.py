@@ -0,0 +1,154 @@
+import json
+from unittest import TestCase
+
+from eduvpn.discovery import (
+    DiscoOrganization,
+    DiscoServer,
+    SearchIndex,
+    SnapshotError,
+    dump_snapshot,
+    load_snapshot,
+    normalize,
+    parse_disco_organizations,
+    parse_disco_organizations_lazy,
+    parse_disco_servers,
+    parse_disco_servers_lazy,
+)
+
+
+class TestSearchIndex(TestCase):
+    def setUp(self):
+        self.substring = DiscoOrganization({"en": "Applied University of Amsterdam"}, "https://a.bogus/")
+        self.word = DiscoOrganization({"en": "Vrije University", "nl": "Vrije Universiteit"}, "https://b.bogus/")
+        self.prefix = DiscoServer("https://c.bogus/", {"en": "University"}, "institute_access", "vpn")
+        self.keyword = DiscoOrganization({"en": "Hogeschool"}, "https://d.bogus/", {"en": "university tromsø"})
+        self.index = SearchIndex([self.keyword, self.substring, self.word, self.prefix])
+
+    def test_ranking(self):
+        self.assertEqual(
+            self.index.search("university"),
+            [self.prefix, self.substring, self.word, self.keyword],
+        )
+        self.assertEqual(self.index.search("Universiteit"), [self.word])
+
+    def test_tokens(self):
+        self.assertEqual(self.index.search("amsterdam appl"), [self.substring])
+        self.assertEqual(self.index.search("TROMSØ"), [self.keyword])
+        self.assertEqual(self.index.search("vpn"), [self.prefix])
+        self.assertEqual(self.index.search("bogus"), [])
+
+    def test_narrowing(self):
+        # Typing a query and then removing characters should give the same results
+        for query in ["u", "un", "uni", "univ", "uni", "u", ""]:
+            self.assertEqual(
+                self.index.search(query),
+                SearchIndex(self.index.entries).search(query),
+            )
+        self.assertEqual(len(self.index.search("")), 4)
+
+
+class TestSearchKeys(TestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize("Universität Zürich"), "universitat zurich")
+        self.assertEqual(normalize("ÉCOLE"), "ecole")
+
+    def test_value_type(self):
+        org = DiscoOrganization({"en": "Org"}, "https://org.bogus/")
+        same = DiscoOrganization({"en": "Org"}, "https://org.bogus/")
+        self.assertEqual(org, same)
+        self.assertIs(org.display_name, same.display_name)
+        self.assertEqual({org: 1}[same], 1)
+        self.assertNotEqual(org, DiscoServer("https://org.bogus/", {"en": "Org"}, "institute_access"))
+        # A changed display name is not shared
+        self.assertEqual(DiscoOrganization({"en": "New"}, "https://org.bogus/").display_name, {"en": "New"})
+
+    def test_parse(self):
+        orgs = parse_disco_organizations(
+            json.dumps(
+                {
+                    "organization_list": [
+                        {
+                            "display_name": {"en": "University of Zürich", "de": "Universität Zürich"},
+                            "org_id": "https://uzh.bogus/",
+                            "keyword_list": {"en": "UZH Zürich"},
+                        }
+                    ]
+                }
+            )
+        )
+        org = orgs[0]
+        self.assertEqual(org.search_keys, {"en": "university of zurich", "de": "universitat zurich"})
+        self.assertEqual(org.keyword_keys, ("uzh zurich",))
+        index = SearchIndex(orgs)
+        self.assertEqual(index.search("universitat zurich"), [org])
+        self.assertEqual(index.search("Universität"), [org])
+        self.assertEqual(index.search("uzh"), [org])
+
+
+class TestSnapshot(TestCase):
+    def test_roundtrip(self):
+        entries = [
+            DiscoOrganization({"en": "Zürich", "de": "Zürich"}, "https://uzh.bogus/", {"en": "uzh"}),
+            DiscoServer("https://vpn.bogus/", "Plain", "secure_internet", "vpn"),
+            DiscoServer("https://other.bogus/", {"en": "Other"}, "institute_access"),
+        ]
+        loaded, postings = load_snapshot(dump_snapshot(entries))
+        self.assertEqual([type(e) for e in loaded], [type(e) for e in entries])
+        for entry, other in zip(entries, loaded):
+            self.assertEqual(entry.identifier, other.identifier)
+            self.assertEqual(entry.display_name, other.display_name)
+            self.assertEqual(entry.keywords, other.keywords)
+            self.assertEqual(entry.search_keys, other.search_keys)
+            self.assertEqual(entry.keyword_keys, other.keyword_keys)
+        self.assertEqual(loaded[1].server_type, "secure_internet")
+
+        # The search index is restored from the postings
+        index = SearchIndex(loaded, postings)
+        self.assertEqual({gram: list(ids) for gram, ids in postings.items()}, SearchIndex(entries).postings)
+        self.assertEqual([e.identifier for e in index.search("zur")], ["https://uzh.bogus/"])
+        self.assertEqual([e.identifier for e in index.search("vpn")], ["https://vpn.bogus/"])
+
+    def test_invalid(self):
+        data = dump_snapshot([DiscoServer("https://vpn.bogus/", {"en": "VPN"}, "institute_access")])
+        for invalid in [b"", b"bogus" * 10, data[:-1], data.replace(b"EDUVPNDS\x02", b"EDUVPNDS\x03")]:
+            with self.assertRaises(SnapshotError):
+                load_snapshot(invalid)
+
+
+class TestLazyParser(TestCase):
+    servers_json = json.dumps(
+        {
+            "v": {"server_list": []},
+            "server_list": [
+                {
+                    "base_url": f"https://vpn{i}.bogus/",
+                    "display_name": {"en": f"VPN {i}"},
+                    "server_type": "institute_access",
+                }
+                for i in range(10)
+            ],
+        },
+        indent=2,
+    )
+
+    def test_equal(self):
+        lazy = parse_disco_servers_lazy(self.servers_json)
+        eager = parse_disco_servers(self.servers_json)
+        self.assertEqual(len(lazy), 10)
+        self.assertEqual(lazy.materialized, 0)
+        self.assertEqual([s.base_url for s in lazy], [s.base_url for s in eager])
+        self.assertEqual([str(s) for s in lazy[-2:]], ["VPN 8", "VPN 9"])
+
+    def test_materialize(self):
+        lazy = parse_disco_servers_lazy(self.servers_json)
+        first = lazy[0]
+        self.assertIs(lazy[0], first)
+        self.assertEqual(lazy.materialized, 1)
+        with self.assertRaises(IndexError):
+            lazy[10]
+
+    def test_empty(self):
+        self.assertEqual(len(parse_disco_organizations_lazy('{"organization_list": null}')), 0)
+        self.assertEqual(len(parse_disco_organizations_lazy("{}")), 0)
+        with self.assertRaises(ValueError):
+            parse_disco_organizations_lazy('{"organization_list": [{"org_id": ')
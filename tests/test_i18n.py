@@ -0,0 +1,35 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from eduvpn import i18n
+from eduvpn.i18n import Translations, extract_translation
+
+
+class TestExtractTranslation(TestCase):
+    def setUp(self):
+        i18n.invalidate()
+
+    def tearDown(self):
+        i18n.invalidate()
+
+    def test_fallbacks(self):
+        with patch("locale.getlocale", return_value=("nl_NL", "UTF-8")):
+            self.assertEqual(i18n.fallbacks(), ("nl-NL", "nl", "en-US", "en"))
+            self.assertEqual(extract_translation({"en": "University", "nl": "Universiteit"}), "Universiteit")
+            self.assertEqual(extract_translation({"de": "Universität"}), "Universität")
+            self.assertEqual(extract_translation("University"), "University")
+
+    def test_cached(self):
+        d = Translations({"en": "University", "nl": "Universiteit"})
+        with patch("locale.getlocale", return_value=("nl_NL", "UTF-8")) as getlocale:
+            self.assertEqual(extract_translation(d), "Universiteit")
+            self.assertEqual(extract_translation(d), "Universiteit")
+            self.assertEqual(extract_translation({"en": "Other"}), "Other")
+            # The locale is only resolved once
+            self.assertEqual(getlocale.call_count, 2)
+            self.assertEqual(d.resolved[1], "Universiteit")
+
+        # Changing the locale invalidates the cache
+        i18n.invalidate()
+        with patch("locale.getlocale", return_value=("en_US", "UTF-8")):
+            self.assertEqual(extract_translation(d), "University")
@@ -0,0 +1,118 @@
+import os
+import socket
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipIf
+
+from eduvpn.netstats import (
+    LINUX_NET_FOLDER,
+    LinkStats,
+    NetlinkReader,
+    StatsReader,
+    StatsSampler,
+    SysfsReader,
+    open_rx_reader,
+    open_stats_reader,
+)
+
+
+def netlink_available() -> bool:
+    try:
+        socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE).close()
+    except (AttributeError, OSError):
+        return False
+    return True
+
+
+@skipIf(not (LINUX_NET_FOLDER / "lo").is_dir() or not netlink_available(), "Netlink not available")
+class TestNetlinkReader(TestCase):
+    def test_read(self):
+        reader = NetlinkReader("lo")
+        sysfs = SysfsReader("lo")
+        stats = reader.read()
+        self.assertIsNotNone(stats)
+        # The counters only increase
+        self.assertGreaterEqual(sysfs.read().rx_packets, stats.rx_packets)
+        self.assertGreaterEqual(reader.rx_bytes(), stats.rx_bytes)
+        reader.close()
+        sysfs.close()
+
+    def test_getlink(self):
+        reader = NetlinkReader("lo")
+        reader.getstats = False
+        self.assertIsNotNone(reader.read())
+        reader.close()
+
+    def test_missing(self):
+        self.assertIsNone(open_stats_reader("eduvpn-missing"))
+        reader = NetlinkReader("lo")
+        # An interface that was removed
+        reader.index = 0x7FFFFFFF
+        self.assertIsNone(reader.read())
+        reader.close()
+
+
+class MockReader(StatsReader):
+    def __init__(self, iface: str, values):
+        super().__init__(iface)
+        self.values = values
+
+    def read(self):
+        if not self.values:
+            return None
+        rx, tx = self.values.pop(0)
+        return LinkStats(0, 0, rx, tx, 0, 0, 0, 0)
+
+
+class TestStatsSampler(TestCase):
+    def sampler(self, *readers, size: int = 300) -> StatsSampler:
+        remaining = list(readers)
+        return StatsSampler(lambda: remaining.pop(0) if remaining else None, size=size)
+
+    def test_rates(self):
+        sampler = self.sampler(MockReader("tun0", [(1000, 100), (3000, 200), (4000, 1200), (8000, 1200)]))
+        self.assertIsNone(sampler.rate())
+        for second in range(4):
+            self.assertTrue(sampler.sample(now=second * 10**9))
+        self.assertEqual(sampler.total, (7000, 1100))
+        self.assertEqual(sampler.rate(), (4000.0, 0.0))
+        self.assertEqual(sampler.rate(window=3), (7000 / 3, 1100 / 3))
+        self.assertEqual(sampler.peak, (4000.0, 1000.0))
+        self.assertEqual(sampler.history(2), [(1000.0, 1000.0), (4000.0, 0.0)])
+
+    def test_reset_and_rebind(self):
+        sampler = self.sampler(
+            MockReader("tun0", [(1000, 1000), (1500, 1200), (100, 50)]),
+            MockReader("tun1", [(300, 30)]),
+        )
+        for second in range(3):
+            sampler.sample(now=second * 10**9)
+        # The counters were reset, they count from zero
+        self.assertEqual(sampler.total, (600, 250))
+        # tun0 is gone, the next sample opens a new reader
+        self.assertFalse(sampler.sample(now=3 * 10**9))
+        # The new interface counts from zero
+        self.assertTrue(sampler.sample(now=4 * 10**9))
+        self.assertEqual(sampler.total, (900, 280))
+
+    def test_ring(self):
+        values = [(i * 100, 0) for i in range(10)]
+        sampler = self.sampler(MockReader("tun0", values), size=4)
+        for second in range(10):
+            sampler.sample(now=second * 10**9)
+        self.assertEqual(len(sampler.history()), 3)
+        self.assertEqual(sampler.rate(window=60), (100.0, 0.0))
+
+
+class TestOpenRxReader(TestCase):
+    def test_pinned(self):
+        with TemporaryDirectory() as tempdir:
+            root = Path(tempdir)
+            statistics = root / "tun0" / "statistics"
+            os.makedirs(statistics)
+            (statistics / "rx_bytes").write_text("42\n")
+            reader = open_rx_reader("tun0", root)
+            (statistics / "rx_bytes").write_text("43\n")
+            self.assertEqual(reader.rx_bytes(), 43)
+            reader.close()
+            self.assertIsNone(open_rx_reader("tun1", root))
@@ -1,9 +1,13 @@
+import os
+import tempfile
+from pathlib import Path
 from unittest import TestCase, skipIf
 
-from eduvpn.nm import NMManager
+from eduvpn.nm import NMManager, NMStateMirror, write_blob
 from eduvpn.ovpn import Ovpn
 from eduvpn.variants import EDUVPN
 from tests.mock_config import mock_config
+from tests.mock_nm import FakeActiveConnection, FakeClient, FakeDevice
 
 
 @skipIf(not NMManager(EDUVPN).available, "Network manager not available")
@@ -26,3 +30,95 @@ class TestNm(TestCase):
     def test_get_uuid(self):
         nm_manager = NMManager(EDUVPN)
         nm_manager.uuid
+
+
+class TestNMStateMirror(TestCase):
+    def test_signals(self):
+        client = FakeClient(3)
+        mirror = NMStateMirror(client)
+        first = client.connections[0]
+        self.assertEqual(mirror.get(first.get_uuid()).iface, "tun0")
+        self.assertIsNone(mirror.get("missing"))
+        self.assertIsNone(mirror.get(None))
+
+        handlers = {signal: handler for signal, handler in client.handlers.values()}
+        added = FakeActiveConnection(3)
+        handlers["active-connection-added"](client, added)
+        self.assertIs(mirror.get(added.get_uuid()).connection, added)
+
+        # A connection update replaces the snapshot
+        added.devices = []
+        for signal, handler in list(added.handlers.values()):
+            if signal == "notify::devices":
+                handler(added, None)
+        self.assertIsNone(mirror.get(added.get_uuid()).iface)
+
+        handlers["active-connection-removed"](client, added)
+        self.assertIsNone(mirror.get(added.get_uuid()))
+        self.assertEqual(added.handlers, {})
+
+    def test_device_index(self):
+        wg = FakeDevice("wg0", "wireguard", ["eduvpn"])
+        client = FakeClient(0, [FakeDevice("br0", "bridge", ["eduvpn"]), wg])
+        mirror = NMStateMirror(client)
+        self.assertIs(mirror.device("eduvpn", "wireguard"), wg)
+        self.assertIsNone(mirror.device("other", "wireguard"))
+
+        # The available connections changed
+        wg.available = []
+        for signal, handler in list(wg.handlers.values()):
+            if signal == "notify::available-connections":
+                handler(wg, None)
+        self.assertIsNone(mirror.device("eduvpn", "wireguard"))
+
+        handlers = {signal: handler for signal, handler in client.handlers.values()}
+        added = FakeDevice("wg1", "wireguard", ["eduvpn"])
+        handlers["any-device-added"](client, added)
+        self.assertIs(mirror.device("eduvpn", "wireguard"), added)
+        # The devices are replaced instead of modified, a reader in another thread keeps a consistent view
+        devices = mirror._devices[("eduvpn", "wireguard")]
+        second = FakeDevice("wg2", "wireguard", ["eduvpn"])
+        handlers["any-device-added"](client, second)
+        self.assertEqual(devices, (added,))
+        handlers["any-device-removed"](client, second)
+        handlers["any-device-removed"](client, added)
+        self.assertIsNone(mirror.device("eduvpn", "wireguard"))
+        self.assertEqual(added.handlers, {})
+
+    def test_device_index_unrealized(self):
+        # The WireGuard device of a connection that is not active is a software device that is not realized
+        wg = FakeDevice("wg0", "wireguard", ["eduvpn"], realized=False)
+        client = FakeClient(0, [wg])
+        self.assertEqual(client.get_devices(), [])
+        mirror = NMStateMirror(client)
+        self.assertIs(mirror.device("eduvpn", "wireguard"), wg)
+
+        # Realizing the device does not change the index
+        handlers = {signal: handler for signal, handler in client.handlers.values()}
+        wg.realized = True
+        handlers["device-added"](client, wg)
+        self.assertIs(mirror.device("eduvpn", "wireguard"), wg)
+        wg.realized = False
+        handlers["device-removed"](client, wg)
+        self.assertIs(mirror.device("eduvpn", "wireguard"), wg)
+
+
+class TestWriteBlob(TestCase):
+    def test_write_blob(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = Path(tempdir) / "nm-openvpn" / "eduVPN-cert.pem"
+            self.assertTrue(write_blob(path, "cert\n"))
+            self.assertEqual(path.read_text(), "cert\n")
+            self.assertEqual(path.stat().st_mode & 0o777, 0o600)
+            # The same content is not written again
+            self.assertFalse(write_blob(path, "cert\n"))
+            self.assertTrue(write_blob(path, "new\n"))
+            self.assertEqual(path.read_text(), "new\n")
+            self.assertEqual(os.listdir(path.parent), ["eduVPN-cert.pem"])
+
+    def test_existing_blob(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = Path(tempdir) / "eduVPN-key.pem"
+            path.write_text("key\n")
+            # Written by another process with the same content
+            self.assertFalse(write_blob(path, "key\n"))
@@ -0,0 +1,44 @@
+from unittest import TestCase
+
+from eduvpn.ovpn import Ovpn, Section, UnsupportedOVPN, nm_vpn_data
+from tests.mock_config import mock_cert, mock_config, mock_key
+
+
+def with_certificate(ovpn: Ovpn) -> Ovpn:
+    return Ovpn(
+        ovpn.content
+        + [
+            Section("key", mock_key.strip().splitlines()),
+            Section("cert", mock_cert.strip().splitlines()),
+        ]
+    )
+
+
+class TestNMVpnData(TestCase):
+    def test_translate(self):
+        data, blobs = nm_vpn_data(with_certificate(Ovpn.parse(mock_config)))
+        self.assertEqual(
+            data["remote"],
+            "internet.demo.eduvpn.nl:1194:udp, internet.demo.eduvpn.nl:1194:tcp, internet.demo.eduvpn.nl:443:tcp",
+        )
+        self.assertEqual(data["connection-type"], "tls")
+        self.assertEqual(data["dev"], "tun")
+        self.assertEqual(data["comp-lzo"], "adaptive")
+        self.assertEqual(data["connect-timeout"], "10")
+        self.assertEqual(data["cipher"], "AES-256-CBC")
+        self.assertEqual(data["remote-cert-tls"], "server")
+        self.assertEqual(data["ta-dir"], "1")
+        self.assertEqual(set(blobs), {"ca", "ta", "key", "cert"})
+        self.assertTrue(blobs["key"].startswith("-----BEGIN"))
+        self.assertTrue(blobs["ca"].endswith("-----END CERTIFICATE-----\n"))
+
+    def test_comp_lzo_no(self):
+        data, _ = nm_vpn_data(with_certificate(Ovpn.parse(mock_config.replace("comp-lzo\n", "comp-lzo no\n"))))
+        self.assertEqual(data["comp-lzo"], "no-by-default")
+
+    def test_unsupported(self):
+        # Without a certificate the VPN config importer has to be used
+        with self.assertRaises(UnsupportedOVPN):
+            nm_vpn_data(Ovpn.parse(mock_config))
+        with self.assertRaises(UnsupportedOVPN):
+            nm_vpn_data(with_certificate(Ovpn.parse(mock_config + "route-nopull\n")))
@@ -0,0 +1,299 @@
+import json
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict
+from unittest import TestCase
+from unittest.mock import patch
+
+from eduvpn_common.event import EventHandler
+from eduvpn_common.main import ServerType
+from eduvpn_common.state import State
+
+from eduvpn.discovery import DiscoOrganization, DiscoServer
+from eduvpn.server import (
+    InstituteServer,
+    Profile,
+    SecureInternetServer,
+    Server,
+    ServerDatabase,
+    ServerGroup,
+    diff_servers,
+    parse_servers,
+    server_view,
+)
+
+MOCK_SERVERS: Dict[str, Any] = {
+    "institute_access_servers": [
+        {
+            "identifier": "https://institute.bogus/",
+            "display_name": {"en": "Institute"},
+            "profiles": {"map": {"default": {"display_name": {"en": "Default"}}}, "current": "default"},
+            "delisted": False,
+        }
+    ],
+    "secure_internet_server": {
+        "identifier": "https://idp.mock.bogus/",
+        "display_name": {"en": "bogus"},
+        "profiles": {"current": ""},
+        "country_code": "NL",
+        "locations": ["NL", "DE"],
+        "delisted": False,
+    },
+}
+
+
+MOCK_DISCO_SERVERS = {
+    "server_list": [
+        {
+            "base_url": "https://institute.bogus/",
+            "display_name": {"en": "Institute"},
+            "server_type": "institute_access",
+        }
+    ]
+}
+
+
+class MockWrapper:
+    def __init__(self):
+        self.get_servers_calls = 0
+        self.get_current_server_calls = 0
+
+    def get_servers(self) -> str:
+        self.get_servers_calls += 1
+        return json.dumps(MOCK_SERVERS)
+
+    def get_current_server(self) -> str:
+        self.get_current_server_calls += 1
+        institute = dict(MOCK_SERVERS["institute_access_servers"][0], support_contacts=[])
+        return json.dumps({"server_type": 1, "institute_access_server": institute})
+
+    def get_disco_organizations(self, search: str = "") -> str:
+        return json.dumps({"organization_list": []})
+
+    def get_disco_servers(self, search: str = "") -> str:
+        return json.dumps(MOCK_DISCO_SERVERS)
+
+
+class TestServerDatabase(TestCase):
+    def test_configured_snapshot(self):
+        wrapper = MockWrapper()
+        server_db = ServerDatabase(wrapper)
+        first = server_db.configured
+        self.assertIsInstance(first, tuple)
+        self.assertIsInstance(first[0], InstituteServer)
+        self.assertIsInstance(server_db.secure_internet, SecureInternetServer)
+        self.assertIsNotNone(server_db.has(first[0]))
+
+        # Only the first access should go to eduvpn-common
+        self.assertEqual(wrapper.get_servers_calls, 1)
+        self.assertIs(server_db.configured, first)
+        self.assertEqual(server_db.configured_misses, 1)
+        self.assertGreaterEqual(server_db.configured_hits, 3)
+
+    def test_configured_invalidate(self):
+        wrapper = MockWrapper()
+        server_db = ServerDatabase(wrapper)
+        first = server_db.configured
+        server_db.invalidate()
+        second = server_db.configured
+        self.assertIsNot(first, second)
+        self.assertEqual(wrapper.get_servers_calls, 2)
+        self.assertEqual(server_db.configured_misses, 2)
+
+    def test_last_configured(self):
+        wrapper = MockWrapper()
+        server_db = ServerDatabase(wrapper)
+        self.assertEqual(server_db.last_configured, ())
+        first = server_db.configured
+        server_db.invalidate()
+        # The last snapshot is kept until the servers are fetched again
+        self.assertIs(server_db.last_configured, first)
+        self.assertEqual(wrapper.get_servers_calls, 1)
+        second = server_db.configured
+        self.assertIs(server_db.last_configured, second)
+
+    def test_lookup(self):
+        wrapper = MockWrapper()
+        server_db = ServerDatabase(wrapper)
+        institute = server_db.get(ServerType.INSTITUTE_ACCESS, "https://institute.bogus/")
+        self.assertIsInstance(institute, InstituteServer)
+        self.assertIs(server_db.has(institute), institute)
+
+        # The category is part of the key
+        self.assertIsNone(server_db.has(Server("https://institute.bogus/", {"en": "Custom"})))
+        self.assertIsNone(server_db.get(ServerType.SECURE_INTERNET, "https://institute.bogus/"))
+        self.assertEqual(wrapper.get_servers_calls, 1)
+
+    def test_disco_lookup(self):
+        server_db = ServerDatabase(MockWrapper())
+        org = DiscoOrganization({"en": "bogus"}, "https://idp.mock.bogus/")
+        server_db.cached = [org, DiscoServer("https://institute.bogus/", {"en": "Institute"}, "institute_access")]
+        self.assertIs(server_db.get_disco(ServerType.SECURE_INTERNET, "https://idp.mock.bogus/"), org)
+        self.assertIsNone(server_db.get_disco(ServerType.INSTITUTE_ACCESS, "https://idp.mock.bogus/"))
+
+    def test_current(self):
+        wrapper = MockWrapper()
+        server_db = ServerDatabase(wrapper)
+        # Without tracking the transitions the current server is not cached
+        server_db.current
+        server_db.current
+        self.assertEqual(wrapper.get_current_server_calls, 2)
+
+        wrapper = MockWrapper()
+        server_db = ServerDatabase(wrapper)
+        event_handler = EventHandler()
+        server_db.track_transitions(event_handler)
+        current = server_db.current
+        self.assertIsInstance(current, InstituteServer)
+        self.assertIs(server_db.current, current)
+        self.assertEqual(wrapper.get_current_server_calls, 1)
+
+        event_handler.run(State.GOT_CONFIG, State.CONNECTING, "")
+        self.assertIsNot(server_db.current, current)
+        self.assertEqual(wrapper.get_current_server_calls, 2)
+        server_db.invalidate()
+        server_db.current
+        self.assertEqual(wrapper.get_current_server_calls, 3)
+        self.assertEqual(server_db.current_calls, 3)
+        self.assertEqual(server_db.current_hits, 1)
+
+    def test_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "eduvpn" / "discovery.snapshot"
+            server_db = ServerDatabase(MockWrapper(), snapshot_path=path)
+            self.assertFalse(server_db.load_snapshot())
+            server_db.disco_update()
+            self.assertTrue(path.exists())
+
+            # A new database should have the discovery list before fetching it
+            server_db = ServerDatabase(MockWrapper(), snapshot_path=path)
+            self.assertTrue(server_db.load_snapshot())
+            self.assertEqual([str(s) for s in server_db.disco], ["Institute"])
+            self.assertIsNotNone(server_db.get_disco(ServerType.INSTITUTE_ACCESS, "https://institute.bogus/"))
+
+            # An invalid snapshot is ignored
+            path.write_bytes(b"bogus")
+            self.assertFalse(ServerDatabase(MockWrapper(), snapshot_path=path).load_snapshot())
+
+    def test_snapshot_after_fetch(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "discovery.snapshot"
+            ServerDatabase(MockWrapper(), snapshot_path=path).disco_update()
+            server_db = ServerDatabase(MockWrapper(), snapshot_path=path)
+            # The search index is published with the list, not built on the first search
+            server_db.disco_update()
+            self.assertEqual(len(server_db._search_index), 1)
+            fetched = server_db.disco
+            # A snapshot that finishes loading after the fetch does not replace the fetched list
+            self.assertFalse(server_db._publish([], generation=0))
+            self.assertIs(server_db.disco, fetched)
+
+    def test_snapshot_concurrent_saves(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "discovery.snapshot"
+            server_db = ServerDatabase(MockWrapper(), snapshot_path=path)
+            server_db.disco_update()
+            threads = []
+            for _ in range(8):
+                # Force every thread to write
+                server_db._snapshot_digest = b""
+                threads.append(threading.Thread(target=server_db.save_snapshot))
+                threads[-1].start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(list(Path(directory).iterdir()), [path])
+            self.assertTrue(ServerDatabase(MockWrapper(), snapshot_path=path).load_snapshot())
+
+
+class TestModels(TestCase):
+    def test_hashable(self):
+        first = parse_servers(json.dumps(MOCK_SERVERS))
+        second = parse_servers(json.dumps(MOCK_SERVERS))
+        self.assertEqual(first, second)
+        self.assertEqual(len(set(first + second)), 2)
+        # The category is part of the identity
+        self.assertNotEqual(first[0], Server("https://institute.bogus/", {"en": "Institute"}))
+        self.assertEqual(Profile("default", {"en": "Default"}, False), Profile("default", {"en": "Default"}, False))
+
+    def test_compact(self):
+        first = parse_servers(json.dumps(MOCK_SERVERS))
+        second = parse_servers(json.dumps(MOCK_SERVERS))
+        self.assertFalse(hasattr(first[0], "__dict__"))
+        self.assertIs(first[0].identifier, second[0].identifier)
+        self.assertIs(first[0].display_name, second[0].display_name)
+        self.assertIs(
+            first[0].profiles.profiles["default"].display_name,
+            second[0].profiles.profiles["default"].display_name,
+        )
+
+
+class TestServerView(TestCase):
+    def setUp(self):
+        self.servers = [
+            Server("https://custom.bogus/", {"en": "Custom"}),
+            DiscoServer("https://b.bogus/", {"en": "Zürich"}, "institute_access"),
+            DiscoOrganization({"en": "Org"}, "https://org.bogus/"),
+            DiscoServer("https://a.bogus/", {"en": "Amsterdam"}, "institute_access"),
+            DiscoServer("https://c.bogus/", {"en": "Brno"}, "institute_access"),
+        ]
+
+    def test_sorted(self):
+        view = server_view(self.servers)
+        self.assertEqual(
+            [str(s) for s in view.groups[ServerGroup.INSTITUTE_ACCESS]],
+            ["Amsterdam", "Brno", "Zürich"],
+        )
+        self.assertEqual([str(s) for s in view], ["Amsterdam", "Brno", "Zürich", "Org", "Custom"])
+        self.assertEqual(str(view.get(3)), "Org")
+        self.assertIsNone(view.get(5))
+        self.assertIsNone(view.get(-1))
+
+    def test_unsorted(self):
+        view = server_view(self.servers, sort=False)
+        self.assertEqual([str(s) for s in view], ["Zürich", "Amsterdam", "Brno", "Org", "Custom"])
+
+    def test_cached(self):
+        view = server_view(self.servers, generation=1)
+        self.assertIs(server_view(self.servers, generation=1), view)
+        self.assertIsNot(server_view(self.servers, generation=2), view)
+        self.assertIsNot(server_view(self.servers, sort=False, generation=1), view)
+        # Without a generation the view is not cached
+        self.assertIsNot(server_view(self.servers), server_view(self.servers))
+        self.assertEqual(len(server_view(s for s in self.servers)), 5)
+
+    def test_cached_collation(self):
+        view = server_view(self.servers, generation=1)
+        with patch("eduvpn.server.collation", return_value=("C", ("nl",))):
+            self.assertIsNot(server_view(self.servers, generation=1), view)
+        self.assertIs(server_view(self.servers, generation=1), view)
+
+
+class TestDiffServers(TestCase):
+    def test_diff(self):
+        old = parse_servers(json.dumps(MOCK_SERVERS))
+        changed = json.loads(json.dumps(MOCK_SERVERS))
+        changed["institute_access_servers"][0]["delisted"] = True
+        changed["secure_internet_server"]["locations"] = ["NL"]
+        changed["custom_servers"] = [
+            {"identifier": "https://custom.bogus/", "display_name": {"en": "Custom"}, "profiles": {"current": ""}}
+        ]
+        new = parse_servers(json.dumps(changed))
+
+        delta = diff_servers(old, new)
+        self.assertTrue(delta)
+        self.assertIs(delta.servers, new)
+        self.assertEqual([s.identifier for s in delta.added], ["https://custom.bogus/"])
+        self.assertEqual(delta.removed, [])
+        self.assertEqual(
+            [s.identifier for s in delta.changed],
+            ["https://institute.bogus/", "https://idp.mock.bogus/"],
+        )
+        self.assertTrue(delta.changed[0].delisted)
+
+        delta = diff_servers(new, old)
+        self.assertEqual([s.identifier for s in delta.removed], ["https://custom.bogus/"])
+
+    def test_unchanged(self):
+        delta = diff_servers(parse_servers(json.dumps(MOCK_SERVERS)), parse_servers(json.dumps(MOCK_SERVERS)))
+        self.assertFalse(delta)
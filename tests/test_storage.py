@@ -0,0 +1,51 @@
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from eduvpn.storage import SettingsStore
+
+
+class MockVariant:
+    def __init__(self, config_prefix: Path):
+        self.config_prefix = config_prefix
+
+
+@patch("eduvpn.storage.ensure_config_dir_exists")
+class TestSettingsStore(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.variant = MockVariant(Path(self.directory.name))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_set(self, _ensure):
+        store = SettingsStore()
+        self.assertIsNone(store.get(self.variant, "uuid"))
+        store.set(self.variant, "uuid", "abc")
+        self.assertEqual(store.get(self.variant, "uuid"), "abc")
+        self.assertEqual((self.variant.config_prefix / "uuid").read_text(), "abc")
+        # The written value is cached
+        self.assertEqual(store.reads, 0)
+        self.assertEqual(os.listdir(self.variant.config_prefix), ["uuid"])
+
+    def test_cached(self, _ensure):
+        (self.variant.config_prefix / "uuid").write_text("abc\n")
+        store = SettingsStore(check_interval=60)
+        for _ in range(10):
+            self.assertEqual(store.get(self.variant, "uuid"), "abc")
+        self.assertEqual(store.reads, 1)
+
+    def test_changed_by_other_process(self, _ensure):
+        store = SettingsStore(check_interval=0)
+        other = SettingsStore(check_interval=0)
+        store.set(self.variant, "uuid", "abc")
+        self.assertEqual(other.get(self.variant, "uuid"), "abc")
+        other.set(self.variant, "uuid", "def")
+        self.assertEqual(store.get(self.variant, "uuid"), "def")
+        self.assertEqual(store.get(self.variant, "uuid"), "def")
+        self.assertEqual(store.reads, 1)
+        os.unlink(self.variant.config_prefix / "uuid")
+        self.assertIsNone(store.get(self.variant, "uuid"))
@@ -0,0 +1,63 @@
+import json
+import os
+import threading
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from eduvpn.trace import DEFAULT_TRACE_FILENAME, Tracer, trace_path
+
+
+class TestTracer(TestCase):
+    def test_disabled(self):
+        tracer = Tracer()
+        self.assertIsNone(tracer.begin("config"))
+        tracer.end(None)
+        with tracer.span("parse") as span:
+            self.assertIsNone(span)
+        tracer.instant("proxy.setup")
+        self.assertEqual([event["ph"] for event in tracer.trace_events()], ["M"])
+
+    def test_spans(self):
+        tracer = Tracer(Path("trace.json"))
+        span = tracer.begin("nm.add_connection")
+        with tracer.span("parse", version=2):
+            pass
+        tracer.instant("proxy.setup")
+        # Spans can end on another thread than they began
+        thread = threading.Thread(target=tracer.end, args=(span,), kwargs={"error": "failed"}, name="glib")
+        thread.start()
+        thread.join()
+
+        events = tracer.trace_events()
+        metadata = [event for event in events if event["ph"] == "M"]
+        self.assertIn("glib", [event["args"]["name"] for event in metadata])
+        parse, instant, add = [event for event in events if event["ph"] != "M"]
+        self.assertEqual(parse["name"], "parse")
+        self.assertEqual(parse["args"], {"version": 2})
+        self.assertEqual(instant["ph"], "i")
+        self.assertEqual(add["name"], "nm.add_connection")
+        self.assertEqual(add["tid"], threading.get_ident())
+        self.assertEqual(add["args"], {"error": "failed", "end_thread": "glib"})
+        self.assertLessEqual(add["ts"], parse["ts"])
+        self.assertGreaterEqual(add["dur"], parse["dur"])
+
+    def test_dump(self):
+        with TemporaryDirectory() as tempdir:
+            path = Path(tempdir) / "eduvpn" / "trace.json"
+            tracer = Tracer(path)
+            with tracer.span("connect.config"):
+                pass
+            tracer.dump()
+            with open(path) as f:
+                trace = json.load(f)
+            self.assertEqual(trace["traceEvents"][-1]["name"], "connect.config")
+            self.assertEqual(list(path.parent.iterdir()), [path])
+
+    def test_trace_path(self):
+        self.assertIsNone(trace_path(None))
+        self.assertIsNone(trace_path("0"))
+        with patch.dict(os.environ, {"XDG_CACHE_HOME": "/home/user/.cache"}):
+            self.assertEqual(trace_path("1"), Path("/home/user/.cache/eduvpn") / DEFAULT_TRACE_FILENAME)
+        self.assertEqual(trace_path("/tmp/connect.json"), Path("/tmp/connect.json"))
@@ -0,0 +1,49 @@
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from eduvpn import trace
+from eduvpn.utils import StageTimings, when_all
+
+
+class TestWhenAll(TestCase):
+    def test_all_succeed(self):
+        results = []
+        done = when_all(2, results.append)
+        done(True)
+        self.assertEqual(results, [])
+        done(True)
+        self.assertEqual(results, [True])
+
+    def test_first_failure(self):
+        results = []
+        done = when_all(3, results.append)
+        done(True)
+        done(False)
+        done(True)
+        done(True)
+        self.assertEqual(results, [False])
+
+
+class TestStageTimings(TestCase):
+    def test_summary(self):
+        stages = StageTimings("connect")
+        stages.begin("config")
+        stages.begin("prepare")
+        stages.end("prepare")
+        summary = stages.summary()
+        self.assertTrue(summary.startswith("connect "))
+        self.assertIn("config +", summary)
+        self.assertIn("(running)", summary)
+        stages.end("config")
+        self.assertNotIn("(running)", stages.summary())
+
+    def test_trace(self):
+        with patch.object(trace, "tracer", trace.Tracer(Path("trace.json"))) as tracer:
+            stages = StageTimings("connect")
+            stages.begin("config")
+            stages.begin("prepare")
+            stages.end("prepare")
+            stages.end("config")
+            spans = [event["name"] for event in tracer.trace_events() if event["ph"] == "X"]
+        self.assertEqual(spans, ["connect.prepare", "connect.config"])